@@ -0,0 +1,303 @@
+import argparse
+import ipaddress
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from allocator import SubnetAllocator
+from juniper_routes import (BILLING_URLS, BLOCK_FILE, CACHE_DIR, JUNIPER_FILE, allocate_free, billing_summary,
+                            check_commands, config_commands, load_sources, occupancy_error)
+
+# Общий сервис выдачи подсетей для всех инженеров: списки занятых IP загружены один раз,
+# проверка и выдача подсети - один запрос, две выдачи одного блока невозможны:
+#   allocation_service.py --pool 10.0.0.0/16 --port 55600
+#   juniper_routes.py --service http://127.0.0.1:55600
+# API (JSON):
+#   GET  /check?subnet=10.1.2.0/30                          свободна ли подсеть
+#   POST /allocate {"prefix": 30, "pool": ..., "unit": 401, "policer": 10}   следующая свободная подсеть
+#   POST /reserve  {"subnet": "10.1.2.0/30", "unit": 401, "policer": 10}     занять указанную подсеть
+#   POST /release  {"subnet": "10.1.2.0/30"}                                  вернуть подсеть
+# Если переданы unit и policer, в ответе /allocate и /reserve есть готовые команды и данные для биллинга.
+
+STATE_FILE = 'reservations.jsonl'
+# Как часто проверять источники на изменения, сек.
+REFRESH_INTERVAL = 60
+
+
+class ServiceError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class AllocationService:
+    """Списки занятых IP и выданные подсети в памяти одного процесса.
+
+    Проверка занятости и отметка о выдаче выполняются под одной блокировкой. Каждая выдача и
+    возврат дописываются строкой в журнал state_path (как в RunJournal), поэтому выданное переживает
+    перезапуск; при запуске журнал сжимается до текущих выдач. Подсеть снимается с резерва, как
+    только появляется в списках биллинга или Juniper. Загрузка и пересборка изменившегося списка идут
+    без блокировки, под ней только подменяется отображённый индекс - запросы обновления не ждут.
+    """
+
+    def __init__(self, sources, pools, state_path=STATE_FILE):
+        self.sources = sources
+        self.allocator = SubnetAllocator([source for group in sources.values() for source in group], pools)
+        self.state_path = state_path
+        self.reservations = _read_state(state_path)
+        self._lock = threading.Lock()
+        for subnet in self.reservations:
+            self.allocator.reserve(subnet)
+        _write_state(state_path, self.reservations)
+        # buffering=1 - каждая запись сразу уходит в файл целиком
+        self._journal = open(state_path, 'a', encoding='utf-8', buffering=1)
+
+    def refresh(self):
+        changed = False
+        for group in self.sources.values():
+            for source in group:
+                changed = source.refresh(self._lock) or changed
+        with self._lock:
+            if changed:
+                # Освободившиеся в списках адреса позади курсоров снова можно выдать
+                self.allocator.reset_cursors()
+            # Подсеть, которая уже видна в списках, держать за собой больше не нужно
+            visible = [subnet for subnet in self.reservations
+                       if occupancy_error(ipaddress.IPv4Network(subnet), self.sources)]
+            for subnet in visible:
+                self.reservations.pop(subnet)
+                self.allocator.release(subnet)
+                self._record(subnet, 'release', reason='visible')
+            if visible:
+                print(f"[service] появились в списках и сняты с резерва: {', '.join(visible)}")
+
+    def check(self, subnet):
+        network = _parse_network(subnet)
+        with self._lock:
+            reason = self._busy_reason(network)
+        return {'subnet': str(network), 'free': reason is None, 'reason': reason}
+
+    def allocate(self, prefix=30, pool=None, unit=None, policer=None):
+        prefix = _parse_int(prefix, 'prefix')
+        if not 0 <= prefix <= 32:
+            raise ServiceError(400, f"некорректная длина префикса '{prefix}'")
+        pools = [pool] if pool else None
+        if pools is None and not self.allocator.pools:
+            raise ServiceError(400, "пулы адресов не заданы: укажите pool в запросе или --pool при запуске сервиса")
+        render = self._render_args(unit, policer)
+        with self._lock:
+            try:
+                network = allocate_free(self.allocator, self.sources, prefix, pools)
+            except ValueError as e:
+                raise ServiceError(400, f"некорректный пул адресов: {e}")
+            if network is None:
+                raise ServiceError(409, f"свободных подсетей /{prefix} в пуле нет")
+            self._remember(network, unit, policer)
+        return self._response(network, render)
+
+    def reserve(self, subnet, unit=None, policer=None):
+        network = _parse_network(subnet)
+        render = self._render_args(unit, policer)
+        with self._lock:
+            reason = self._busy_reason(network)
+            if reason:
+                raise ServiceError(409, reason)
+            self.allocator.reserve(network)
+            self._remember(network, unit, policer)
+        return self._response(network, render)
+
+    def release(self, subnet):
+        network = _parse_network(subnet)
+        with self._lock:
+            if self.reservations.pop(str(network), None) is None:
+                raise ServiceError(404, f"подсеть {network} не выдавалась")
+            self.allocator.release(network)
+            self._record(str(network), 'release')
+        return {'subnet': str(network), 'released': True}
+
+    def _busy_reason(self, network):
+        # Сначала причина из списков: отвергнутая allocate_free() подсеть тоже отмечена в allocator
+        reason = occupancy_error(network, self.sources)
+        if reason is None and self.allocator.is_reserved(network):
+            reason = "Подсеть уже выдана через сервис"
+        return reason
+
+    def _render_args(self, unit, policer):
+        # Команды рендерятся, только если переданы и юнит, и полоса; проверяются они до выдачи
+        if unit is None and policer is None:
+            return None
+        if not str(unit).isdigit():
+            raise ServiceError(400, "Номер юнита должен быть числом")
+        return str(unit), _parse_int(policer, 'policer')
+
+    def _remember(self, network, unit, policer):
+        self.reservations[str(network)] = self._record(str(network), 'reserve', unit=unit, policer=policer)
+
+    def _record(self, subnet, action, **details):
+        entry = {'time': datetime.now().isoformat(timespec='seconds'), 'subnet': subnet, 'action': action}
+        entry.update(details)
+        self._journal.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        return entry
+
+    def close(self):
+        with self._lock:
+            self._journal.close()
+
+    def _response(self, network, render):
+        response = {'subnet': str(network)}
+        if render:
+            unit, policer = render
+            response['check_commands'] = check_commands(network)
+            response['commands'] = config_commands(unit, network, policer)
+            response['summary'] = billing_summary(network, policer * 1024)
+        return response
+
+
+
+def _parse_network(subnet):
+    try:
+        return ipaddress.IPv4Network(str(subnet), strict=False)
+    except ValueError as e:
+        raise ServiceError(400, f"некорректная подсеть: {e}")
+
+
+def _parse_int(value, name):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ServiceError(400, f"{name} должен быть числом")
+
+
+def _read_state(path):
+    """{подсеть: данные выдачи} по журналу; обрезанную при аварии строку пропускает."""
+    reservations = {}
+    if not os.path.exists(path):
+        return reservations
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if entry.get('action') == 'release':
+                reservations.pop(entry['subnet'], None)
+            else:
+                reservations[entry['subnet']] = entry
+    return reservations
+
+
+def _write_state(path, reservations):
+    # Журнал переписывается целиком только при запуске: одна строка на каждую текущую выдачу
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        for entry in reservations.values():
+            f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+    os.replace(tmp_path, path)
+
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    # keep-alive: клиент держит одно соединение, запрос не тратит время на новое TCP-подключение
+    protocol_version = 'HTTP/1.1'
+    # Заголовки и тело уходят отдельными write(): без TCP_NODELAY ответ ждёт задержанного ACK (~40 мс)
+    disable_nagle_algorithm = True
+    service = None
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        if url.path == '/check':
+            self.dispatch(self.service.check, query)
+        elif url.path == '/health':
+            self.send_json(200, {'reservations': len(self.service.reservations)})
+        else:
+            self.send_json(404, {'error': f"неизвестный путь {url.path}"})
+
+    def do_POST(self):
+        handlers = {
+            '/allocate': self.service.allocate,
+            '/reserve': self.service.reserve,
+            '/release': self.service.release,
+        }
+        handler = handlers.get(urlparse(self.path).path)
+        if handler is None:
+            self.send_json(404, {'error': f"неизвестный путь {self.path}"})
+            return
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+            params = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError as e:
+            self.send_json(400, {'error': f"тело запроса не JSON: {e}"})
+            return
+        self.dispatch(handler, params)
+
+    def dispatch(self, handler, params):
+        try:
+            self.send_json(200, handler(**params))
+        except ServiceError as e:
+            self.send_json(e.status, {'error': str(e)})
+        except TypeError as e:
+            # Лишние или отсутствующие поля запроса
+            self.send_json(400, {'error': str(e)})
+
+    def send_json(self, status, data):
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        print(f"[service] {self.address_string()} {format % args}")
+
+
+def refresh_loop(service, interval):
+    while True:
+        time.sleep(interval)
+        try:
+            service.refresh()
+        except Exception as e:
+            print(f"[service] Ошибка при обновлении списков: {e}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Локальный сервис проверки и выдачи подсетей для juniper_routes.py")
+    parser.add_argument('--billing-url', action='append',
+                        help="Список занятых IP биллинга по HTTP; можно несколько (по умолчанию BILLING_URLS)")
+    parser.add_argument('--juniper-file', default=JUNIPER_FILE, help="Выгрузка с Juniper (RIPJUN.txt)")
+    parser.add_argument('--block-file', default=BLOCK_FILE, help="Список заблокированных адресов (zapret.txt)")
+    parser.add_argument('--cache-dir', default=CACHE_DIR, help="Каталог для скомпилированных списков")
+    parser.add_argument('--pool', action='append', default=[], help="Пул адресов для выдачи; можно несколько")
+    parser.add_argument('--state', default=STATE_FILE, help="Файл с выданными подсетями")
+    parser.add_argument('--refresh-interval', type=int, default=REFRESH_INTERVAL, help="Проверка источников, сек.")
+    parser.add_argument('--address', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=55600)
+    args = parser.parse_args()
+
+    sources = load_sources(args.billing_url or BILLING_URLS, args.juniper_file, args.block_file, args.cache_dir)
+    try:
+        service = AllocationService(sources, args.pool, args.state)
+    except ValueError as e:
+        print(f"Ошибка: некорректный пул адресов: {e}")
+        return
+    service.refresh()
+    threading.Thread(target=refresh_loop, args=(service, args.refresh_interval), daemon=True).start()
+
+    ServiceHandler.service = service
+    server = ThreadingHTTPServer((args.address, args.port), ServiceHandler)
+    print(f"Сервис выдачи подсетей на http://{args.address}:{args.port}/ (выдано: {len(service.reservations)})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+
+
+if __name__ == "__main__":
+    main()
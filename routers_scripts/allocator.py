@@ -0,0 +1,133 @@
+import ipaddress
+import threading
+from bisect import bisect_left, bisect_right
+
+
+class SubnetAllocator:
+    """Выдаёт следующую свободную выровненную подсеть нужной длины из пулов адресов.
+
+    Свободна подсеть, в которой нет ни одного занятого адреса ни в одном источнике (биллинг,
+    RIPJUN, zapret) и которая не выдана раньше в этом запуске. Занятый адрес находится одним
+    bisect по каждому источнику, и поиск сразу перепрыгивает на следующий выровненный блок
+    после него. Выданные подсети хранятся слитыми интервалами, а с какого места продолжать,
+    запоминается отдельно для каждого пула и длины префикса - поэтому пакетная выдача
+    тысяч /30 подряд стоит микросекунды на подсеть.
+    """
+
+    def __init__(self, sources, pools):
+        self.sources = list(sources)
+        self.pools = [ipaddress.IPv4Network(pool) for pool in pools]
+        # Выданные интервалы [start, end], отсортированные и без пересечений
+        self._starts = []
+        self._ends = []
+        self._cursors = {}
+        self._lock = threading.Lock()
+
+    def allocate(self, prefixlen=30, pools=None):
+        """Следующая свободная подсеть /prefixlen из первого пула, где она есть, или None.
+
+        pools - искать в этих пулах вместо заданных при создании; уже выданные подсети учитываются те же.
+        """
+        pools = self.pools if pools is None else [ipaddress.IPv4Network(pool) for pool in pools]
+        with self._lock:
+            for pool in pools:
+                if prefixlen < pool.prefixlen:
+                    continue
+                start = self._find(pool, prefixlen)
+                if start is not None:
+                    network = ipaddress.IPv4Network((start, prefixlen))
+                    self._reserve(start, int(network.broadcast_address))
+                    return network
+            return None
+
+    def allocate_many(self, prefixlen, count):
+        """До count свободных подсетей подряд; меньше, если пулы закончились."""
+        networks = []
+        for _ in range(count):
+            network = self.allocate(prefixlen)
+            if network is None:
+                break
+            networks.append(network)
+        return networks
+
+    def reserve(self, network):
+        """Отмечает подсеть как выданную (например, введённую вручную), чтобы allocate() её не предлагал."""
+        network = ipaddress.IPv4Network(network, strict=False)
+        with self._lock:
+            self._reserve(int(network.network_address), int(network.broadcast_address))
+
+    def release(self, network):
+        """Снимает отметку о выдаче с подсети; allocate() снова может её предложить."""
+        network = ipaddress.IPv4Network(network, strict=False)
+        start, end = int(network.network_address), int(network.broadcast_address)
+        with self._lock:
+            i = bisect_right(self._starts, end) - 1
+            # Интервалы, задевающие [start, end], режутся; остатки слева и справа сохраняются
+            while i >= 0 and self._ends[i] >= start:
+                left, right = self._starts[i], self._ends[i]
+                del self._starts[i], self._ends[i]
+                if right > end:
+                    self._starts.insert(i, end + 1)
+                    self._ends.insert(i, right)
+                if left < start:
+                    self._starts.insert(i, left)
+                    self._ends.insert(i, start - 1)
+                i -= 1
+            for key, cursor in self._cursors.items():
+                self._cursors[key] = min(cursor, start)
+
+    def reset_cursors(self):
+        """Начинает следующие поиски с начала пулов: после пересборки источника адреса позади курсоров могли освободиться."""
+        with self._lock:
+            self._cursors.clear()
+
+    def is_reserved(self, network):
+        """Пересекается ли подсеть с уже выданными."""
+        network = ipaddress.IPv4Network(network, strict=False)
+        start, end = int(network.network_address), int(network.broadcast_address)
+        with self._lock:
+            i = bisect_right(self._starts, end) - 1
+            return i >= 0 and self._ends[i] >= start
+
+    def _find(self, pool, prefixlen):
+        size = 1 << (32 - prefixlen)
+        pool_end = int(pool.broadcast_address)
+        key = (pool, prefixlen)
+        start = max(self._cursors.get(key, 0), int(pool.network_address))
+        start = (start + size - 1) // size * size
+        while start + size - 1 <= pool_end:
+            end = start + size - 1
+            busy = self._busy_address(start, end)
+            if busy is None:
+                self._cursors[key] = end + 1
+                return start
+            # Следующий выровненный блок после занятого адреса
+            start = (busy // size + 1) * size
+        self._cursors[key] = pool_end + 1
+        return None
+
+    def _busy_address(self, start, end):
+        """Наибольший известный занятый адрес в [start, end] или None, если диапазон свободен."""
+        busy = None
+        i = bisect_right(self._starts, end) - 1
+        if i >= 0 and self._ends[i] >= start:
+            busy = self._ends[i]
+        for source in self.sources:
+            address = source.next_occupied(start)
+            if address is not None and address <= end and (busy is None or address > busy):
+                busy = address
+        return busy
+
+    def _reserve(self, start, end):
+        # Соседние и пересекающиеся интервалы сливаются: подряд выданные /30 занимают одну запись
+        i = bisect_left(self._starts, start)
+        if i > 0 and self._ends[i - 1] >= start - 1:
+            i -= 1
+            start = self._starts[i]
+            end = max(end, self._ends[i])
+            del self._starts[i], self._ends[i]
+        while i < len(self._starts) and self._starts[i] <= end + 1:
+            end = max(end, self._ends[i])
+            del self._starts[i], self._ends[i]
+        self._starts.insert(i, start)
+        self._ends.insert(i, end)
@@ -0,0 +1,108 @@
+import argparse
+import email.utils
+import hashlib
+import os
+import random
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Замена HTTP-серверу биллинга для прогонов juniper_routes.py без доступа к сети:
+#   billing_standin.py --generate 200000 --delay 1.5
+#   juniper_routes.py --billing-url http://127.0.0.1:55555/blocked_ip.txt --billing-url http://127.0.0.1:55555/blockied_ip_1.txt
+# Отдаёт файлы из --root с ETag и Last-Modified и отвечает 304 на If-None-Match / If-Modified-Since.
+
+CHUNK_SIZE = 64 * 1024
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+    root = '.'
+    delay = 0.0
+    rate = 0
+
+    def do_GET(self):
+        path = os.path.join(self.root, os.path.basename(self.path.split('?')[0]))
+        try:
+            with open(path, 'rb') as f:
+                body = f.read()
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            self.send_error(404, "File not found")
+            return
+        etag = '"' + hashlib.sha1(body).hexdigest()[:16] + '"'
+        last_modified = email.utils.formatdate(mtime, usegmt=True)
+        if self.delay:
+            time.sleep(self.delay)
+        if self.not_modified(etag, mtime):
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        self.send_header('Last-Modified', last_modified)
+        self.end_headers()
+        for offset in range(0, len(body), CHUNK_SIZE):
+            self.wfile.write(body[offset:offset + CHUNK_SIZE])
+            if self.rate:
+                # Медленный канал: не быстрее rate байт в секунду
+                time.sleep(CHUNK_SIZE / self.rate)
+
+    def not_modified(self, etag, mtime):
+        if_none_match = self.headers.get('If-None-Match')
+        if if_none_match:
+            return etag in [tag.strip() for tag in if_none_match.split(',')]
+        if_modified_since = self.headers.get('If-Modified-Since')
+        if if_modified_since:
+            try:
+                since = email.utils.parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+            return int(mtime) <= since
+        return False
+
+    def log_message(self, format, *args):
+        print(f"[standin] {self.address_string()} {format % args}")
+
+
+def generate_list(path, count, seed):
+    """Файл из count случайных адресов 10.0.0.0/8 по одному в строке."""
+    rng = random.Random(f"{seed}:{os.path.basename(path)}")
+    with open(path, 'w', encoding='utf-8') as f:
+        for _ in range(count):
+            f.write(f"10.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(0, 255)}\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Локальная замена HTTP-серверу списков занятых IP биллинга")
+    parser.add_argument('--root', default='.', help="Каталог с файлами списков (по умолчанию текущий)")
+    parser.add_argument('--address', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=55555)
+    parser.add_argument('--delay', type=float, default=0.0, help="Задержка перед ответом, сек.")
+    parser.add_argument('--rate', type=int, default=0, help="Ограничение скорости отдачи, байт/с (0 - без ограничения)")
+    parser.add_argument('--generate', type=int, default=0,
+                        help="Создать в --root blocked_ip.txt и blockied_ip_1.txt по столько адресов")
+    parser.add_argument('--seed', default='billing', help="Зерно генерации списков")
+    args = parser.parse_args()
+
+    if args.generate:
+        for name in ('blocked_ip.txt', 'blockied_ip_1.txt'):
+            generate_list(os.path.join(args.root, name), args.generate, args.seed)
+            print(f"Создан {os.path.join(args.root, name)}: {args.generate} адресов")
+
+    StandinHandler.root = args.root
+    StandinHandler.delay = args.delay
+    StandinHandler.rate = args.rate
+    server = ThreadingHTTPServer((args.address, args.port), StandinHandler)
+    print(f"Списки из {os.path.abspath(args.root)} на http://{args.address}:{args.port}/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,128 +1,383 @@
+import argparse
+import csv
 import ipaddress
+import itertools
+import json
+import sys
 import requests
+from concurrent.futures import ThreadPoolExecutor, wait
+from allocator import SubnetAllocator
+from occupancy import FETCH_TIMEOUT, OccupancySource, make_session
+from prefix_index import PrefixIndex
 
-def is_subnet_occupied(network, occupied_ips):
-    for ip in network:
-        if str(ip) in occupied_ips:
-            return True
-    return False
+# Источники занятых адресов: биллинг по HTTP и выгрузки с Juniper
+BILLING_URLS = [
+    "http://x.x.x.x:55555/blockied_ip_1.txt",
+    "http://y.y.y.y:55555/blocked_ip.txt",
+]
+# Выгрузки с Juniper можно класть как есть: 'show route', 'show configuration ... | display set' или адрес в строке
+JUNIPER_FILE = r"D:\Путь\к\файлу\RIPJUN.txt"
+BLOCK_FILE = r"D:\Путь\к\файлу\zapret.txt"
+# Скомпилированные списки (.idx) и версии источников, с которых они собраны
+CACHE_DIR = 'occupied_ip_cache'
 
-def get_occupied_ips(url):
+def is_subnet_occupied(network, sources):
+    # Двоичный поиск по отсортированным адресам вместо перебора всех адресов подсети
+    return any(source.overlaps(network) for source in sources)
+
+def load_sources(billing_urls=BILLING_URLS, juniper_file=JUNIPER_FILE, block_file=BLOCK_FILE, cache_dir=CACHE_DIR):
+    # Все HTTP-источники ходят через одну сессию с пулом соединений
+    session = make_session(len(billing_urls))
+    return {
+        'billing': [OccupancySource(url, cache_dir, session=session) for url in billing_urls],
+        'juniper': [OccupancySource(juniper_file, cache_dir, index_class=PrefixIndex)],
+        'juniper_block': [OccupancySource(block_file, cache_dir, index_class=PrefixIndex)],
+    }
+
+def refresh_sources(sources, executor):
+    # Все источники обновляются параллельно в фоне; пересобирается только изменившийся
+    return [executor.submit(source.refresh) for group in sources.values() for source in group]
+
+def wait_sources(pending):
+    if not all(future.done() for future in pending):
+        print("Ожидание загрузки списков занятых IP...")
+    wait(pending)
+
+def occupancy_error(network, sources):
+    # Причина, по которой подсеть нельзя выдать, или None, если она свободна
+    if any(source.has_term(network) for source in sources['juniper']):
+        return "Терм уже есть в фильтре"
+    occupied_in_billing = is_subnet_occupied(network, sources['billing'])
+    occupied_in_juniper = is_subnet_occupied(network, sources['juniper'])
+    occupied_in_juniper1 = is_subnet_occupied(network, sources['juniper_block'])
+
+    if occupied_in_billing and occupied_in_juniper:
+        return "IP ADDRESS ЗАНЯТ"
+    elif occupied_in_juniper:
+        return "Занят по джунипер"
+    elif occupied_in_juniper1:
+        return "Занят блок"
+    elif occupied_in_billing:
+        return "занят по биллингу"
+    return None
+
+def check_commands(network):
+    # Проверочные show-команды перед вводом конфигурации
+    first_ip1 = network.network_address + 2
+    return [
+        f"show route {network.network_address}/{network.prefixlen}",
+        f'show configuration firewall family inet filter "Name_filter" term {network.network_address}/{network.prefixlen}',
+        f'show configuration firewall family inet filter "Name_filter" term {first_ip1}/{network.prefixlen+2}',
+    ]
+
+def config_commands(unit, network, policer):
+    first_ip = network.network_address + 1
+    return [
+        f"set interfaces xe-0/0/1 unit {unit} family inet address {first_ip}/{network.prefixlen}",
+        f'set firewall family inet filter "Name_filter" term {network.network_address}/{network.prefixlen} from address {network.network_address}/{network.prefixlen}',
+        f'set firewall family inet filter "Name_filter" term {network.network_address}/{network.prefixlen} then policer "{policer} Mbps"',
+        f'insert firewall family inet filter "Name_filter" term {network.network_address}/{network.prefixlen} before term "Allow ALL"',
+    ]
+
+def parse_policer(text):
+    # Полоса в Mbps: целое больше нуля, пробелы вокруг допускаются; одна проверка для всех режимов
     try:
-        response = requests.get(url)
-        response.raise_for_status()
-        return set(line.strip() for line in response.text.splitlines() if line.strip())
-    except Exception as e:
-        print(f"Ошибка при загрузке файла с занятыми IP: {e}")
-        print("Продолжаем без проверки занятости IP.")
-        return set()
-
-def get_occupied_ips_from_file(file_path):
+        policer = int(str(text).strip())
+    except ValueError:
+        policer = None
+    if policer is None or policer <= 0:
+        raise ValueError("Полоса должна быть целым числом Mbps больше нуля (например, 10)")
+    return policer
+
+def billing_summary(network, policer_kbps):
+    first_ip = network.network_address + 1
+    first_ip1 = network.network_address + 2
+    return (f"\n========================\n"
+            f"Сеть для биллинга: {network.network_address}/{network.prefixlen}\n"
+            f"========================\n\n"
+            f"IP адрес: {first_ip1}\n"
+            f"Маска подсети: {network.netmask}\n"
+            f"Шлюз: {first_ip}\n\n"
+            f"DNS 1: z.z.z.z\n"
+            f"DNS 2: w.w.w.w\n\n"
+            f"==========================\n"
+            f"p{policer_kbps}-полоса прописана\n")
+
+def allocate_free(allocator, sources, prefixlen, pools=None):
+    # Следующая подсеть из пулов, которую пропускает и occupancy_error (например, без терма с тем же
+    # именем); отвергнутые остаются отмеченными в allocator и больше не предлагаются
+    while True:
+        network = allocator.allocate(prefixlen, pools)
+        if network is None or occupancy_error(network, sources) is None:
+            return network
+
+def allocate_subnet(allocator, sources, request):
+    # 'auto' - свободная /30, 'auto/29' - свободная /29
+    prefix = request[len('auto'):].lstrip('/') or '30'
+    if not prefix.isdigit() or not 0 <= int(prefix) <= 32:
+        print(f"Ошибка: некорректная длина префикса '{prefix}'.")
+        return None
+    network = allocate_free(allocator, sources, int(prefix))
+    if network is None:
+        print(f"Свободных подсетей /{prefix} в пулах нет.")
+    else:
+        print(f"Выбрана свободная подсеть {network}")
+    return network
+
+def generate_juniper_command(sources, executor, allocator=None):
+    # Списки подтягиваются, пока инженер вводит юнит и подсеть
+    pending = refresh_sources(sources, executor)
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            return set(line.strip() for line in f if line.strip())
-    except Exception as e:
-        print(f"Ошибка при чтении файла с занятыми IP: {e}")
-        print("Продолжаем без проверки занятости IP из файла.")
-        return set()
-
-def generate_juniper_command():
-    occupied_billing = set()
-    occupied_billing.update(get_occupied_ips("http://x.x.x.x:55555/blockied_ip_1.txt"))
-    occupied_billing.update(get_occupied_ips("http://y.y.y.y:55555/blocked_ip.txt"))
-
-    file_path = r"D:\Путь\к\файлу\RIPJUN.txt"
-    file_path1 = r"D:\Путь\к\файлу\zapret.txt"
-
-    occupied_juniper = get_occupied_ips_from_file(file_path)
-    occupied_juniper1 = get_occupied_ips_from_file(file_path1)
+        unit = input("Введите номер юнита (например, 401): ").strip()
+        if not unit.isdigit():
+            raise ValueError("Номер юнита должен быть числом")
+
+        while True:
+            subnet = input("Введите номер подсети с маской (например, X.X.X.X/30) или auto для выбора свободной: ").strip()
+            if subnet.lower().startswith('auto'):
+                if allocator is None:
+                    print("Пулы адресов не заданы: запустите с --pool X.X.X.X/NN.")
+                    continue
+                wait_sources(pending)
+                if any(future.result() for future in pending):
+                    # Список пересобран: освободившиеся адреса позади курсоров снова можно выдать
+                    allocator.reset_cursors()
+                network = allocate_subnet(allocator, sources, subnet.lower())
+                if network is None:
+                    continue
+            else:
+                try:
+                    network = ipaddress.IPv4Network(subnet, strict=False)
+                except ValueError as e:
+                    print(f"Ошибка: {e}. Введите корректную подсеть.")
+                    continue
+
+            wait_sources(pending)
+
+            occupied = occupancy_error(network, sources)
+            if occupied:
+                print(f"{occupied}. Введите свободную подсеть.")
+                continue
+            break
+
+        try:
+            policer = parse_policer(input("Введите полосу в (Mbps): "))
+        except (ValueError, KeyboardInterrupt):
+            if allocator and subnet.lower().startswith('auto'):
+                # Выданная из пула подсеть не пригодилась: возвращаем её в пул
+                allocator.release(network)
+            raise
+        policer_kbps = policer * 1024
+
+        if allocator:
+            # Введённая вручную подсеть тоже больше не предлагается
+            allocator.reserve(network)
+
+        print("\nСгенерированная команда:\n")
+        for command in check_commands(network):
+            print(command)
+        print('\n')
+        for command in config_commands(unit, network, policer):
+            print(command)
+
+        print(billing_summary(network, policer_kbps))
+
+    except ValueError as e:
+        print(f"\nОшибка: {e}")
+    except KeyboardInterrupt:
+        print("\nОперация отменена пользователем")
+        raise
+
+def service_request(session, service_url, path, params):
+    # Запрос к allocation_service.py; ответ сервиса с ошибкой - ValueError с его текстом
+    url = service_url.rstrip('/') + path
+    if path == '/check':
+        response = session.get(url, params=params, timeout=FETCH_TIMEOUT)
+    else:
+        response = session.post(url, json=params, timeout=FETCH_TIMEOUT)
+    data = response.json()
+    if response.status_code != 200:
+        raise ValueError(data.get('error', f"HTTP {response.status_code}"))
+    return data
+
+def generate_via_service(session, service_url):
+    # Тот же диалог, но проверка и выдача подсети выполняются общим сервисом
     try:
         unit = input("Введите номер юнита (например, 401): ").strip()
         if not unit.isdigit():
             raise ValueError("Номер юнита должен быть числом")
 
         while True:
-            subnet = input("Введите номер подсети с маской (например, X.X.X.X/30): ").strip()
+            subnet = input("Введите номер подсети с маской (например, X.X.X.X/30) или auto для выбора свободной: ").strip()
+            if subnet.lower().startswith('auto'):
+                prefix = subnet[len('auto'):].lstrip('/') or '30'
+                break
             try:
-                network = ipaddress.IPv4Network(subnet, strict=False)
+                checked = service_request(session, service_url, '/check', {'subnet': subnet})
             except ValueError as e:
                 print(f"Ошибка: {e}. Введите корректную подсеть.")
                 continue
-
-            occupied_in_billing = is_subnet_occupied(network, occupied_billing)
-            occupied_in_juniper = is_subnet_occupied(network, occupied_juniper)
-            occupied_in_juniper1 = is_subnet_occupied(network, occupied_juniper1)
-
-            if occupied_in_billing and occupied_in_juniper:
-                print("IP ADDRESS ЗАНЯТ. Введите свободную подсеть.")
-                continue
-            elif occupied_in_juniper:
-                print("Занят по джунипер. Введите свободную подсеть.")
-                continue
-            elif occupied_in_juniper1:
-                print("Занят блок. Введите свободную подсеть.")
+            if not checked['free']:
+                print(f"{checked['reason']}. Введите свободную подсеть.")
                 continue
-            elif occupied_in_billing:
-                print("занят по биллингу. Введите свободную подсеть.")
-                continue
-            else:
-                break
-
-        policer = input("Введите полосу в (Mbps): ").strip()
-        try:
-            policer_mbps = int(policer)
-            policer_kbps = policer_mbps * 1024
-        except ValueError:
-            print("Ошибка: Полоса должна быть числом (например, 10 или 10.5).")
-            return
+            prefix = None
+            break
 
-        first_ip = network.network_address + 1
-        first_ip1 = network.network_address + 2
-        subnet_mask = str(network.netmask)
+        policer = parse_policer(input("Введите полосу в (Mbps): "))
 
-        command5 = f"show route {network.network_address}/{network.prefixlen}"
-        command7 = f'show configuration firewall family inet filter "Name_filter" term {network.network_address}/{network.prefixlen}'
-        command6 = f'show configuration firewall family inet filter "Name_filter" term {first_ip1}/{network.prefixlen+2}'
-        command8 = f'\n'
-        command = f"set interfaces xe-0/0/1 unit {unit} family inet address {first_ip}/{network.prefixlen}"
-        command1 = f'set firewall family inet filter "Name_filter" term {network.network_address}/{network.prefixlen} from address {network.network_address}/{network.prefixlen}'       
-        command2 = f'set firewall family inet filter "Name_filter" term {network.network_address}/{network.prefixlen} then policer "{policer} Mbps"'
-        command3 = f'insert firewall family inet filter "Name_filter" term {network.network_address}/{network.prefixlen} before term "Allow ALL"'
+        # Подсеть занимается только здесь: если её успел взять другой инженер, сервис ответит ошибкой
+        if prefix is None:
+            result = service_request(session, service_url, '/reserve', {'subnet': subnet, 'unit': unit, 'policer': policer})
+        else:
+            result = service_request(session, service_url, '/allocate', {'prefix': prefix, 'unit': unit, 'policer': policer})
+            print(f"Выбрана свободная подсеть {result['subnet']}")
 
         print("\nСгенерированная команда:\n")
-        print(command5)
-        print(command7)
-        print(command6)
-        print(command8)
-        print(command)
-        print(command1)
-        print(command2)
-        print(command3)
-
-        print(f"\n========================\n"
-              f"Сеть для биллинга: {network.network_address}/{network.prefixlen}\n"
-              f"========================\n\n"
-              f"IP адрес: {first_ip1}\n"
-              f"Маска подсети: {subnet_mask}\n"
-              f"Шлюз: {first_ip}\n\n"
-              f"DNS 1: z.z.z.z\n"
-              f"DNS 2: w.w.w.w\n\n"
-              f"==========================\n"
-              f"p{policer_kbps}-полоса прописана\n")
+        for command in result['check_commands']:
+            print(command)
+        print('\n')
+        for command in result['commands']:
+            print(command)
+
+        print(result['summary'])
 
     except ValueError as e:
         print(f"\nОшибка: {e}")
+    except requests.RequestException as e:
+        print(f"\nОшибка при обращении к сервису {service_url}: {e}")
     except KeyboardInterrupt:
         print("\nОперация отменена пользователем")
         raise
 
-if __name__ == "__main__":
-    print("Введите данные (для выхода нажмите Ctrl+C)\n")
-    while True:
+def iter_batch_rows(path):
+    # Строки пакета из CSV (unit,subnet,pool,prefix,policer) или JSONL с теми же ключами; '-' - stdin
+    f = sys.stdin if path == '-' else open(path, encoding='utf-8', newline='')
+    try:
+        first = f.readline()
+        lines = itertools.chain([first], f)
+        if first.lstrip().startswith('{'):
+            rows = (json.loads(line) for line in lines if line.strip())
+        else:
+            rows = csv.DictReader(lines)
+        for number, row in enumerate(rows, 1):
+            yield number, {str(key).strip().lower(): str(value).strip() for key, value in row.items()
+                           if key is not None and value is not None}
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+def batch_subnet(row, sources, allocator):
+    # Подсеть для строки пакета: заданная явно (проверяется) или выделенная из пула
+    subnet = row.get('subnet', '')
+    if subnet and not subnet.lower().startswith('auto'):
+        network = ipaddress.IPv4Network(subnet, strict=False)
+        if allocator.is_reserved(network):
+            raise ValueError(f"подсеть {network} уже выдана выше в этом пакете")
+        occupied = occupancy_error(network, sources)
+        if occupied:
+            raise ValueError(f"{network}: {occupied}")
+        allocator.reserve(network)
+        return network
+    prefix = subnet[len('auto'):].lstrip('/') or row.get('prefix') or '30'
+    if not prefix.isdigit() or not 0 <= int(prefix) <= 32:
+        raise ValueError(f"некорректная длина префикса '{prefix}'")
+    pools = [row['pool']] if row.get('pool') else None
+    if pools is None and not allocator.pools:
+        raise ValueError("не указаны ни подсеть, ни пул (столбец pool или --pool)")
+    network = allocate_free(allocator, sources, int(prefix), pools)
+    if network is None:
+        raise ValueError(f"свободных подсетей /{prefix} в пуле {row.get('pool') or ', '.join(map(str, allocator.pools))} нет")
+    return network
+
+def run_batch(path, sources, allocator, commands_path, summary_path):
+    # Все строки проверяются за один проход; команды и данные для биллинга пишутся по мере обработки
+    processed = 0
+    errors = []
+    units = set()
+    with open(commands_path, 'w', encoding='utf-8') as commands_file, \
+            open(summary_path, 'w', encoding='utf-8') as summary_file:
+        for number, row in iter_batch_rows(path):
+            processed += 1
+            unit = row.get('unit', '')
+            try:
+                if not unit.isdigit():
+                    raise ValueError("Номер юнита должен быть числом")
+                if unit in units:
+                    raise ValueError(f"юнит {unit} уже встречался выше в этом пакете")
+                policer = parse_policer(row.get('policer', ''))
+                network = batch_subnet(row, sources, allocator)
+            except ValueError as e:
+                errors.append((number, unit, str(e)))
+                print(f"Строка {number} (юнит {unit or '?'}): {e}")
+                continue
+            units.add(unit)
+            commands_file.write(f"# unit {unit} {network} {policer} Mbps\n")
+            commands_file.write('\n'.join(config_commands(unit, network, policer)) + '\n')
+            summary_file.write(f"Юнит {unit}" + billing_summary(network, policer * 1024) + '\n')
+
+    print(f"\nОбработано строк: {processed}, сгенерировано: {processed - len(errors)}, с ошибками: {len(errors)}")
+    print(f"Команды: {commands_path}")
+    print(f"Данные для биллинга: {summary_path}")
+    return errors
+
+def main():
+    parser = argparse.ArgumentParser(description="Генерация конфигурации для Juniper-маршрутизаторов")
+    parser.add_argument('--billing-url', action='append',
+                        help="Список занятых IP биллинга по HTTP; можно несколько (по умолчанию BILLING_URLS)")
+    parser.add_argument('--juniper-file', default=JUNIPER_FILE, help="Выгрузка адресов с Juniper (RIPJUN.txt)")
+    parser.add_argument('--block-file', default=BLOCK_FILE, help="Список заблокированных адресов (zapret.txt)")
+    parser.add_argument('--cache-dir', default=CACHE_DIR, help="Каталог для скомпилированных списков")
+    parser.add_argument('--pool', action='append', default=[],
+                        help="Пул адресов для автоматического выбора подсети (ввод 'auto'), например 10.0.0.0/16; можно несколько")
+    parser.add_argument('--service',
+                        help="Адрес allocation_service.py (например, http://127.0.0.1:55600): проверка и выдача подсетей через общий сервис")
+    parser.add_argument('--batch',
+                        help="Пакетный режим: CSV (unit,subnet,pool,prefix,policer) или JSONL с теми же ключами; '-' - stdin")
+    parser.add_argument('--commands-out', default='juniper_commands.txt', help="Файл для команд в пакетном режиме")
+    parser.add_argument('--summary-out', default='billing_summary.txt', help="Файл с данными для биллинга в пакетном режиме")
+    args = parser.parse_args()
+
+    if args.service and not args.batch:
+        session = make_session(1)
+        print("Введите данные (для выхода нажмите Ctrl+C)\n")
+        while True:
+            try:
+                generate_via_service(session, args.service)
+                print("Готово! Для нового ввода введите данные...\n")
+            except KeyboardInterrupt:
+                print("\nПрограмма завершена.")
+                break
+        return
+
+    sources = load_sources(args.billing_url or BILLING_URLS, args.juniper_file, args.block_file, args.cache_dir)
+    allocator = None
+    if args.pool or args.batch:
         try:
-            generate_juniper_command()
-            print("Готово! Для нового ввода введите данные...\n")
-        except KeyboardInterrupt:
-            print("\nПрограмма завершена.")
-            break
+            allocator = SubnetAllocator([source for group in sources.values() for source in group], args.pool)
+        except ValueError as e:
+            print(f"Ошибка: некорректный пул адресов: {e}")
+            return
+    executor = ThreadPoolExecutor(max_workers=sum(len(group) for group in sources.values()))
+    if args.batch:
+        try:
+            wait_sources(refresh_sources(sources, executor))
+            errors = run_batch(args.batch, sources, allocator, args.commands_out, args.summary_out)
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+        sys.exit(1 if errors else 0)
+
+    print("Введите данные (для выхода нажмите Ctrl+C)\n")
+    try:
+        while True:
+            try:
+                generate_juniper_command(sources, executor, allocator)
+                print("Готово! Для нового ввода введите данные...\n")
+            except KeyboardInterrupt:
+                print("\nПрограмма завершена.")
+                break
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+if __name__ == "__main__":
+    main()
 
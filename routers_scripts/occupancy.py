@@ -0,0 +1,249 @@
+import hashlib
+import ipaddress
+import json
+import mmap
+import os
+import re
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from contextlib import nullcontext
+
+import requests
+
+# Как часто спрашивать HTTP-источник, не изменился ли он (If-None-Match / If-Modified-Since), сек.
+URL_CHECK_INTERVAL = 60
+# Таймауты HTTP: (подключение, пауза между порциями ответа), сек.
+FETCH_TIMEOUT = (5, 30)
+
+
+def make_session(pool_size=8):
+    """requests.Session с пулом keep-alive соединений на pool_size параллельных загрузок."""
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def parse_address(line):
+    """Целое значение адреса, если строка - IPv4-адрес в каноническом виде ('10.0.0.1'), иначе None.
+
+    Прежняя проверка сравнивала строки, поэтому '10.0.0.0/30' или '010.0.0.1' никогда не считались
+    занятыми - индекс сохраняет это поведение. Строки ожидаются уже без пробелов по краям.
+    """
+    try:
+        address = ipaddress.IPv4Address(line)
+    except ValueError:
+        return None
+    if str(address) != line:
+        return None
+    return int(address)
+
+
+class OccupancyIndex:
+    """Занятые адреса как отсортированный массив uint32: проверка подсети любого размера - один bisect.
+
+    addresses - array('I') в памяти или memoryview на отображённый в память скомпилированный файл.
+    """
+
+    typecode = 'I'
+    format = 'OccupancyIndex'
+
+    def __init__(self, lines=()):
+        addresses = set()
+        for line in lines:
+            value = parse_address(line)
+            if value is not None:
+                addresses.add(value)
+        self.addresses = array('I', sorted(addresses))
+
+    @classmethod
+    def from_buffer(cls, addresses):
+        index = cls()
+        index.addresses = addresses
+        return index
+
+    def __len__(self):
+        return len(self.addresses)
+
+    def tobytes(self):
+        return self.addresses.tobytes()
+
+    def release(self):
+        if isinstance(self.addresses, memoryview):
+            self.addresses.release()
+
+    def overlaps(self, network):
+        """Есть ли занятый адрес в network (включая адрес сети и широковещательный)."""
+        start = int(network.network_address)
+        end = int(network.broadcast_address)
+        i = bisect_left(self.addresses, start)
+        return i < len(self.addresses) and self.addresses[i] <= end
+
+    def next_occupied(self, address):
+        """Наименьший занятый адрес (int), не меньший address, или None."""
+        i = bisect_left(self.addresses, address)
+        return self.addresses[i] if i < len(self.addresses) else None
+
+    def has_term(self, network):
+        # В списке отдельных адресов термов фильтров нет
+        return False
+
+
+class OccupancySource:
+    """Список занятых адресов из файла или по HTTP, скомпилированный в <cache_dir>/<ключ>.idx.
+
+    .idx - отсортированные адреса подряд (uint32), он отображается в память без разбора текста.
+    index_class=PrefixIndex разбирает вместо адресов сырые выгрузки маршрутов и термов Juniper.
+    Рядом в .json лежит, с какой версии источника он собран: mtime и размер файла или ETag и
+    Last-Modified ответа. refresh() пересобирает индекс, только если источник изменился; для файла
+    это один stat(), HTTP-источник переспрашивается не чаще раза в check_interval секунд.
+    """
+
+    def __init__(self, location, cache_dir, check_interval=URL_CHECK_INTERVAL, session=None, index_class=OccupancyIndex):
+        self.location = location
+        self.index_class = index_class
+        # Общая requests.Session держит соединения открытыми между обновлениями
+        self.session = session or requests
+        self.is_url = bool(re.match(r'https?://', location))
+        self.check_interval = check_interval
+        key = hashlib.sha1(location.encode('utf-8')).hexdigest()[:16]
+        self.index_path = os.path.join(cache_dir, f'{key}.idx')
+        self.meta_path = os.path.join(cache_dir, f'{key}.json')
+        os.makedirs(cache_dir, exist_ok=True)
+        self.index = index_class()
+        self.loaded = False
+        self.checked_at = 0
+        self._mmap = None
+        self._view = None
+        self._lock = threading.Lock()
+
+    def overlaps(self, network):
+        return self.index.overlaps(network)
+
+    def next_occupied(self, address):
+        return self.index.next_occupied(address)
+
+    def has_term(self, network):
+        return self.index.has_term(network)
+
+    def refresh(self, swap_lock=None):
+        """Подтягивает изменения источника. Возвращает True, если индекс пересобран.
+
+        Можно вызывать из фонового потока: одновременные вызовы для одного источника выполняются по очереди.
+        swap_lock берётся только на подмену отображённого индекса, загрузка и сборка идут без него:
+        читатели, проверяющие занятость под тем же swap_lock, не ждут обновления и не видят закрытый индекс.
+        """
+        with self._lock:
+            return self._refresh(swap_lock or nullcontext())
+
+    def _refresh(self, swap):
+        if self.is_url and self.loaded and time.monotonic() - self.checked_at < self.check_interval:
+            return False
+        meta = self._read_meta()
+        try:
+            if self.is_url:
+                rebuilt = self._fetch_url(meta, swap)
+            else:
+                rebuilt = self._read_file(meta, swap)
+        except Exception as e:
+            print(f"Ошибка при загрузке списка занятых IP {self.location}: {e}")
+            if meta:
+                print("Используем последнюю сохранённую копию.")
+                if not self.loaded:
+                    with swap:
+                        self._map()
+            else:
+                print("Продолжаем без проверки занятости IP.")
+            return False
+        self.checked_at = time.monotonic()
+        if not rebuilt and not self.loaded:
+            # Источник не изменился - берём собранный ранее индекс
+            with swap:
+                self._map()
+        return rebuilt
+
+    def _read_meta(self):
+        if not os.path.exists(self.index_path):
+            return None
+        try:
+            with open(self.meta_path, encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        # Индекс другого формата (адреса вместо префиксов, старая раскладка ключей) не годится даже как запасная копия
+        if meta.get('format', OccupancyIndex.format) != self.index_class.format:
+            return None
+        return meta
+
+    def _read_file(self, meta, swap):
+        stat = os.stat(self.location)
+        version = {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size, 'format': self.index_class.format}
+        if meta and all(meta.get(field) == value for field, value in version.items()):
+            return False
+        with open(self.location, 'r', encoding='utf-8') as f:
+            self._compile((line.strip() for line in f if line.strip()), version, swap)
+        return True
+
+    def _fetch_url(self, meta, swap):
+        headers = {}
+        if meta and meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta and meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+        # stream=True: тело разбирается построчно по мере получения, целиком в памяти не держится
+        with self.session.get(self.location, headers=headers, timeout=FETCH_TIMEOUT, stream=True) as response:
+            if meta and response.status_code == 304:
+                return False
+            response.raise_for_status()
+            if response.encoding is None:
+                response.encoding = 'utf-8'
+            version = {'etag': response.headers.get('ETag'), 'last_modified': response.headers.get('Last-Modified'),
+                       'format': self.index_class.format}
+            lines = response.iter_lines(chunk_size=64 * 1024, decode_unicode=True)
+            self._compile((line.strip() for line in lines if line.strip()), version, swap)
+        return True
+
+    def _compile(self, lines, version, swap):
+        index = self.index_class(lines)
+        tmp_path = self.index_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(index.tobytes())
+        meta = dict(version, location=self.location, count=len(index))
+        with open(self.meta_path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+        with swap:
+            # Старое отображение закрываем до замены файла: на Windows отображённый файл не заменить
+            self._unmap()
+            os.replace(tmp_path, self.index_path)
+            os.replace(self.meta_path + '.tmp', self.meta_path)
+            self._map()
+        print(f"Список {self.location} обновлён: {len(index)} записей")
+
+    def _map(self):
+        self._unmap()
+        self.loaded = True
+        with open(self.index_path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                # Пустой файл отобразить нельзя
+                return
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mmap)
+        self.index = self.index_class.from_buffer(self._view.cast(self.index_class.typecode))
+
+    def _unmap(self):
+        self.loaded = False
+        if self._mmap is None:
+            return
+        # Пока на отображение есть memoryview, закрыть его нельзя
+        self.index.release()
+        self._view.release()
+        self._mmap.close()
+        self.index = self.index_class()
+        self._mmap = None
+        self._view = None
+
+    def close(self):
+        self._unmap()
@@ -0,0 +1,156 @@
+import ipaddress
+import re
+from array import array
+from bisect import bisect_left
+
+# Маршруты короче этой длины (default, агрегаты, discard-блоки) не занимают ни подсети внутри себя,
+# ни подсети, в которые сами попадают. Адресов интерфейсов и from address это не касается
+AGGREGATE_PREFIXLEN = 24
+
+# Ключ префикса: вид << 38 | адрес сети << 6 | длина. Маршруты, адреса из конфигурации и термы
+# фильтров - три непересекающихся отсортированных диапазона одного uint64-массива
+PREFIX_BITS = 6
+KIND_SHIFT = 32 + PREFIX_BITS
+ROUTE, ADDRESS, TERM = 0, 1, 2
+
+# Строка маршрута из 'show route' / 'show route terse': '10.0.0.0/30  *[Direct/0] ...', '* ? 10.0.0.0/30  D 0 ...'
+# Голый адрес в строке ('10.0.0.5', прежний формат RIPJUN.txt) - это /32
+ROUTE_LINE = re.compile(r'[*+\-?\s]*(\d{1,3}(?:\.\d{1,3}){3}(?:/\d{1,2})?)(?:\s|$)')
+# Строки '| display set': адрес интерфейса, static route, from address, имя терма фильтра
+SET_LINE = re.compile(r'(?:set|insert)\s')
+SET_PREFIX = re.compile(r'\b(address|route)\s+(\d{1,3}(?:\.\d{1,3}){3}(?:/\d{1,2})?)(?:\s|$)')
+SET_TERM = re.compile(r'\bfilter\s+\S+\s+term\s+"?(\d{1,3}(?:\.\d{1,3}){3}/\d{1,2})"?')
+
+
+def parse_prefix(text):
+    """(адрес сети int, длина) из '10.1.2.1/30' или '10.1.2.1' (/32); биты хоста обнуляются. None, если не префикс."""
+    address, _, prefixlen = text.partition('/')
+    prefixlen = int(prefixlen) if prefixlen else 32
+    octets = address.split('.')
+    if prefixlen > 32 or len(octets) != 4:
+        return None
+    value = 0
+    for octet in octets:
+        # '010' не принимается, как и в ipaddress
+        if len(octet) > 1 and octet[0] == '0' or int(octet) > 255:
+            return None
+        value = value << 8 | int(octet)
+    mask = (0xFFFFFFFF << (32 - prefixlen)) & 0xFFFFFFFF
+    return value & mask, prefixlen
+
+
+def parse_dump_line(line):
+    """Префиксы из строки выгрузки Juniper: список (вид, адрес сети int, длина).
+
+    Вид - ROUTE (строка маршрута, static route), ADDRESS (адрес интерфейса, from address) или TERM.
+    Адрес интерфейса 10.1.2.1/30 занимает всю сеть 10.1.2.0/30. Термы учитываются, только если
+    называются префиксом, как их создаёт juniper_routes.py (term 10.1.2.0/30).
+    """
+    if SET_LINE.match(line):
+        found = []
+        term = SET_TERM.search(line)
+        if term:
+            prefix = parse_prefix(term.group(1))
+            if prefix:
+                found.append((TERM,) + prefix)
+        for match in SET_PREFIX.finditer(line):
+            prefix = parse_prefix(match.group(2))
+            if prefix:
+                found.append((ADDRESS if match.group(1) == 'address' else ROUTE,) + prefix)
+        return found
+    match = ROUTE_LINE.match(line)
+    if match:
+        prefix = parse_prefix(match.group(1))
+        if prefix:
+            return [(ROUTE,) + prefix]
+    return []
+
+
+class PrefixIndex:
+    """Занятые префиксы и существующие термы фильтров из сырых выгрузок 'show route' и '| display set'.
+
+    Вместо дерева из узлов префиксы лежат отсортированным массивом ключей (вид, адрес сети, длина):
+    поиск самого длинного совпадения - по bisect на каждую длину от длины подсети до 0, поиск
+    префиксов внутри подсети - один bisect. Массив, как и у OccupancyIndex, пишется в .idx и
+    отображается в память без разбора текста.
+    """
+
+    typecode = 'Q'
+    # Меняется вместе с раскладкой ключа: собранный по старой раскладке .idx пересобирается
+    format = 'PrefixIndex/2'
+
+    def __init__(self, lines=()):
+        keys = set()
+        for line in lines:
+            for kind, address, prefixlen in parse_dump_line(line):
+                keys.add(self._key(address, prefixlen, kind))
+        self.keys = array(self.typecode, sorted(keys))
+
+    @classmethod
+    def from_buffer(cls, keys):
+        index = cls()
+        index.keys = keys
+        return index
+
+    def __len__(self):
+        return len(self.keys)
+
+    def tobytes(self):
+        return self.keys.tobytes()
+
+    def release(self):
+        if isinstance(self.keys, memoryview):
+            self.keys.release()
+
+    @staticmethod
+    def _key(address, prefixlen, kind=ROUTE):
+        return kind << KIND_SHIFT | address << PREFIX_BITS | prefixlen
+
+    def _contains_key(self, key):
+        i = bisect_left(self.keys, key)
+        return i < len(self.keys) and self.keys[i] == key
+
+    def longest_match(self, network, min_prefixlen=0, kind=ROUTE):
+        """Самый длинный префикс вида kind, содержащий network (не короче min_prefixlen), или None."""
+        address = int(network.network_address)
+        for prefixlen in range(network.prefixlen, min_prefixlen - 1, -1):
+            mask = (0xFFFFFFFF << (32 - prefixlen)) & 0xFFFFFFFF
+            if self._contains_key(self._key(address & mask, prefixlen, kind)):
+                return ipaddress.IPv4Network((address & mask, prefixlen))
+        return None
+
+    def _first_inside(self, start, end, min_prefixlen, kind):
+        # Адрес сети первого префикса вида kind не короче min_prefixlen, начинающегося в [start, end]
+        i = bisect_left(self.keys, self._key(start, 0, kind))
+        limit = self._key(end + 1, 0, kind) if end < 0xFFFFFFFF else self._key(0, 0, kind + 1)
+        while i < len(self.keys) and self.keys[i] < limit:
+            if self.keys[i] & ((1 << PREFIX_BITS) - 1) >= min_prefixlen:
+                return (self.keys[i] >> PREFIX_BITS) & 0xFFFFFFFF
+            i += 1
+        return None
+
+    def _occupied(self, start, end, min_prefixlen, kind):
+        # Первый занятый адрес в [start, end] по префиксам вида kind не короче min_prefixlen: start,
+        # если префикс накрывает начало диапазона, иначе адрес первого префикса внутри
+        if self.longest_match(ipaddress.IPv4Network((start, 32)), min_prefixlen, kind) is not None:
+            return start
+        return self._first_inside(start, end, min_prefixlen, kind)
+
+    def _first_occupied(self, start, end):
+        # Одно правило для overlaps() и next_occupied(): маршруты короче /AGGREGATE_PREFIXLEN не в счёт,
+        # адреса из конфигурации учитываются любой длины
+        found = [address for address in (self._occupied(start, end, AGGREGATE_PREFIXLEN, ROUTE),
+                                         self._occupied(start, end, 0, ADDRESS)) if address is not None]
+        return min(found) if found else None
+
+    def overlaps(self, network):
+        """Пересекается ли network с занятым префиксом (маршруты короче /AGGREGATE_PREFIXLEN не в счёт)."""
+        return self._first_occupied(int(network.network_address), int(network.broadcast_address)) is not None
+
+    def has_term(self, network):
+        """Есть ли уже в фильтре терм с именем network (10.1.2.0/30)."""
+        return self._contains_key(self._key(int(network.network_address), network.prefixlen, TERM))
+
+    def next_occupied(self, address):
+        """Наименьший занятый адрес (int), не меньший address, или None."""
+        return self._first_occupied(address, 0xFFFFFFFF)
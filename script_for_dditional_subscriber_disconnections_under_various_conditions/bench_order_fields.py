@@ -0,0 +1,126 @@
+import argparse
+import glob
+import os
+import re
+import sys
+import time
+
+from bs4 import BeautifulSoup
+
+from order_fields import extract_port_number, scan_order_text
+from script_parsing_crm import HTML_PARSER
+
+# Прежний разбор полей наряда (несколько re.findall по всему тексту) против scan_order_text на
+# обезличенных страницах нарядов из order_corpus/. Сначала проверяется, что результаты совпадают
+# полностью, затем меряется время:
+#   bench_order_fields.py
+#   bench_order_fields.py order_corpus --repeat 500 --scale 300 --worst 20000
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'order_corpus')
+
+LEGACY_UNIT_PATTERNS = [
+    r'Unit/Порт\s+((?:[Gg][Ee]|U|MTT)[\d\.]+-\w+(?:-\w+)?)',
+    r'(?:Unit/Порт\s+)?((?:[Gg][Ee]|U|MTT)[\d\.]+\s*-\s*\w+\s*-\s*\w+)',
+    r'\b((?:[Gg][Ee]|U|MTT)[\d\.]+[-\s]\w+[-\s]\w+)\b',
+    r'(?:Unit/Порт\s+)?((?:[Gg][Ee]|U|MTT)[\d\.]+[-\s]\w+[-\s]?\w*)',
+]
+LEGACY_PORT_PATTERNS = [
+    r'eth[-\s]+(\d+)', r'gi[-\s]+(\d+)', r'fa[-\s]+(\d+)', r'te[-\s]+(\d+)', r'ge[-\s]+(\d+)',
+    r'[a-z]+[-\s]+(\d+)', r'[-\s]+(\d+)$', r'(\d+)$',
+]
+
+
+def legacy_port_number(unit_port_value):
+    clean_value = re.sub(r'\s+', ' ', unit_port_value.strip())
+    for pattern in LEGACY_PORT_PATTERNS:
+        match = re.search(pattern, clean_value, re.IGNORECASE)
+        if match:
+            return match.group(1)
+    return "не найден"
+
+
+def legacy_fields(all_text):
+    """Поля так, как их искали _find_unit_port_values и _find_data_numbers до scan_order_text."""
+    all_matches = []
+    for pattern in LEGACY_UNIT_PATTERNS:
+        for match in re.findall(pattern, all_text, re.IGNORECASE):
+            if match not in all_matches:
+                all_matches.append(match)
+    return {
+        'unit_port': all_matches,
+        'ports': [legacy_port_number(re.sub(r'\s+', ' ', match.strip())) for match in all_matches],
+        'kv': re.findall(r'кв[a-zA-Zа-яА-Я]*\.\s*(\d+)', all_text, re.IGNORECASE),
+        'pom': re.findall(r'ком[a-zA-Zа-яА-Я]+\.\s*(\d+)', all_text, re.IGNORECASE),
+        'date': re.findall(r'Дата выполнения\s*(\d+\.\d+\.\d+)', all_text, re.IGNORECASE),
+        'down': re.findall(r'\bОтключение\b', all_text, re.IGNORECASE),
+        'req': re.findall(r'по\s*заявлению', all_text, re.IGNORECASE),
+    }
+
+
+def new_fields(all_text):
+    fields = scan_order_text(all_text)
+    fields['ports'] = [extract_port_number(re.sub(r'\s+', ' ', match.strip())) for match in fields['unit_port']]
+    return fields
+
+
+def measure(function, text, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function(text)
+    return (time.perf_counter() - start) / repeat
+
+
+def worst_case_texts(size):
+    # Длинные слова из повторяющихся якорей: прежний kv-шаблон на таком тексте квадратичен
+    return {
+        'кв' * size: "'кв' x N",
+        'ком' * size + ' ': "'ком' x N",
+        'u1-' * size: "'u1-' x N",
+        ('по ' * size) + 'заявлению': "'по ' x N",
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Прежний поиск полей наряда против однопроходного scan_order_text")
+    parser.add_argument('corpus', nargs='?', default=CORPUS_DIR, help="Каталог со страницами нарядов (*.html)")
+    parser.add_argument('--repeat', type=int, default=200, help="Повторов на страницу")
+    parser.add_argument('--scale', type=int, default=200, help="Во сколько раз склеить корпус для большой страницы")
+    parser.add_argument('--worst', type=int, default=5000, help="Длина вырожденных текстов (0 - не проверять)")
+    args = parser.parse_args()
+
+    pages = {}
+    for path in sorted(glob.glob(os.path.join(args.corpus, '*.html'))):
+        with open(path, encoding='utf-8') as f:
+            pages[os.path.basename(path)] = BeautifulSoup(f.read(), HTML_PARSER).get_text()
+    if not pages:
+        print(f"В {args.corpus} нет страниц *.html")
+        return 1
+    pages[f'корпус x{args.scale}'] = '\n'.join(pages.values()) * args.scale
+    if args.worst:
+        for text, name in worst_case_texts(args.worst).items():
+            pages[f'{name}, N={args.worst}'] = text
+
+    mismatches = 0
+    print(f"{'Страница':<32}{'Символов':>10}{'Прежний, мс':>14}{'Новый, мс':>12}{'Ускорение':>11}")
+    for name, text in pages.items():
+        legacy, new = legacy_fields(text), new_fields(text)
+        if legacy != new:
+            mismatches += 1
+            for key in legacy:
+                if legacy[key] != new[key]:
+                    print(f"{name}: расхождение в '{key}': {legacy[key][:5]} != {new[key][:5]}")
+            continue
+        repeat = max(1, args.repeat * 2000 // max(len(text), 2000))
+        old_time = measure(legacy_fields, text, repeat)
+        new_time = measure(new_fields, text, repeat)
+        print(f"{name:<32}{len(text):>10}{old_time * 1000:>14.3f}{new_time * 1000:>12.3f}{old_time / new_time:>10.1f}x")
+
+    if mismatches:
+        print(f"\nРезультаты расходятся на {mismatches} страницах")
+        return 1
+    print(f"\nРезультаты совпадают на всех {len(pages)} страницах")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
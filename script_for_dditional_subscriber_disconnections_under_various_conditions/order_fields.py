@@ -0,0 +1,118 @@
+import re
+
+# Поля наряда за один проход по тексту страницы.
+#
+# Раньше текст просматривался целиком четырьмя шаблонами Unit/Порт и ещё пятью - для кв./ком./даты/
+# "Отключение"/"по заявлению". Теперь один общий сканер находит только короткие якоря (U21.,
+# MTT5., GE3., "Unit/Порт", "кв", "ком") и сразу целиком дату, "Отключение" и "по заявлению".
+# Прежний шаблон поля применяется только от якоря, поэтому результат - те же совпадения в том же
+# порядке, что давал re.findall по каждому шаблону.
+
+# Якоря, с которых начинаются поля. Ни одно поле не может начаться внутри поглощённого сканером
+# текста: у латинских якорей и кириллических полей разные алфавиты, а "по" внутри
+# "выполнения" и "Порт" не продолжается "заявлению". Первая буква проверяется отдельным классом,
+# чтобы сканер не перебирал все варианты на каждой позиции текста
+SCANNER = re.compile(
+    r'(?=[UGMКПДО])(?:'
+    r'(?P<prefix>Unit/Порт)'
+    r'|(?P<unit>(?:[Gg][Ee]|U|MTT)(?=[\d\.]))'
+    r'|(?P<kv>кв)'
+    r'|(?P<pom>ком)'
+    r'|(?P<date>Дата выполнения\s*(?P<date_value>\d+\.\d+\.\d+))'
+    r'|(?P<down>\bОтключение\b)'
+    r'|(?P<req>по\s*заявлению))',
+    re.IGNORECASE)
+
+# Прежние шаблоны Unit/Порт в прежнем порядке: у первого обязателен префикс "Unit/Порт",
+# у остальных он необязателен и в найденное значение не входит
+UNIT_WITH_PREFIX = re.compile(r'Unit/Порт\s+((?:[Gg][Ee]|U|MTT)[\d\.]+-\w+(?:-\w+)?)', re.IGNORECASE)
+UNIT_PATTERNS = [
+    re.compile(r'((?:[Gg][Ee]|U|MTT)[\d\.]+\s*-\s*\w+\s*-\s*\w+)', re.IGNORECASE),
+    re.compile(r'\b((?:[Gg][Ee]|U|MTT)[\d\.]+[-\s]\w+[-\s]\w+)\b', re.IGNORECASE),
+    re.compile(r'((?:[Gg][Ee]|U|MTT)[\d\.]+[-\s]\w+[-\s]?\w*)', re.IGNORECASE),
+]
+KV_PATTERN = re.compile(r'кв[a-zA-Zа-яА-Я]*\.\s*(\d+)', re.IGNORECASE)
+POM_PATTERN = re.compile(r'ком[a-zA-Zа-яА-Я]+\.\s*(\d+)', re.IGNORECASE)
+# Буквы после "кв"/"ком": если от одного якоря шаблон не совпал, не совпадёт и от следующих в том же слове
+LETTERS = re.compile(r'[a-zA-Zа-яА-Я]*', re.IGNORECASE)
+
+# Номер порта из значения Unit/Порт: шаблоны проверяются по порядку, выигрывает первый совпавший
+PORT_PATTERNS = [re.compile(pattern, re.IGNORECASE) for pattern in (
+    r'eth[-\s]+(\d+)',
+    r'gi[-\s]+(\d+)',
+    r'fa[-\s]+(\d+)',
+    r'te[-\s]+(\d+)',
+    r'ge[-\s]+(\d+)',
+    r'[a-z]+[-\s]+(\d+)',
+    r'[-\s]+(\d+)$',
+    r'(\d+)$',
+)]
+WHITESPACE = re.compile(r'\s+')
+
+
+def scan_order_text(text):
+    """Все поля наряда из текста страницы за один проход.
+
+    Возвращает словарь списков в порядке и с повторами, как у прежних re.findall:
+    'unit_port' - значения Unit/Порт всех шаблонов без повторов; 'kv', 'pom', 'date', 'down', 'req'.
+    """
+    prefixed = []
+    unit_found = [[] for _ in UNIT_PATTERNS]
+    # Конец последнего совпадения каждого шаблона: findall не возвращает пересекающиеся совпадения
+    prefixed_end = 0
+    unit_ends = [0] * len(UNIT_PATTERNS)
+    fields = {'kv': [], 'pom': [], 'date': [], 'down': [], 'req': []}
+    word_ends = {'kv': (0, KV_PATTERN, 2), 'pom': (0, POM_PATTERN, 3)}
+
+    for token in SCANNER.finditer(text):
+        kind = token.lastgroup
+        start = token.start()
+        if kind == 'unit':
+            for i, pattern in enumerate(UNIT_PATTERNS):
+                if start < unit_ends[i]:
+                    continue
+                match = pattern.match(text, start)
+                if match:
+                    unit_found[i].append(match.group(1))
+                    unit_ends[i] = match.end()
+        elif kind == 'prefix':
+            if start >= prefixed_end:
+                match = UNIT_WITH_PREFIX.match(text, start)
+                if match:
+                    prefixed.append(match.group(1))
+                    prefixed_end = match.end()
+        elif kind in word_ends:
+            skip_until, pattern, anchor_length = word_ends[kind]
+            if start < skip_until:
+                continue
+            match = pattern.match(text, start)
+            if match:
+                fields[kind].append(match.group(1))
+                word_ends[kind] = (match.end(), pattern, anchor_length)
+            else:
+                word_end = LETTERS.match(text, start + anchor_length).end()
+                word_ends[kind] = (word_end, pattern, anchor_length)
+        elif kind == 'date':
+            fields['date'].append(token.group('date_value'))
+        else:
+            fields[kind].append(token.group(kind))
+
+    unit_port = []
+    seen = set()
+    for found in [prefixed] + unit_found:
+        for value in found:
+            if value not in seen:
+                seen.add(value)
+                unit_port.append(value)
+    fields['unit_port'] = unit_port
+    return fields
+
+
+def extract_port_number(unit_port_value):
+    """Номер порта из значения Unit/Порт ('U21.111-eth-15' -> '15') или "не найден"."""
+    clean_value = WHITESPACE.sub(' ', unit_port_value.strip())
+    for pattern in PORT_PATTERNS:
+        match = pattern.search(clean_value)
+        if match:
+            return match.group(1)
+    return "не найден"
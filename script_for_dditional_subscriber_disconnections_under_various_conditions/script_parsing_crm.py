@@ -1,16 +1,142 @@
 import requests
 from bs4 import BeautifulSoup
+from order_fields import extract_port_number, scan_order_text
 import re
 import sys
 import datetime
 import pickle
+import json
+import os
+import time
+
+# Cookies авторизованной сессии между запусками (main.py запускает скрипт на каждый наряд заново)
+SESSION_FILE = "crm_session.json"
+# Признаки страницы после входа
+SUCCESS_INDICATORS = [
+    'выход', 'logout', 'выйти', 'профиль', 'profile',
+    'личный кабинет', 'кабинет', 'dashboard'
+]
+PASSWORD_INPUT = re.compile(r'<input[^>]+type\s*=\s*["\']?password', re.IGNORECASE)
+
+# lxml разбирает страницу в разы быстрее встроенного html.parser; если не установлен - работаем на встроенном
+try:
+    import lxml
+    HTML_PARSER = 'lxml'
+except ImportError:
+    HTML_PARSER = 'html.parser'
+
+class ParsedPage:
+    # Страница разбирается один раз; дерево и текст строятся при первом обращении и общие для всех поисков
+    def __init__(self, page_content):
+        self.content = page_content
+        self._soup = None
+        self._text = None
+        self._fields = None
+    
+    @property
+    def soup(self):
+        if self._soup is None:
+            self._soup = BeautifulSoup(self.content, HTML_PARSER)
+        return self._soup
+    
+    @property
+    def text(self):
+        if self._text is None:
+            self._text = self.soup.get_text()
+        return self._text
+    
+    @property
+    def fields(self):
+        # Unit/Порт, кв., ком., дата, "Отключение", "по заявлению" - за один проход по тексту
+        if self._fields is None:
+            self._fields = scan_order_text(self.text)
+        return self._fields
 
 class CRMAuthenticator:
-    def __init__(self, base_url="https://xxx.yyy/"):#Ваш URL
+    def __init__(self, base_url="https://xxx.yyy/", session_file=SESSION_FILE):#Ваш URL
         self.base_url = base_url
+        self.session_file = session_file
         self.session = requests.Session()
         self.logged_in = False
     
+    def ensure_login(self, username, password):
+        # Сначала пробуем сохранённую сессию: один запрос вместо страницы входа, формы и разбора ответа
+        if self.load_session() and self.session_valid():
+            self.logged_in = True
+            print("Сессия восстановлена, вход не требуется")
+            return True
+        self.session.cookies.clear()
+        if not self.login(username, password):
+            return False
+        self.save_session()
+        return True
+    
+    def session_valid(self):
+        # Лёгкая проверка: главная страница без перенаправлений, без разбора HTML
+        try:
+            response = self.session.get(self.base_url, allow_redirects=False, timeout=15)
+        except requests.exceptions.RequestException as e:
+            print(f"Ошибка сети при проверке сессии: {e}")
+            return False
+        if response.status_code != 200:
+            # Перенаправление на страницу входа или отказ - сессия истекла
+            return False
+        page_text = response.text.lower()
+        if PASSWORD_INPUT.search(page_text):
+            return False
+        return any(indicator in page_text for indicator in SUCCESS_INDICATORS)
+    
+    def load_session(self):
+        try:
+            with open(self.session_file, 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError) as e:
+            print(f"Сохранённая сессия не прочитана ({e}), выполняем вход")
+            return False
+        if saved.get('base_url') != self.base_url:
+            return False
+        now = time.time()
+        loaded = 0
+        for cookie in saved.get('cookies', []):
+            if cookie.get('expires') and cookie['expires'] < now:
+                continue
+            self.session.cookies.set(cookie['name'], cookie['value'], domain=cookie.get('domain'),
+                                     path=cookie.get('path', '/'), expires=cookie.get('expires'),
+                                     secure=cookie.get('secure', False))
+            loaded += 1
+        return loaded > 0
+    
+    def save_session(self):
+        cookies = [{
+            'name': cookie.name,
+            'value': cookie.value,
+            'domain': cookie.domain,
+            'path': cookie.path,
+            'expires': cookie.expires,
+            'secure': cookie.secure,
+        } for cookie in self.session.cookies]
+        saved = {'base_url': self.base_url, 'saved': datetime.datetime.now().isoformat(timespec='seconds'), 'cookies': cookies}
+        tmp_path = self.session_file + '.tmp'
+        try:
+            # Файл с cookies даёт доступ к CRM: создаётся сразу с правами только для владельца (0600)
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            os.chmod(tmp_path, 0o600)
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(saved, f, ensure_ascii=False)
+            os.replace(tmp_path, self.session_file)
+        except OSError as e:
+            print(f"Не удалось сохранить сессию: {e}")
+    
+    def forget_session(self):
+        self.session.cookies.clear()
+        self.logged_in = False
+        try:
+            os.remove(self.session_file)
+        except OSError:
+            pass
+    
     def login(self, username, password):
         try:
             #Получаем страницу входа
@@ -18,7 +144,7 @@ class CRMAuthenticator:
             if response.status_code != 200:
                 print(f"Ошибка: Не удалось получить страницу входа ({response.status_code})")
                 return False
-            soup = BeautifulSoup(response.text, 'html.parser')
+            soup = ParsedPage(response.text).soup
             #Ищем форму входа
             login_form = self._find_login_form(soup)
             if not login_form:
@@ -36,7 +162,7 @@ class CRMAuthenticator:
             response = self.session.post(submit_url, data=form_data, headers=headers)
             #Проверяем результат
             if response.status_code == 200:
-                self.logged_in = self._check_login_success(response.text)
+                self.logged_in = self._check_login_success(ParsedPage(response.text))
                 if self.logged_in:
                     print("Вход выполнен успешно!")
                     return True
@@ -107,16 +233,11 @@ class CRMAuthenticator:
         else:
             return self.base_url.rstrip('/') + '/' + action.lstrip('/')
     
-    def _check_login_success(self, page_content):
-        soup = BeautifulSoup(page_content, 'html.parser')
-        # Проверяем наличие индикаторов успешного входа
-        success_indicators = [
-            'выход', 'logout', 'выйти', 'профиль', 'profile',
-            'личный кабинет', 'кабинет', 'dashboard'
-        ]
+    def _check_login_success(self, page):
+        soup = page.soup
         # Ищем текст, указывающий на успешный вход
-        page_text = soup.get_text().lower()
-        for indicator in success_indicators:
+        page_text = page.text.lower()
+        for indicator in SUCCESS_INDICATORS:
             if indicator in page_text:
                 return True
         # Ищем кнопку выхода
@@ -125,27 +246,36 @@ class CRMAuthenticator:
             return True
         return False
     
-    def navigate_to_project(self, project_id):"):
+    def navigate_to_project(self, project_id):
         if not self.logged_in:
             print("Сначала необходимо выполнить вход!")
-            return False, None, None
+            return False, [], None, None
         # Формируем URL страницы проекта
         project_url = f"https://xxx/yyy.{project_id}"
         print(f"{'='*60}")
         print(f"ID проекта: {project_id}")
         print(f"URL: {project_url}")
         print(f"{'='*60}")
+        unit_port_data = None
+        data_data = None
         try:
             # Переходим на страницу проекта
             headers = {
                 'Referer': self.base_url
             }
             response = self.session.get(project_url, headers=headers)
+            if PASSWORD_INPUT.search(response.text):
+                # Вместо наряда открылась страница входа - сессия истекла, следующий запуск войдёт заново
+                print("Сессия CRM истекла, сохранённые cookies удалены")
+                self.forget_session()
+                return False, [], None, None
             if response.status_code != 200:
                 print(f"Ошибка загрузки страницы: {response.status_code}")
-                return False, None, None
-            unit_port_data = self._find_unit_port_values(response.text)
-            data_data = self._find_data_numbers(response.text)
+                return False, [], None, None
+            # Один разбор страницы на все поиски
+            page = ParsedPage(response.text)
+            unit_port_data = self._find_unit_port_values(page)
+            data_data = self._find_data_numbers(page)
             found = True
             if found:
                 return True, [], unit_port_data, data_data            
@@ -154,8 +284,8 @@ class CRMAuthenticator:
         except Exception as e:
             return False, [], unit_port_data, data_data
     
-    def _search_text_on_page(self, page_content, search_text):
-        soup = BeautifulSoup(page_content, 'html.parser')
+    def _search_text_on_page(self, page, search_text):
+        soup = page.soup
         found_matches = []
         #Поиск точного текста (регистронезависимый)
         exact_matches = soup.find_all(text=re.compile(re.escape(search_text), re.IGNORECASE))
@@ -167,27 +297,10 @@ class CRMAuthenticator:
             return True, found_matches
         return False, found_matches
     
-    def _find_unit_port_values(self, page_content):
-        soup = BeautifulSoup(page_content, 'html.parser')
-        all_text = soup.get_text()
-        # РАСШИРЕННЫЙ паттерн для поиска значений с разными вариантами написания
-        patterns = [
-            # Стандартный формат: Unit/Порт U83.119-eth-5
-            r'Unit/Порт\s+((?:[Gg][Ee]|U|MTT)[\d\.]+-\w+(?:-\w+)?)',
-            # Формат с пробелами: U21.111 - eth - 15
-            r'(?:Unit/Порт\s+)?((?:[Gg][Ee]|U|MTT)[\d\.]+\s*-\s*\w+\s*-\s*\w+)',
-            # Формат без "Unit/Порт": U21.111-eth-15
-            r'\b((?:[Gg][Ee]|U|MTT)[\d\.]+[-\s]\w+[-\s]\w+)\b',
-            # Формат с разными интерфейсами
-            r'(?:Unit/Порт\s+)?((?:[Gg][Ee]|U|MTT)[\d\.]+[-\s]\w+[-\s]?\w*)'
-        ]
-        all_matches = []
-        for pattern in patterns:
-            matches = re.findall(pattern, all_text, re.IGNORECASE)
-            for match in matches:
-                # Проверяем, не добавляли ли уже это значение
-                if match not in all_matches:
-                    all_matches.append(match)
+    def _find_unit_port_values(self, page):
+        all_text = page.text
+        # Значения всех форматов (Unit/Порт U83.119-eth-5, U21.111 - eth - 15, ...) без повторов, см. order_fields.py
+        all_matches = list(page.fields['unit_port'])
         if not all_matches:
             # Попробуем более широкий поиск
             print("Не найдено по основным паттернам, пробуем расширенный поиск...")
@@ -275,41 +388,15 @@ class CRMAuthenticator:
         return processed_values
     
     def _extract_port_number_improved(self, unit_port_value):
-        # Убираем лишние пробелы
-        clean_value = re.sub(r'\s+', ' ', unit_port_value.strip())
-        # Паттерны для поиска порта с разными вариантами написания
-        patterns = [
-            # eth-5 или eth - 5
-            r'eth[-\s]+(\d+)',
-            # gi-3 или gi - 3
-            r'gi[-\s]+(\d+)',
-            # fa-1 или fa - 1
-            r'fa[-\s]+(\d+)',
-            # te-2 или te - 2
-            r'te[-\s]+(\d+)',
-            # ge-4 или ge - 4
-            r'ge[-\s]+(\d+)',
-            # Любой интерфейс с дефисом или пробелом
-            r'[a-z]+[-\s]+(\d+)',
-            # Цифры в конце строки после последнего дефиса/пробела
-            r'[-\s]+(\d+)$',
-            # Просто цифры в конце
-            r'(\d+)$'
-        ]
-        for pattern in patterns:
-            match = re.search(pattern, clean_value, re.IGNORECASE)
-            if match:
-                return match.group(1)
-        return "не найден"
+        # eth-5, gi - 3, fa-1, te-2, ge-4, любой интерфейс или просто цифры в конце
+        return extract_port_number(unit_port_value)
     
-    def _find_data_numbers(self, page_content):     
-        soup = BeautifulSoup(page_content, 'html.parser')
-        all_text = soup.get_text()
+    def _find_data_numbers(self, page):     
+        fields = page.fields
         # Простой поиск "кв. число" или "пом. число"
         data_matches = []
         # Паттерн для поиска "кв. число" (квартира)
-        kv_pattern = r'кв[a-zA-Zа-яА-Я]*\.\s*(\d+)'
-        kv_matches = re.findall(kv_pattern, all_text, re.IGNORECASE)
+        kv_matches = fields['kv']
         for match in kv_matches:
             data_matches.append({
                 'type': 'квартира',
@@ -320,8 +407,7 @@ class CRMAuthenticator:
             # Сохраняем переменные в файл
         with open("vars_kv.pkl", "wb") as f:
             pickle.dump({"kvartira" : match}, f)
-        pom_pattern = r'ком[a-zA-Zа-яА-Я]+\.\s*(\d+)'
-        pom_matches = re.findall(pom_pattern, all_text, re.IGNORECASE)
+        pom_matches = fields['pom']
         for match in pom_matches:
             data_matches.append({
                 'type': 'комната',
@@ -329,8 +415,7 @@ class CRMAuthenticator:
                 'full_text': f"ком. {match}",
                 'note': 'Найдено по паттерну "ком. число"'
             })
-        date_pattern = r'Дата выполнения\s*(\d+\.\d+\.\d+)'
-        date_matches = re.findall(date_pattern, all_text, re.IGNORECASE)
+        date_matches = fields['date']
         date_value = None
         if date_matches:
             for match in date_matches:
@@ -346,8 +431,7 @@ class CRMAuthenticator:
             date_value = None
         with open("vars_date.pkl", "wb") as f:
             pickle.dump({"date" : date_value}, f)    
-        down_pattern = r'\bОтключение\b'
-        down_matches = re.findall(down_pattern, all_text, re.IGNORECASE)
+        down_matches = fields['down']
         down_value = None
         if down_matches:
             for match in down_matches:
@@ -363,8 +447,7 @@ class CRMAuthenticator:
             down_value = None
         with open("vars_down.pkl", "wb") as f:
             pickle.dump({"down" : down_value}, f)        
-        req_pattern = r'по\s*заявлению'
-        req_matches = re.findall(req_pattern, all_text, re.IGNORECASE)
+        req_matches = fields['req']
         # Инициализируем переменную для сохранения
         req_value = None
         if req_matches:
@@ -461,7 +544,7 @@ def main():
     print("="*60)
     print("ВЫПОЛНЕНИЕ ВХОДА В СИСТЕМУ")
     print("="*60)
-    if not crm.login(username, password):
+    if not crm.ensure_login(username, password):
         print("\nНе удалось выполнить вход. Завершение работы.")
         return 1
     print(f"\n{crm.get_session_info()}")
@@ -4,7 +4,16 @@ import time
 import pickle
 import time
 import sys
+import os
 from datetime import datetime, timedelta
+# Общие модули лежат в switch_scripts
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'switch_scripts'))
+from capabilities import CapabilityStore, parse_dlink_identity, ssh_version
+from completion import send_and_wait
+from portset import PortSet
+
+# Модели и диалекты коммутаторов, определённые при прошлых запусках
+CAPABILITIES_FILE = "device_capabilities.json"
 
 files = {
     "vars.pkl": {"keys": ["ip_address", "port_number"], "required": True},
@@ -106,18 +115,12 @@ def select_ports(port_list, model_name):
     if user_input.lower() == 'all':
         selected = port_list.copy()
     else:
+        # Номера и диапазоны (1,3,5-8) в той же записи, что и у коммутаторов
         try:
-            indices = []
-            for item in user_input.split(','):
-                item = item.strip()
-                if '-' in item:  # Поддержка диапазонов: 1-3
-                    start, end = map(int, item.split('-'))
-                    indices.extend(range(start-1, end))
-                elif item.isdigit():
-                    indices.append(int(item) - 1)
-            selected = [port_list[i] for i in indices if 0 <= i < len(port_list)]
-        except (ValueError, IndexError):
-            print("Некорректный ввод. Выбрано ничего.")
+            indices = PortSet.parse(user_input, max_port=len(port_list), strict=True)
+            selected = [port for i, port in enumerate(port_list, 1) if i in indices]
+        except ValueError as e:
+            print(f"Некорректный ввод ({e}). Выбрано ничего.")
             selected = []
     if selected:
         print(f"\nВыбрано портов: {len(selected)}")
@@ -148,31 +151,51 @@ def main():
         'timeout': 10,
         'global_delay_factor': 2,
     }        
-    connection = ConnectHandler(**device)
+    # Модель и диалект, определённые при прошлых нарядах на этот коммутатор
+    capabilities = CapabilityStore(CAPABILITIES_FILE)
+    known = capabilities.get(ip)
+    if known and known.get('dialect') == 'dlink_ds':
+        # D-Link: сразу подключаемся с нужным диалектом, без пробного входа как Cisco
+        connection = ConnectHandler(**device_unknown)
+    else:
+        connection = ConnectHandler(**device)
     try:
         print(f"Подключение к устройству {ip}")
-        connection
-        # Входим в enable
-        print("Вход в enable...")
-        connection.enable()
-        # Определяем модель устройства
-        print("Определение модели...")
-        output_version = connection.send_command("show version", delay_factor=2)
-        if "Zy" in output_version:
-            model = "Zy"
-            print(f"Обнаружена модель {model}") 
-        elif "5210" in output_version:
-            model = "5210"
-            print(f"Обнаружена модель {model}")
-        elif "Cisco" in output_version:
-            model = "Cisco"
-            print(f"Обнаружена модель {model}")       
-        elif "29" in output_version:
-            model = "29"
-            print(f"Обнаружена модель {model}")
+        if known and known.get('dialect') == 'dlink_ds':
+            model = known['model']
+            print(f"Модель {model} известна по прошлым запускам")
         else:
-            print("Неизвестная модель. Попробуем продолжить...")
-            model = "unknown"
+            # Входим в enable
+            print("Вход в enable...")
+            connection.enable()
+            # Версия SSH-сервера меняется вместе с прошивкой: при расхождении модель определяется заново
+            server_version = ssh_version(connection)
+            known = capabilities.get(ip, ssh_version=server_version)
+            if known:
+                model = known['model']
+                print(f"Модель {model} известна по прошлым запускам")
+            else:
+                # Определяем модель устройства
+                print("Определение модели...")
+                output_version = connection.send_command("show version", delay_factor=2)
+                if "Zy" in output_version:
+                    model = "Zy"
+                    print(f"Обнаружена модель {model}") 
+                elif "5210" in output_version:
+                    model = "5210"
+                    print(f"Обнаружена модель {model}")
+                elif "Cisco" in output_version:
+                    model = "Cisco"
+                    print(f"Обнаружена модель {model}")       
+                elif "29" in output_version:
+                    model = "29"
+                    print(f"Обнаружена модель {model}")
+                else:
+                    print("Неизвестная модель. Попробуем продолжить...")
+                    model = "unknown"
+                if model != "unknown":
+                    capabilities.update(ip, model=model, dialect='cisco_ios', ssh_version=server_version)
+                    capabilities.save()
           
         #ZY
         if model == "Zy":
@@ -191,8 +214,7 @@ def main():
                 print("Номер vlan not XXXX and not 31xx")
                 match_vlan = None
             print("\nВыполняем 'show interfaces '...")
-            output_int_brief_si = connection.send_command_timing(f"show interfaces {port_input}")
-            time.sleep(5)
+            output_int_brief_si = send_and_wait(connection, f"show interfaces {port_input}")
             print(f"Вывод:\n{output_int_brief_si}\n")
             Active = re.search(r'\bLink\s*:\s*Down\b', output_int_brief_si)
             if Active:
@@ -216,8 +238,7 @@ def main():
                 print("MAC-адрес не найден")
                 macaca = None
                 print("\nВыполняем 'show running-config interface port-channel'...")
-                output_int_brief3 = connection.send_command_timing(f"show running-config interface port-channel {port_input}")
-                time.sleep(5)
+                output_int_brief3 = send_and_wait(connection, f"show running-config interface port-channel {port_input}")
                 print(f"Вывод:\n{output_int_brief3}\n")
             if match_vlan is not None and str(match_vlan) in output_int_brief3 and (f"fixed {port_input}") in output_int_brief3 and match_vlan in output_int_brief and macaca == None and "Down" in link_state:  # ← Теперь mac_address всегда инициализирована
                 print(f"Условия выполнены: vlan={match_vlan}, mac={macaca}, down/up={link_state} Отключаем порт")
@@ -262,17 +283,10 @@ def main():
                     ] 
                     for cmd in commands:
                         print(f"Отправка команды: {cmd}")
-                        output = connection.send_command_timing(
-                            cmd,
-                            delay_factor=3,
-                            strip_prompt=False,
-                            strip_command=False
-                        )
+                        output = send_and_wait(connection, cmd)
                         print(f"Ответ: {output[:100]}...")  # Печатаем первые 100 символов вывода
-                        time.sleep(1)
                     print("\nВыполняем 'write memory'...")
-                    output_int_brief5 = connection.send_command_timing(f"write memory")
-                    time.sleep(10)
+                    output_int_brief5 = send_and_wait(connection, "write memory", timeout=60)
                     print(f"Вывод:\n{output_int_brief5}\n") 
                     print("\nВыполняем 'show int conf '...")
                     output_int_brief = connection.send_command(f"show int conf {port_input}", delay_factor=2)
@@ -586,15 +600,13 @@ def main():
                             for cmd in config_commands:
                                 print(f"{cmd}")
                                 output += connection.send_command(cmd, expect_string=r'[>#]', delay_factor=2)
-                            time.sleep(5)
-                            output123 = connection.send_command_timing("write", delay_factor=2)
+                            output123 = send_and_wait(connection, "write", timeout=60)
                             print("Ответ на write:")
                             print(output123)
                             # Проверяем, нужно ли подтверждение
                             if "Confirm to overwrite" in output123 or "[Y/N]" in output123:
-                                time.sleep(1)    
                                 # Отправляем "y" (строчная или заглавная - не важно)
-                                confirm_output123 = connection.send_command_timing("y", delay_factor=2)                                
+                                confirm_output123 = send_and_wait(connection, "y", timeout=60)                                
                                 print("Отправлено подтверждение 'y'")
                                 print("Результат:")
                                 print(confirm_output123)
@@ -750,11 +762,20 @@ def main():
 
         # === DLINK DES-32xx ===
         else:                  
-                connection = ConnectHandler(**device_unknown)
+                if not (known and known.get('dialect') == 'dlink_ds'):
+                    connection = ConnectHandler(**device_unknown)
                 try:         
-                    output_switch = connection.send_command_timing("show switch", delay_factor=2)
-                    time.sleep(2)
+                    output_switch = send_and_wait(connection, "show switch")
                     print(f"Вывод show switch:\n{output_switch}\n")                       
+                    hardware, firmware = parse_dlink_identity(output_switch)
+                    if firmware:
+                        # get() сбросит запись, если прошивка сменилась
+                        capabilities.get(ip, hardware=hardware, firmware=firmware)
+                        capabilities.update(ip, model=model, dialect='dlink_ds', hardware=hardware, firmware=firmware)
+                    else:
+                        # Это не D-Link: в следующий раз модель определяется заново
+                        capabilities.forget(ip)
+                    capabilities.save()
                     command_accessrevC2011 = f'show ports desc'
                     output_accessrevC2011 = connection.send_command(command_accessrevC2011)
                     print(f"\nКоманда '{command_accessrevC2011}' выполнена. Вывод:")
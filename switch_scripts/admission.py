@@ -0,0 +1,125 @@
+import asyncio
+import ipaddress
+import threading
+import time
+from contextlib import contextmanager
+
+# Пока нет сессии на площадке и токена на вход, ожидающие проверяют очередь с таким шагом, сек.
+POLL_INTERVAL = 0.05
+
+# Вход дольше этого считается признаком перегрузки TACACS/RADIUS, сек.
+SLOW_LOGIN = 5.0
+
+# Не чаще одного снижения темпа за этот интервал: пачка одновременных отказов - это одна перегрузка
+BACKOFF_INTERVAL = 2.0
+
+
+class AdmissionController:
+    """Ограничивает поток SSH-входов, чтобы параллельный запуск не положил AAA-серверы.
+
+    - token bucket: не больше rate новых входов в секунду, всплеск до burst;
+    - не больше site_sessions одновременных сессий на площадку (столбец site в списке устройств,
+      иначе подсеть /site_prefix);
+    - AIMD: медленный или неудачный вход вдвое снижает темп, каждый нормальный вход
+      понемногу возвращает его к rate.
+    """
+
+    def __init__(self, rate=10.0, burst=10, site_sessions=8, site_prefix=24, min_rate=0.5):
+        self.max_rate = rate
+        self.rate = rate
+        self.min_rate = min(min_rate, rate)
+        self.burst = max(1, burst)
+        self.site_sessions = max(1, site_sessions)
+        self.site_prefix = site_prefix
+        self._tokens = float(self.burst)
+        self._refilled = time.monotonic()
+        self._last_backoff = 0
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def site_of(self, ip, site=None):
+        if site:
+            return site
+        try:
+            return str(ipaddress.ip_network(f"{ip}/{self.site_prefix}", strict=False))
+        except ValueError:
+            return ip
+
+    def acquire(self, ip, site=None):
+        """Ждёт свободную сессию на площадке и токен на вход. Возвращает AdmissionTicket."""
+        site = self.site_of(ip, site)
+        while True:
+            wait = self._try_acquire(site)
+            if wait == 0:
+                return AdmissionTicket(self, site)
+            time.sleep(wait)
+
+    async def acquire_async(self, ip, site=None):
+        """То же, что acquire, но не блокирует цикл событий."""
+        site = self.site_of(ip, site)
+        while True:
+            wait = self._try_acquire(site)
+            if wait == 0:
+                return AdmissionTicket(self, site)
+            await asyncio.sleep(wait)
+
+    def _try_acquire(self, site):
+        """0 - сессия выдана; иначе сколько подождать до следующей попытки."""
+        with self._lock:
+            if self._sessions.get(site, 0) >= self.site_sessions:
+                return POLL_INTERVAL
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._refilled) * self.rate)
+            self._refilled = now
+            if self._tokens < 1:
+                return min(POLL_INTERVAL, (1 - self._tokens) / self.rate)
+            self._tokens -= 1
+            self._sessions[site] = self._sessions.get(site, 0) + 1
+            return 0
+
+    def _release(self, site):
+        with self._lock:
+            self._sessions[site] -= 1
+            if not self._sessions[site]:
+                del self._sessions[site]
+
+    def report_login(self, seconds, success):
+        with self._lock:
+            now = time.monotonic()
+            if success and seconds < SLOW_LOGIN:
+                self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+                return
+            if now - self._last_backoff < BACKOFF_INTERVAL:
+                return
+            self._last_backoff = now
+            self.rate = max(self.min_rate, self.rate / 2)
+            # Накопленный запас токенов тоже урезаем, иначе он уйдёт одним всплеском
+            self._tokens = min(self._tokens, 1.0)
+            rate = self.rate
+        reason = "неудачный вход" if not success else f"вход занял {seconds:.1f} сек."
+        print(f"  [admission] {reason}: снижаем темп подключений до {rate:.1f}/сек.")
+
+
+class AdmissionTicket:
+    """Разрешение на одну сессию. release() обязателен - обычно в finally."""
+
+    def __init__(self, controller, site):
+        self._controller = controller
+        self.site = site
+        self._released = False
+
+    @contextmanager
+    def login(self):
+        """Оборачивает подключение: длительность и исход входа подстраивают темп."""
+        start = time.monotonic()
+        try:
+            yield
+        except Exception:
+            self._controller.report_login(time.monotonic() - start, False)
+            raise
+        self._controller.report_login(time.monotonic() - start, True)
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self._controller._release(self.site)
@@ -0,0 +1,192 @@
+import asyncio
+import re
+
+import asyncssh
+
+from config_push import prompt_token
+
+READ_SIZE = 65536
+# Сколько последних символов вывода проверять на приглашение CLI
+PROMPT_TAIL = 512
+
+# Старые коммутаторы (SNR, DES-32xx) умеют только устаревшие алгоритмы - добавляем их к стандартным
+LEGACY_ALGS = {
+    'kex_algs': '+diffie-hellman-group1-sha1,diffie-hellman-group14-sha1',
+    'encryption_algs': '+aes128-cbc,aes256-cbc,3des-cbc',
+}
+
+# Команды подготовки сессии и сохранения для поддерживаемых типов устройств (как в netmiko)
+DIALECTS = {
+    'cisco_ios': {
+        'session_commands': ['terminal length 0', 'terminal width 511'],
+        'save_command': 'write',
+        'has_enable': True,
+    },
+    'dlink_ds': {
+        'session_commands': ['disable clipaging'],
+        'save_command': 'save',
+        'has_enable': False,
+    },
+}
+
+CONFIRM_PATTERN = re.compile(r'\[[Yy]/[Nn]\]|\([Yy]/[Nn]\)')
+
+
+class AsyncSwitchSession:
+    """SSH-сессия с коммутатором на asyncio с теми же операциями, что и у netmiko.
+
+    Каждое ожидание ответа ограничено command_timeout, подключение - timeout.
+    Сессию можно отменить вместе с задачей asyncio: соединение закрывается в disconnect().
+    """
+
+    def __init__(self, host, username, password, secret='', device_type='cisco_ios',
+                 port=22, timeout=30, command_timeout=60, ssh_options=None):
+        if device_type not in DIALECTS:
+            raise ValueError(f"Неподдерживаемый тип устройства: {device_type}")
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.secret = secret or password
+        self.device_type = device_type
+        self.timeout = timeout
+        self.command_timeout = command_timeout
+        self.ssh_options = dict(LEGACY_ALGS, **(ssh_options or {}))
+        self.dialect = DIALECTS[device_type]
+        self.base_prompt = None
+        self.prompt = None
+        self._conn = None
+        self._process = None
+        self._prompt_pattern = None
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.disconnect()
+
+    async def connect(self):
+        self._conn = await asyncio.wait_for(
+            asyncssh.connect(self.host, port=self.port, username=self.username,
+                             password=self.password, known_hosts=None, **self.ssh_options),
+            self.timeout)
+        try:
+            self._process = await self._conn.create_process(
+                term_type='vt100', term_size=(511, 1000), encoding='utf-8', errors='replace')
+            # Первое приглашение: "Switch>", "Switch#" или "DES-3200-28:admin#"
+            banner = await self._read_until(re.compile(r'[>#]\s*$'), self.timeout)
+            self.prompt = banner.strip().splitlines()[-1].strip()
+            self.base_prompt = self.prompt[:-1]
+            self._prompt_pattern = re.compile(re.escape(self.base_prompt) + r'[^\n]*[>#]\s*$')
+            for command in self.dialect['session_commands']:
+                await self.send_command(command)
+        except BaseException:
+            self.disconnect()
+            raise
+
+    def disconnect(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+            self._process = None
+
+    def check_enable_mode(self):
+        return self.prompt is not None and self.prompt.endswith('#')
+
+    def check_config_mode(self):
+        return self.prompt is not None and '(config' in self.prompt
+
+    async def enable(self):
+        if not self.dialect['has_enable'] or self.check_enable_mode():
+            return ''
+        output = await self._exchange('enable', re.compile(r'ssword[^\n]*$|[>#]\s*$'))
+        if 'ssword' in output.splitlines()[-1]:
+            output += await self._exchange(self.secret, self._prompt_pattern)
+        if not self.check_enable_mode():
+            raise ValueError(f"Не удалось войти в enable режим на {self.host}")
+        return output
+
+    async def config_mode(self):
+        if not self.dialect['has_enable'] or self.check_config_mode():
+            return ''
+        output = await self.send_command('configure terminal')
+        if not self.check_config_mode():
+            raise ValueError(f"Не удалось войти в режим конфигурации на {self.host}")
+        return output
+
+    async def exit_config_mode(self):
+        if not self.check_config_mode():
+            return ''
+        return await self.send_command('end')
+
+    async def send_command(self, command, read_timeout=None):
+        """Отправляет команду и ждёт приглашение CLI. Возвращает вывод без эха и приглашения."""
+        output = await self._exchange(command, self._prompt_pattern, read_timeout)
+        return self._strip_output(command, output)
+
+    async def send_command_timing(self, command, read_timeout=None):
+        """Для команд, после которых устройство может задать вопрос вместо приглашения."""
+        pattern = re.compile(self._prompt_pattern.pattern + '|' + CONFIRM_PATTERN.pattern)
+        output = await self._exchange(command, pattern, read_timeout)
+        return self._strip_output(command, output)
+
+    async def send_config_set(self, commands, read_timeout=None):
+        """Отправляет набор команд одной записью и ждёт по приглашению CLI на каждую команду.
+
+        Возвращает весь вывод с эхом команд (для find_config_errors).
+        """
+        await self.config_mode()
+        token = prompt_token(self.base_prompt)
+        self._process.stdin.write(''.join(command + '\n' for command in commands))
+        output = await self._read_until(self._prompt_pattern, read_timeout or self.command_timeout,
+                                        min_prompts=(token, len(commands)))
+        self.prompt = output.rstrip().split('\n')[-1].strip()
+        return output
+
+    async def save(self):
+        output = await self.send_command_timing(self.dialect['save_command'])
+        if CONFIRM_PATTERN.search(output):
+            output += await self.send_command('y')
+        return output
+
+    async def _exchange(self, command, pattern, read_timeout=None):
+        self._process.stdin.write(command + '\n')
+        output = await self._read_until(pattern, read_timeout or self.command_timeout)
+        last_line = output.rstrip().splitlines()[-1].strip() if output.strip() else ''
+        if self._prompt_pattern is not None and self._prompt_pattern.search(last_line):
+            self.prompt = last_line
+        return output
+
+    async def _read_until(self, pattern, timeout, min_prompts=None):
+        # min_prompts=(token, n): кроме pattern в конце вывода нужно ещё n приглашений token
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        chunks = []
+        tail = ''
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                raise TimeoutError(f"Нет ответа от {self.host} за {timeout} сек.")
+            try:
+                chunk = await asyncio.wait_for(self._process.stdout.read(READ_SIZE), remaining)
+            except asyncio.TimeoutError:
+                raise TimeoutError(f"Нет ответа от {self.host} за {timeout} сек.") from None
+            if not chunk:
+                raise ConnectionError(f"Устройство {self.host} закрыло соединение")
+            chunks.append(chunk)
+            tail = (tail + chunk)[-PROMPT_TAIL:]
+            if min_prompts is not None:
+                token, needed = min_prompts
+                if len(token.findall(''.join(chunks))) < needed:
+                    continue
+            if pattern.search(tail.replace('\r', '')):
+                return ''.join(chunks).replace('\r\n', '\n').replace('\r', '')
+
+    def _strip_output(self, command, output):
+        lines = output.split('\n')
+        if lines and command.strip() and command.strip() in lines[0]:
+            lines = lines[1:]
+        if lines and self._prompt_pattern.search(lines[-1]):
+            lines = lines[:-1]
+        return '\n'.join(lines).strip('\n')
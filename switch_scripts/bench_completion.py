@@ -0,0 +1,63 @@
+import argparse
+import getpass
+import time
+
+from netmiko import ConnectHandler
+
+from completion import send_and_wait
+from inventory import iter_inventory
+
+# Сколько стоит блок правил access_profile на одном D-Link: старый способ (send_command_timing + sleep 2)
+# против ожидания приглашения (send_and_wait). Удобно мерить на ферме:
+#   switch_farm.py --mix dlink=1 --inventory-out dlink.csv --command-latency 'config access_profile=0.3'
+
+RULES = [
+    "create access_profile profile_id 20 ethernet vlan 0xFFF source_mac FF-FF-FF-FF-FF-00 destination_mac FF-FF-FF-FF-FF-00 ethernet_type",
+    "config access_profile profile_id 20  add access_id 1  ethernet vlan_id 1530 source_mac 00-12-00-00-00-00 mask FF-FF-FF-FF-FF-00 destination_mac 00-00-00-00-00-00 mask 00-00-00-00-00-00 port 1-24 deny",
+    "config access_profile profile_id 20  add access_id 2  ethernet vlan_id 1531 source_mac 00-12-00-00-00-00 mask FF-FF-FF-FF-FF-00 destination_mac 00-00-00-00-00-00 mask 00-00-00-00-00-00 port 1-24 deny",
+]
+
+
+def send_rules_timing(connection):
+    for command in RULES:
+        connection.send_command_timing(command)
+        time.sleep(2)
+
+
+def send_rules_prompt(connection):
+    for command in RULES:
+        send_and_wait(connection, command)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Фиксированные паузы против ожидания приглашения на D-Link")
+    parser.add_argument('hosts', help="Файл со списком устройств: IP в строке или CSV (ip,port)")
+    parser.add_argument('--username', required=True)
+    parser.add_argument('--devices', type=int, default=5, help="Сколько устройств из списка прогнать (по умолчанию 5)")
+    args = parser.parse_args()
+
+    hosts = [host for host in iter_inventory(args.hosts)][:args.devices]
+    password = getpass.getpass("Пароль: ")
+
+    print(f"Устройств: {len(hosts)}, команд access_profile на устройство: {len(RULES)}")
+    print(f"{'Способ':<22}{'Всего, с':>10}{'На устройство, с':>18}")
+    totals = {}
+    for name, send_rules in (('timing + sleep(2)', send_rules_timing), ('ожидание приглашения', send_rules_prompt)):
+        elapsed = 0
+        for host in hosts:
+            connection = ConnectHandler(device_type='dlink_ds', host=host['ip'], port=int(host.get('port') or 22),
+                                        username=args.username, password=password)
+            try:
+                start = time.perf_counter()
+                send_rules(connection)
+                elapsed += time.perf_counter() - start
+            finally:
+                connection.disconnect()
+        totals[name] = elapsed
+        print(f"{name:<22}{elapsed:>10.2f}{elapsed / len(hosts):>18.2f}")
+    old, new = totals.values()
+    print(f"Экономия на устройство: {(old - new) / len(hosts):.2f} с ({(1 - new / old) * 100:.0f}%)")
+
+
+if __name__ == "__main__":
+    main()
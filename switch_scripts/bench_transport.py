@@ -0,0 +1,69 @@
+import argparse
+import asyncio
+import getpass
+import time
+
+from netmiko import ConnectHandler
+
+from async_transport import AsyncSwitchSession
+from fleet import run_fleet, run_fleet_async
+from inventory import iter_inventory
+
+# Сравнение пропускной способности: netmiko в пуле потоков против AsyncSwitchSession на asyncio.
+# На каждом устройстве: подключение, enable, одна команда чтения, отключение.
+# Без реальных коммутаторов можно мерить на ферме: switch_farm.py --inventory-out farm.csv
+
+
+def bench_netmiko(hosts, args, password):
+    def read_device(i, host):
+        connection = ConnectHandler(device_type=host.get('device_type') or args.device_type, host=host['ip'],
+                                    port=int(host.get('port') or 22), username=args.username,
+                                    password=password, secret=password, timeout=30)
+        try:
+            connection.enable()
+            return bool(connection.send_command(args.command) is not None)
+        finally:
+            connection.disconnect()
+
+    start = time.perf_counter()
+    results = run_fleet(hosts, read_device, args.concurrency)
+    return time.perf_counter() - start, sum(1 for _, ok in results if ok)
+
+
+def bench_async(hosts, args, password):
+    async def read_device(i, host):
+        async with AsyncSwitchSession(host['ip'], args.username, password, port=int(host.get('port') or 22),
+                                      device_type=host.get('device_type') or args.device_type) as connection:
+            await connection.enable()
+            return bool(await connection.send_command(args.command) is not None)
+
+    start = time.perf_counter()
+    results = asyncio.run(run_fleet_async(hosts, read_device, args.concurrency))
+    return time.perf_counter() - start, sum(1 for _, ok in results if ok)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сравнение netmiko (потоки) и asyncio-транспорта")
+    parser.add_argument('hosts', help="Файл со списком устройств: IP в строке или CSV (ip,port,device_type)")
+    parser.add_argument('--username', required=True)
+    parser.add_argument('--device-type', default='cisco_ios', choices=['cisco_ios', 'dlink_ds'])
+    parser.add_argument('--command', default='show version')
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--engine', choices=['netmiko', 'async', 'both'], default='both')
+    args = parser.parse_args()
+
+    hosts = list(iter_inventory(args.hosts))
+    password = getpass.getpass("Пароль: ")
+
+    print(f"Устройств: {len(hosts)}, одновременно: {args.concurrency}, команда: '{args.command}'")
+    print(f"{'Транспорт':<12}{'Время, с':>12}{'Успешно':>10}{'Устр./с':>10}")
+    benches = {'netmiko': bench_netmiko, 'async': bench_async}
+    for name, bench in benches.items():
+        if args.engine not in (name, 'both'):
+            continue
+        elapsed, ok = bench(hosts, args, password)
+        print(f"{name:<12}{elapsed:>12.2f}{ok:>10}{len(hosts) / elapsed:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+import json
+import os
+import re
+import threading
+from datetime import datetime
+
+# Поля, по которым запись относится именно к этому железу и прошивке
+IDENTITY_FIELDS = ('hardware', 'firmware', 'ssh_version')
+
+DLINK_HARDWARE_PATTERN = re.compile(r'^\s*Hardware Version\s*:\s*(\S+)', re.MULTILINE)
+DLINK_FIRMWARE_PATTERN = re.compile(r'^\s*Firmware Version\s*:\s*(?:Build\s+)?(\S+)', re.MULTILINE)
+
+
+class CapabilityStore:
+    """Постоянный кэш того, что уже выяснено об устройстве: модель, диалект CLI, вариант access_profile.
+
+    Запись хранится по IP вместе с аппаратной ревизией и прошивкой (или версией SSH-сервера, если
+    прошивка заранее неизвестна). get() с другими hardware/firmware удаляет запись - после обновления
+    прошивки определение выполняется заново. Файл перечитывается и перезаписывается целиком только
+    в save(), поэтому при параллельной обработке изменения копятся в памяти до конца запуска.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._changed = {}
+        self.entries = _read_entries(path)
+
+    def get(self, ip, **identity):
+        """Запись об устройстве или None. Переданные hardware/firmware/ssh_version должны совпасть с сохранёнными."""
+        with self._lock:
+            entry = self.entries.get(ip)
+            if entry is None:
+                return None
+            for field, value in identity.items():
+                if value and entry.get(field) and entry[field] != value:
+                    print(f"[capabilities] {ip}: {field} {entry[field]} -> {value}, сохранённые данные сброшены")
+                    self.entries.pop(ip)
+                    self._changed[ip] = None
+                    return None
+            return dict(entry)
+
+    def update(self, ip, **fields):
+        with self._lock:
+            entry = dict(self.entries.get(ip) or {})
+            entry.update({field: value for field, value in fields.items() if value is not None})
+            entry['updated'] = datetime.now().isoformat(timespec='seconds')
+            self.entries[ip] = entry
+            self._changed[ip] = entry
+
+    def forget(self, ip):
+        with self._lock:
+            if self.entries.pop(ip, None) is not None:
+                self._changed[ip] = None
+
+    def save(self):
+        """Записывает изменения поверх текущего содержимого файла (его могли обновить другие запуски)."""
+        with self._lock:
+            if not self._changed:
+                return
+            entries = _read_entries(self.path)
+            for ip, entry in self._changed.items():
+                if entry is None:
+                    entries.pop(ip, None)
+                else:
+                    entries[ip] = entry
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(entries, f, ensure_ascii=False, indent=1, sort_keys=True)
+            os.replace(tmp_path, self.path)
+            self._changed = {}
+
+    def close(self):
+        self.save()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def parse_dlink_identity(output_switch):
+    """(hardware, firmware) из вывода 'show switch' D-Link; None, если поле не найдено."""
+    hardware = DLINK_HARDWARE_PATTERN.search(output_switch)
+    firmware = DLINK_FIRMWARE_PATTERN.search(output_switch)
+    return (hardware.group(1) if hardware else None), (firmware.group(1) if firmware else None)
+
+
+def ssh_version(connection):
+    """Строка версии SSH-сервера устройства (например 'SSH-2.0-Cisco-1.25'); меняется вместе с прошивкой."""
+    try:
+        return connection.remote_conn.get_transport().remote_version
+    except Exception:
+        return None
+
+
+def _read_entries(path):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except ValueError as e:
+        print(f"[capabilities] {path} повреждён ({e}), начинаем с пустого")
+        return {}
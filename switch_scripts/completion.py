@@ -0,0 +1,32 @@
+import re
+
+from config_push import CONFIG_ERROR_PATTERN, prompt_token
+
+# Вопрос подтверждения, на котором команда останавливается без приглашения
+CONFIRM_PATTERN = r'\[[Yy]/[Nn]\]|\([Yy]/[Nn]\)|Confirm to overwrite'
+
+# Сообщения D-Link об исходе команды: "Success.", "Fail!", "Done." и подсказка при ошибке синтаксиса
+DES_SUCCESS_PATTERN = re.compile(r'^\s*(Success\.|Done\.)', re.MULTILINE)
+DES_FAIL_PATTERN = re.compile(r'Fail!|Next possible completions|Available commands', re.IGNORECASE)
+
+
+def send_and_wait(connection, command, timeout=30):
+    """Отправляет команду и возвращает вывод, как только коммутатор вернул приглашение или задал вопрос [Y/N].
+
+    Замена паре send_command_timing + time.sleep: быстрый коммутатор отвечает за доли секунды,
+    медленный ждём не дольше timeout (после него netmiko выбрасывает ReadTimeout).
+    Сообщения Success./Fail! приходят непосредственно перед приглашением, поэтому ждать приглашение -
+    то же самое, что ждать сообщение, но в канале не остаётся хвоста для следующей команды.
+    Приглашение ищется только в конце строки: длинную команду коммутатор может перерисовать
+    вместе с приглашением, и такое эхо не должно считаться концом вывода.
+    """
+    prompt = prompt_token(connection.base_prompt).pattern
+    return connection.send_command(command, expect_string=rf'(?m)(?:{prompt}\s*$|{CONFIRM_PATTERN})',
+                                   read_timeout=timeout, cmd_verify=False)
+
+
+def command_failed(output):
+    """Истина, если коммутатор отклонил команду (Fail! у D-Link, '% Invalid input' и т.п. у Cisco-подобных)."""
+    if DES_SUCCESS_PATTERN.search(output):
+        return False
+    return bool(DES_FAIL_PATTERN.search(output) or CONFIG_ERROR_PATTERN.search(output))
@@ -0,0 +1,50 @@
+import re
+import time
+
+# Строки, которыми коммутаторы сообщают об ошибке в команде конфигурации
+CONFIG_ERROR_PATTERN = re.compile(
+    r'^\s*%|Invalid input|Unrecognized command|Incomplete command|Ambiguous command|\bError\b|\bFail',
+    re.IGNORECASE)
+
+
+def prompt_token(base_prompt):
+    """Регулярное выражение для приглашения CLI в любом режиме: SW>, SW#, SW(config-if)#."""
+    return re.compile(re.escape(base_prompt) + r'[^\n]*?[>#]')
+
+
+def push_config_batch(connection, commands, read_timeout=120):
+    """Отправляет все команды в netmiko-соединение одной записью.
+
+    Не ждёт приглашение после каждой строки: читает канал, пока не придёт по одному
+    приглашению на каждую команду. Возвращает весь вывод с эхом команд.
+    """
+    connection.config_mode()
+    token = prompt_token(connection.base_prompt)
+    connection.write_channel(''.join(connection.normalize_cmd(command) for command in commands))
+    output = ''
+    deadline = time.monotonic() + read_timeout
+    while True:
+        new_data = connection.read_channel()
+        if new_data:
+            output += new_data
+            if len(token.findall(output)) >= len(commands) and token.search(output.rstrip().split('\n')[-1]):
+                return output
+        elif time.monotonic() > deadline:
+            raise TimeoutError(f"Не дождались выполнения {len(commands)} команд за {read_timeout} сек.")
+        else:
+            time.sleep(0.05)
+
+
+def find_config_errors(output, commands, base_prompt):
+    """Сопоставляет вывод пакетной отправки с командами и возвращает [(команда, строка ошибки)].
+
+    Вывод делится по приглашениям CLI: текст перед i-м приглашением - эхо и ответ i-й команды.
+    """
+    errors = []
+    segments = prompt_token(base_prompt).split(output.replace('\r', ''))
+    for command, segment in zip(commands, segments):
+        for line in segment.split('\n'):
+            if line.strip() and line.strip() != command and CONFIG_ERROR_PATTERN.search(line):
+                errors.append((command, line.strip()))
+                break
+    return errors
@@ -0,0 +1,119 @@
+import json
+import os
+import re
+import time
+
+# Полная конфигурация D-Link; на больших коммутаторах выводится несколько секунд
+CONFIG_COMMAND = 'show config current'
+CONFIG_TIMEOUT = 120
+
+# Первые два слова команды конфигурации: "config vlan", "create access_profile"
+PREFIX_PATTERN = re.compile(r'(\S+)\s+(\S+)')
+
+
+class ConfigSnapshot:
+    """Снимок 'show config current', по которому запросы include выполняются локально.
+
+    Индекс строится за один проход: первые два слова команды -> строки, которые с них начинаются.
+    Команды в 'show config current' всегда идут с начала строки, поэтому запрос, начинающийся с двух
+    слов ровно одной команды ("config vlan 4001 add tag", "create access_profile"), перебирает только её
+    строки, остальные - весь снимок.
+    """
+
+    def __init__(self, text, fetched_at=None):
+        self.lines = [line.strip() for line in text.splitlines() if line.strip()]
+        self.fetched_at = fetched_at or time.time()
+        self.index = {}
+        for line in self.lines:
+            match = PREFIX_PATTERN.match(line)
+            if match:
+                self.index.setdefault(match.groups(), []).append(line)
+
+    def include(self, pattern):
+        """Строки снимка, содержащие pattern, как у 'show config current include "pattern"'."""
+        match = PREFIX_PATTERN.match(pattern)
+        keys = []
+        if match:
+            first, second = match.groups()
+            if match.end() < len(pattern):
+                keys = [(first, second)] if (first, second) in self.index else []
+            else:
+                # Второе слово может быть недописанным: 'config vl' совпадает и со строками 'config vlan'
+                keys = [key for key in self.index if key[0] == first and key[1].startswith(second)]
+        candidates = self.index[keys[0]] if len(keys) == 1 else self.lines
+        return [line for line in candidates if pattern in line]
+
+    def show_include(self, connection, pattern, live_fallback=False):
+        """Вывод 'show config current include "pattern"' из снимка.
+
+        Если совпадений нет и live_fallback=True, команда всё же отправляется на коммутатор:
+        его ответ "No filter matched result!" / "No filter matched." отличает ревизию B от C.
+        """
+        lines = self.include(pattern)
+        if lines or not live_fallback:
+            return '\n'.join(lines)
+        return connection.send_command(f'{CONFIG_COMMAND} include "{pattern}"')
+
+
+class ConfigCache:
+    """Снимки конфигурации по устройствам: один 'show config current' на сессию.
+
+    С cache_dir снимок дополнительно хранится на диске (<cache_dir>/<ip>.json) и используется
+    повторно, пока ему не больше ttl секунд. Перед изменением конфигурации снимок сбрасывается (invalidate()),
+    чтобы прерванный запуск не оставил устаревший, а после save перечитывается: refresh().
+    """
+
+    def __init__(self, cache_dir=None, ttl=0):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def get(self, connection, ip):
+        snapshot = self._load(ip)
+        if snapshot:
+            print(f"Конфигурация {ip} взята из кэша ({time.time() - snapshot.fetched_at:.0f} с назад)")
+            return snapshot
+        return self._fetch(connection, ip)
+
+    def refresh(self, connection, ip):
+        """Перечитывает конфигурацию после save, чтобы следующий запуск взял её из кэша; без кэша на диске ничего не делает."""
+        if self.cache_dir and self.ttl > 0:
+            self._fetch(connection, ip)
+
+    def invalidate(self, ip):
+        if not self.cache_dir:
+            return
+        try:
+            os.remove(self._path(ip))
+        except FileNotFoundError:
+            pass
+
+    def _fetch(self, connection, ip):
+        snapshot = ConfigSnapshot(connection.send_command(CONFIG_COMMAND, read_timeout=CONFIG_TIMEOUT))
+        self._store(ip, snapshot)
+        return snapshot
+
+    def _path(self, ip):
+        return os.path.join(self.cache_dir, f'{ip}.json')
+
+    def _load(self, ip):
+        if not self.cache_dir or self.ttl <= 0:
+            return None
+        try:
+            with open(self._path(ip), encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if time.time() - entry.get('fetched_at', 0) > self.ttl:
+            return None
+        return ConfigSnapshot('\n'.join(entry.get('lines', [])), entry['fetched_at'])
+
+    def _store(self, ip, snapshot):
+        if not self.cache_dir:
+            return
+        # Параллельный процесс не должен прочитать файл наполовину записанным
+        tmp_path = self._path(ip) + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'ip': ip, 'fetched_at': snapshot.fetched_at, 'lines': snapshot.lines}, f, ensure_ascii=False)
+        os.replace(tmp_path, self._path(ip))
@@ -0,0 +1,143 @@
+import asyncio
+import contextvars
+import io
+import sys
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# Сколько устройств может ждать вывода впереди самого медленного (в долях от числа потоков)
+WINDOW_FACTOR = 4
+
+# Буфер вывода текущего устройства. У каждого потока и у каждой asyncio-задачи свой контекст,
+# поэтому одна переменная разделяет вывод и в пуле потоков, и в цикле событий.
+_captured_output = contextvars.ContextVar('captured_output', default=None)
+
+
+class _CapturedStdout:
+    """Подменяет sys.stdout: print() внутри обработки устройства попадает в буфер этого устройства."""
+
+    def __init__(self, real_stdout):
+        self._real = real_stdout
+
+    def write(self, text):
+        buffer = _captured_output.get()
+        if buffer is not None:
+            return buffer.write(text)
+        return self._real.write(text)
+
+    def flush(self):
+        self._real.flush()
+
+    def __getattr__(self, name):
+        return getattr(self._real, name)
+
+
+def run_fleet(devices, worker, concurrency=1):
+    """Вызывает worker(index, device) для каждого устройства пулом из concurrency потоков.
+
+    devices может быть любым итерируемым объектом: устройства берутся по мере
+    освобождения потоков, в работе одновременно не больше concurrency * WINDOW_FACTOR.
+    Вывод каждого устройства буферизуется и печатается целиком в порядке списка.
+    Возвращает список пар (device, result) в том же порядке; если worker упал
+    с исключением, result равен None.
+    """
+    results = []
+
+    if concurrency <= 1:
+        # Последовательный режим: печатаем вывод сразу, без буферизации
+        for index, device in enumerate(devices, 1):
+            results.append((device, _call_worker(worker, index, device)))
+        return results
+
+    def task(index, device):
+        buffer = io.StringIO()
+        token = _captured_output.set(buffer)
+        try:
+            result = _call_worker(worker, index, device)
+        finally:
+            _captured_output.reset(token)
+        return buffer.getvalue(), result
+
+    window = concurrency * WINDOW_FACTOR
+    in_flight = deque()
+    real_stdout = sys.stdout
+    sys.stdout = _CapturedStdout(real_stdout)
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            for index, device in enumerate(devices, 1):
+                in_flight.append((device, executor.submit(task, index, device)))
+                if len(in_flight) >= window:
+                    _emit(in_flight.popleft(), real_stdout, results)
+            while in_flight:
+                _emit(in_flight.popleft(), real_stdout, results)
+    finally:
+        sys.stdout = real_stdout
+    return results
+
+
+async def run_fleet_async(devices, worker, concurrency=100, device_timeout=None):
+    """Асинхронный вариант run_fleet: корутина worker(index, device) для каждого устройства.
+
+    Одновременно выполняется не больше concurrency корутин, все в одном потоке.
+    Если задан device_timeout, обработка устройства дольше этого времени (в секундах)
+    отменяется и считается ошибкой. Вывод и результаты - как у run_fleet.
+    """
+    results = []
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def task(index, device):
+        buffer = io.StringIO()
+        _captured_output.set(buffer)
+        async with semaphore:
+            try:
+                result = await asyncio.wait_for(worker(index, device), device_timeout)
+            except asyncio.TimeoutError:
+                print(f"\nПревышено время обработки устройства {device} ({device_timeout} сек.)")
+                result = None
+            except Exception as e:
+                print(f"\nНеобработанная ошибка на устройстве {device}: {e}")
+                result = None
+        return buffer.getvalue(), result
+
+    window = max(1, concurrency) * WINDOW_FACTOR
+    in_flight = deque()
+    real_stdout = sys.stdout
+    sys.stdout = _CapturedStdout(real_stdout)
+    try:
+        for index, device in enumerate(devices, 1):
+            # create_task копирует контекст, поэтому буфер каждой задачи свой
+            in_flight.append((device, asyncio.create_task(task(index, device))))
+            if len(in_flight) >= window:
+                await _emit_async(in_flight.popleft(), real_stdout, results)
+        while in_flight:
+            await _emit_async(in_flight.popleft(), real_stdout, results)
+    finally:
+        # При отмене (Ctrl+C) снимаем все незавершённые задачи
+        for _, pending in in_flight:
+            pending.cancel()
+        sys.stdout = real_stdout
+    return results
+
+
+def _call_worker(worker, index, device):
+    try:
+        return worker(index, device)
+    except Exception as e:
+        print(f"\nНеобработанная ошибка на устройстве {device}: {e}")
+        return None
+
+
+def _emit(item, real_stdout, results):
+    device, future = item
+    output, result = future.result()
+    real_stdout.write(output)
+    real_stdout.flush()
+    results.append((device, result))
+
+
+async def _emit_async(item, real_stdout, results):
+    device, pending = item
+    output, result = await pending
+    real_stdout.write(output)
+    real_stdout.flush()
+    results.append((device, result))
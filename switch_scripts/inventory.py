@@ -0,0 +1,79 @@
+import csv
+import hashlib
+import itertools
+import sys
+
+# Названия столбца с адресом устройства в CSV
+IP_COLUMNS = ('ip', 'host', 'address')
+
+
+def iter_inventory(source):
+    """Читает устройства из файла (или stdin, если source == '-') по одному, не загружая весь список.
+
+    Поддерживаются два формата, определяются по первой значимой строке:
+      - простой список: один IP-адрес в строке;
+      - CSV с заголовком (разделитель ',' или ';'): столбец ip/host и, например, model, firmware.
+    Пустые строки и строки, начинающиеся с '#', пропускаются.
+    Каждое устройство - словарь {'ip': ..., 'model': ..., 'firmware': ..., <прочие столбцы>}.
+    """
+    f = sys.stdin if source == '-' else open(source, 'r', encoding='utf-8', newline='')
+    try:
+        lines = (line for line in f if line.strip() and not line.lstrip().startswith('#'))
+        first = next(lines, None)
+        if first is None:
+            return
+        header = _csv_header(first)
+        if header is None:
+            for line in itertools.chain([first], lines):
+                yield {'ip': line.split()[0], 'model': None, 'firmware': None}
+            return
+        delimiter, ip_column = header
+        for row in csv.DictReader(itertools.chain([first], lines), delimiter=delimiter):
+            row = {key.strip().lower(): (value or '').strip() for key, value in row.items() if key}
+            device = {'model': None, 'firmware': None}
+            device.update({key: value or None for key, value in row.items()})
+            device['ip'] = row[ip_column]
+            yield device
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+
+def devices_from_list(ips):
+    """Превращает список IP-адресов (DEVICE_IPS и т.п.) в устройства того же вида, что и iter_inventory."""
+    for ip in ips:
+        yield {'ip': ip, 'model': None, 'firmware': None}
+
+
+def parse_shard(value):
+    """'2/4' -> (2, 4). Номера частей начинаются с 1."""
+    try:
+        index, count = (int(part) for part in value.split('/'))
+    except ValueError:
+        raise ValueError(f"Ожидается --shard i/N, например 1/4, получено: {value}") from None
+    if not 1 <= index <= count:
+        raise ValueError(f"Номер части должен быть от 1 до {count}, получено: {value}")
+    return index, count
+
+
+def select_shard(devices, index, count):
+    """Оставляет устройства части index из count.
+
+    Часть определяется по SHA-1 от IP-адреса, а не по порядку строк, поэтому несколько
+    хостов с одним и тем же файлом делят парк без пересечений и без согласования друг с другом,
+    даже если файл у них отсортирован по-разному.
+    """
+    for device in devices:
+        digest = hashlib.sha1(device['ip'].encode()).digest()
+        if int.from_bytes(digest[:8], 'big') % count == index - 1:
+            yield device
+
+
+def _csv_header(line):
+    for delimiter in (',', ';', '\t'):
+        if delimiter in line:
+            columns = [column.strip().lower() for column in line.split(delimiter)]
+            for ip_column in IP_COLUMNS:
+                if ip_column in columns:
+                    return delimiter, ip_column
+    return None
@@ -0,0 +1,81 @@
+import json
+import os
+import threading
+from datetime import datetime
+
+# Состояния устройства в журнале
+PENDING = 'pending'
+IN_PROGRESS = 'in_progress'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class RunJournal:
+    """Журнал выполнения: одна JSON-строка на каждое изменение состояния устройства.
+
+    Файл только дописывается, поэтому запись - один write() короткой строки под блокировкой,
+    без перечитывания и перезаписи файла. Текущее состояние устройства - его последняя запись.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        # buffering=1 - строчная буферизация: каждая запись сразу уходит в файл целиком
+        self._file = open(path, 'a', encoding='utf-8', buffering=1)
+        if self._file.tell() > 0 and not _ends_with_newline(path):
+            # Прошлый запуск оборвался посреди строки - начинаем с новой, чтобы не склеить записи
+            self._file.write('\n')
+
+    def record(self, ip, state, error=None, **details):
+        entry = {'time': datetime.now().isoformat(timespec='seconds'), 'ip': ip, 'state': state}
+        if error is not None:
+            entry['error'] = str(error)
+        entry.update(details)
+        line = json.dumps(entry, ensure_ascii=False) + '\n'
+        with self._lock:
+            self._file.write(line)
+
+    def track(self, devices):
+        """Пропускает устройства через себя, отмечая каждое как pending в момент постановки в очередь."""
+        for device in devices:
+            self.record(device['ip'], PENDING)
+            yield device
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _ends_with_newline(path):
+    with open(path, 'rb') as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b'\n'
+
+
+def load_journal(path):
+    """Возвращает {ip: последняя запись} по журналу; обрезанную при аварии последнюю строку пропускает."""
+    states = {}
+    if not os.path.exists(path):
+        return states
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            states[entry['ip']] = entry
+    return states
+
+
+def unfinished(devices, path):
+    """Оставляет из devices только те, что по журналу path не завершены успешно."""
+    states = load_journal(path)
+    for device in devices:
+        if states.get(device['ip'], {}).get('state') != DONE:
+            yield device
@@ -0,0 +1,176 @@
+import inspect
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+# Границы корзин гистограммы задержек, сек.
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+# Как часто перезаписывать textfile для Prometheus во время запуска, сек.
+PROM_WRITE_INTERVAL = 15
+
+# Метод соединения -> этап. Команды сохранения выделяются в отдельный этап write.
+METHOD_PHASES = {
+    'connect': 'connect',
+    'enable': 'enable',
+    'config_mode': 'config_mode',
+    'exit_config_mode': 'exit_config_mode',
+    'send_command': 'command',
+    'send_command_timing': 'command',
+    'send_config_set': 'config_set',
+    'save': 'write',
+    'disconnect': 'disconnect',
+}
+SAVE_COMMANDS = ('write', 'write memory', 'save')
+
+
+class DeviceTimings:
+    """Замеры этапов работы с одним устройством."""
+
+    def __init__(self, ip, **labels):
+        self.ip = ip
+        self.labels = labels
+        self.phases = []
+        self.started = time.perf_counter()
+
+    @contextmanager
+    def measure(self, phase, command=None):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(phase, time.perf_counter() - start, command)
+
+    def add(self, phase, seconds, command=None):
+        entry = {'phase': phase, 'seconds': round(seconds, 4)}
+        if command is not None:
+            entry['command'] = command
+        self.phases.append(entry)
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+
+class InstrumentedConnection:
+    """Обёртка над netmiko-соединением или AsyncSwitchSession: замеряет каждый вызов из METHOD_PHASES."""
+
+    def __init__(self, connection, timings):
+        self._connection = connection
+        self._timings = timings
+
+    def __getattr__(self, name):
+        attr = getattr(self._connection, name)
+        if name not in METHOD_PHASES or not callable(attr):
+            return attr
+        timings = self._timings
+
+        def phase_of(args):
+            command = args[0] if args and isinstance(args[0], str) else None
+            if command is not None and command.strip() in SAVE_COMMANDS:
+                return 'write', command
+            return METHOD_PHASES[name], command
+
+        if inspect.iscoroutinefunction(attr):
+            async def timed_async(*args, **kwargs):
+                phase, command = phase_of(args)
+                with timings.measure(phase, command):
+                    return await attr(*args, **kwargs)
+            return timed_async
+
+        def timed(*args, **kwargs):
+            phase, command = phase_of(args)
+            with timings.measure(phase, command):
+                return attr(*args, **kwargs)
+        return timed
+
+
+class MetricsRecorder:
+    """Собирает замеры по всем устройствам запуска.
+
+    json_path - JSON-строка на устройство со всеми этапами; prom_path - textfile для
+    node_exporter с гистограммой задержек по этапам. Оба пути необязательны.
+    """
+
+    def __init__(self, script, json_path=None, prom_path=None):
+        self.script = script
+        self.prom_path = prom_path
+        self._lock = threading.Lock()
+        self._json_file = open(json_path, 'a', encoding='utf-8', buffering=1) if json_path else None
+        self._buckets = {}
+        self._sums = {}
+        self._counts = {}
+        self._devices = {'success': 0, 'failure': 0}
+        self._last_prom_write = 0
+
+    def device(self, ip, **labels):
+        return DeviceTimings(ip, **labels)
+
+    def finish(self, timings, success):
+        entry = {
+            'time': datetime.now().isoformat(timespec='seconds'),
+            'script': self.script,
+            'ip': timings.ip,
+            **timings.labels,
+            'success': bool(success),
+            'total_seconds': round(timings.elapsed(), 4),
+            'phases': timings.phases,
+        }
+        line = json.dumps(entry, ensure_ascii=False) + '\n'
+        with self._lock:
+            if self._json_file:
+                self._json_file.write(line)
+            for phase in timings.phases:
+                self._observe(phase['phase'], phase['seconds'])
+            self._observe('device_total', entry['total_seconds'])
+            self._devices['success' if success else 'failure'] += 1
+            write_prom = time.monotonic() - self._last_prom_write >= PROM_WRITE_INTERVAL
+        if write_prom:
+            self.write_prometheus()
+
+    def _observe(self, phase, seconds):
+        buckets = self._buckets.setdefault(phase, [0] * len(LATENCY_BUCKETS))
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                buckets[i] += 1
+        self._sums[phase] = self._sums.get(phase, 0) + seconds
+        self._counts[phase] = self._counts.get(phase, 0) + 1
+
+    def write_prometheus(self):
+        if not self.prom_path:
+            return
+        with self._lock:
+            self._last_prom_write = time.monotonic()
+            lines = [
+                '# HELP switch_rollout_phase_seconds Длительность этапов работы с коммутатором.',
+                '# TYPE switch_rollout_phase_seconds histogram',
+            ]
+            for phase in sorted(self._buckets):
+                labels = f'script="{self.script}",phase="{phase}"'
+                for bound, count in zip(LATENCY_BUCKETS, self._buckets[phase]):
+                    lines.append(f'switch_rollout_phase_seconds_bucket{{{labels},le="{bound}"}} {count}')
+                lines.append(f'switch_rollout_phase_seconds_bucket{{{labels},le="+Inf"}} {self._counts[phase]}')
+                lines.append(f'switch_rollout_phase_seconds_sum{{{labels}}} {self._sums[phase]:.4f}')
+                lines.append(f'switch_rollout_phase_seconds_count{{{labels}}} {self._counts[phase]}')
+            lines.append('# HELP switch_rollout_devices_total Обработано устройств по результату.')
+            lines.append('# TYPE switch_rollout_devices_total counter')
+            for result, count in self._devices.items():
+                lines.append(f'switch_rollout_devices_total{{script="{self.script}",result="{result}"}} {count}')
+            # node_exporter не должен увидеть файл наполовину записанным
+            tmp_path = self.prom_path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write('\n'.join(lines) + '\n')
+            os.replace(tmp_path, self.prom_path)
+
+    def close(self):
+        self.write_prometheus()
+        if self._json_file:
+            self._json_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,117 @@
+import re
+
+# Одиночный порт или диапазон в записи коммутатора: "1-24,26", "25-28"
+PORT_RANGE_PATTERN = re.compile(r'\b(\d+)(?:-(\d+))?\b')
+# Запись целиком, без посторонних символов: так проверяется ввод оператора
+PORT_LIST_PATTERN = re.compile(r'\s*\d+(?:\s*-\s*\d+)?(?:\s*,\s*\d+(?:\s*-\s*\d+)?)*\s*')
+
+
+class PortSet:
+    """Множество номеров портов на битовой маске.
+
+    Бит N установлен - порт N входит в множество. Объединение, пересечение и разность -
+    одна операция над целым числом, а не перебор списков. Разбирает и печатает
+    запись диапазонами, как её принимают коммутаторы: PortSet.parse('1-24,26') -> '1-24,26'.
+    """
+
+    __slots__ = ('bits',)
+
+    def __init__(self, ports=()):
+        bits = 0
+        for port in ports:
+            bits |= 1 << int(port)
+        self.bits = bits
+
+    @classmethod
+    def from_bits(cls, bits):
+        port_set = cls()
+        port_set.bits = bits
+        return port_set
+
+    @classmethod
+    def parse(cls, text, max_port=None, strict=False):
+        """Разбирает '1-24,26' (а также '25-28' с пробелами и мусором вокруг) в PortSet.
+
+        Перевёрнутый диапазон (28-25) считается тем же, что 25-28.
+        strict=True - запись должна состоять только из номеров, диапазонов и запятых;
+        max_port - номера вне 1..max_port отвергаются до построения маски, иначе
+        '1-99999999' дал бы целое на сто миллионов бит. Нарушение - ValueError.
+        """
+        if strict and not PORT_LIST_PATTERN.fullmatch(text):
+            raise ValueError(f"ожидаются номера и диапазоны через запятую (1,3,5-8), получено '{text}'")
+        if strict:
+            text = re.sub(r'\s+', '', text)
+        bits = 0
+        for start, end in PORT_RANGE_PATTERN.findall(text):
+            start = int(start)
+            end = int(end) if end else start
+            if start > end:
+                start, end = end, start
+            if max_port is not None and (start < 1 or end > max_port):
+                ports = start if start == end else f'{start}-{end}'
+                raise ValueError(f"порты {ports} вне диапазона 1-{max_port}")
+            bits |= ((1 << (end - start + 1)) - 1) << start
+        return cls.from_bits(bits)
+
+    def ranges(self):
+        """Непрерывные диапазоны портов по возрастанию: [(1, 24), (26, 26)]."""
+        result = []
+        bits = self.bits
+        while bits:
+            start = (bits & -bits).bit_length() - 1
+            # Прибавление единицы гасит непрерывный блок единиц: XOR с исходным даёт его длину + 1
+            shifted = bits >> start
+            end = start + (shifted ^ (shifted + 1)).bit_length() - 2
+            result.append((start, end))
+            bits &= ~(((1 << (end - start + 1)) - 1) << start)
+        return result
+
+    def format(self, separator=','):
+        """Запись для команды коммутатора: '1-24,26'."""
+        return separator.join(str(start) if start == end else f'{start}-{end}' for start, end in self.ranges())
+
+    def __str__(self):
+        return self.format()
+
+    def __repr__(self):
+        return f"PortSet('{self.format()}')"
+
+    def __iter__(self):
+        bits = self.bits
+        while bits:
+            lowest = bits & -bits
+            yield lowest.bit_length() - 1
+            bits ^= lowest
+
+    def __len__(self):
+        return bin(self.bits).count('1')
+
+    def __bool__(self):
+        return self.bits != 0
+
+    def __contains__(self, port):
+        try:
+            return bool(self.bits >> int(port) & 1)
+        except (TypeError, ValueError):
+            return False
+
+    def __eq__(self, other):
+        return isinstance(other, PortSet) and self.bits == other.bits
+
+    def __hash__(self):
+        return hash(self.bits)
+
+    def __or__(self, other):
+        return PortSet.from_bits(self.bits | other.bits)
+
+    def __and__(self, other):
+        return PortSet.from_bits(self.bits & other.bits)
+
+    def __sub__(self, other):
+        return PortSet.from_bits(self.bits & ~other.bits)
+
+    def add(self, port):
+        self.bits |= 1 << int(port)
+
+    def update(self, other):
+        self.bits |= other.bits
@@ -1,14 +1,39 @@
 from netmiko import ConnectHandler
+import argparse
+import asyncio
 import getpass
 import re
 import time
+from contextlib import nullcontext
 from datetime import datetime
+from admission import AdmissionController
+from async_transport import AsyncSwitchSession
+from config_push import find_config_errors, push_config_batch
+from fleet import run_fleet, run_fleet_async
+from inventory import devices_from_list, iter_inventory, parse_shard, select_shard
+from journal import DONE, FAILED, IN_PROGRESS, RunJournal, unfinished
+from metrics import DeviceTimings, InstrumentedConnection, MetricsRecorder
 
 DEVICE_IPS = [	      
     #'X.X.X.X',	     
     #'Y.Y.Y.Y',	    
 ]
 
+REMOVE_COMMANDS = [
+    'no access-list 100',
+    'no access-list 150',
+    'no access-list 160',
+]
+
+NEW_ACLS = [
+    'access-list 100 10 deny mac 0012.0000.0000 0000.0000.00FF any vlan 1530',
+    'access-list 100 20 deny mac 00012.0000.0000 0000.0000.00FF any vlan 1531',
+    'access-list 150 10 permit mac 00012.0000.0000 0000.0000.00FF any 0x8863 vlan 1530',
+    'access-list 150 20 permit mac 00012.0000.0000 0000.0000.00FF any 0x8864 vlan 1531',
+    'access-list 160 30 deny mac any any vlan 1510',
+    'vlan 1531',
+]
+
 def parse_interfaces_with_acl(output):
     interfaces_acl = {}
     lines = output.strip().split('\n')
@@ -31,13 +56,81 @@ def parse_interfaces_with_acl(output):
                 interfaces_acl[current_interface].append('mac access-group 160 in')    
     return {iface: acls for iface, acls in interfaces_acl.items() if acls}
 
-def configure_device(device_ip, username, password, enable_password):
+# Правило ACL в выводе show mac access-lists или в виде команды:
+#   "access-list 100 10 deny mac ...", "10 deny mac ...", "rule ID 10: deny mac ..."
+ACL_RULE_PATTERN = re.compile(
+    r'^(?:access-list\s+(\d+)\s+)?(?:(?:rule\s+)?(?:id\s+)?\d+:?\s+)?(permit|deny)\s+(.+?)'
+    r'(?:\s*\(\d+\s+match(?:es)?\))?$', re.IGNORECASE)
+ACL_HEADER_PATTERN = re.compile(r'access-list(?:\s+extended)?\s+(\d+)', re.IGNORECASE)
+
+def parse_mac_access_lists(output):
+    """Возвращает множество правил {(номер ACL, 'deny mac ...')} без номеров строк и регистра."""
+    rules = set()
+    current_acl = None
+    for line in output.strip().split('\n'):
+        line = ' '.join(line.split())
+        match = ACL_RULE_PATTERN.match(line)
+        if match:
+            acl = match.group(1) or current_acl
+            if acl:
+                rules.add((acl, f"{match.group(2)} {match.group(3)}".lower()))
+            continue
+        header = ACL_HEADER_PATTERN.search(line)
+        if header:
+            current_acl = header.group(1)
+    return rules
+
+# Целевое состояние ACL для проверки перед настройкой
+DESIRED_ACL_RULES = parse_mac_access_lists('\n'.join(NEW_ACLS))
+
+def is_device_compliant(acl_output, interfaces_with_acl):
+    """Истина, если ACL 100/150/160 совпадают с NEW_ACLS и все привязки ссылаются на существующие ACL.
+
+    Другие ACL на коммутаторе скрипт не трогает, поэтому и не сравнивает.
+    """
+    managed = {acl for acl, _ in DESIRED_ACL_RULES}
+    current_rules = {rule for rule in parse_mac_access_lists(acl_output) if rule[0] in managed}
+    if current_rules != DESIRED_ACL_RULES:
+        return False
+    defined = {acl for acl, _ in current_rules}
+    return all(acl.split()[2] in defined for acls in interfaces_with_acl.values() for acl in acls)
+
+def build_change_set(interfaces_with_acl):
+    """Полный набор команд для пакетной отправки: ACL и привязки к интерфейсам.
+
+    end и write в пакет не входят: конфигурация сохраняется, только если устройство приняло все команды.
+    """
+    commands = REMOVE_COMMANDS + NEW_ACLS
+    for interface, acls in interfaces_with_acl.items():
+        commands += [f"interface {interface}", *acls, "exit"]
+    return commands
+
+# Результат configure_device для коммутатора, которому настройка не нужна
+SKIPPED = 'skipped'
+
+def check_batch_output(output, commands, base_prompt):
+    errors = find_config_errors(output, commands, base_prompt)
+    if errors:
+        print(f"\n  Устройство отклонило команд: {len(errors)}")
+        for command, error in errors:
+            print(f"    {command}  ->  {error}")
+        raise ValueError(f"ошибки в {len(errors)} командах пакетной отправки")
+    print(f"  Все {len(commands)} команд приняты")
+
+def configure_device(device_ip, username, password, enable_password, batch=False, precheck=True, journal=None,
+                     timings=None, admission=None, site=None, port=22):
 
     print(f"\n{'='*60}")
     print(f"НАСТРОЙКА УСТРОЙСТВА: {device_ip}")
     print(f"Время начала: {datetime.now().strftime('%H:%M:%S')}")
     print(f"{'='*60}")
+    if journal:
+        journal.record(device_ip, IN_PROGRESS)
+    timings = timings or DeviceTimings(device_ip)
+    # Ждём своей очереди на вход: ограничение темпа подключений и сессий на площадку
+    ticket = admission.acquire(device_ip, site) if admission else None
     
+    connection = None
     try:
         # Параметры устройства
         device = {
@@ -46,10 +139,13 @@ def configure_device(device_ip, username, password, enable_password):
             'username': username,
             'password': password,
             'secret': enable_password,
+            'port': port,
             'timeout': 30,
         }
         
-        connection = ConnectHandler(**device)
+        with timings.measure('connect'), ticket.login() if ticket else nullcontext():
+            net_connect = ConnectHandler(**device)
+        connection = InstrumentedConnection(net_connect, timings)
         connection.enable()
         
         output = connection.send_command("sh running-config interface | include mac|ge|xe")
@@ -67,55 +163,60 @@ def configure_device(device_ip, username, password, enable_password):
             print("Интерфейсов с ACL не найдено")
             interfaces_with_acl = {}
         
-        print("\n Удаление старых ACL...")
-        connection.config_mode()
-        
-        remove_commands = [
-            'no access-list 100',
-            'no access-list 150',
-            'no access-list 160',
-        ]
-        
-        for cmd in remove_commands:
-            print(f"  Выполняю: {cmd}")
-            output = connection.send_command(cmd)
-        
-        print("\n Создание новых ACL...")
-        new_acls = [
-            'access-list 100 10 deny mac 0012.0000.0000 0000.0000.00FF any vlan 1530',
-            'access-list 100 20 deny mac 00012.0000.0000 0000.0000.00FF any vlan 1531',
-            'access-list 150 10 permit mac 00012.0000.0000 0000.0000.00FF any 0x8863 vlan 1530',
-            'access-list 150 20 permit mac 00012.0000.0000 0000.0000.00FF any 0x8864 vlan 1531',
-            'access-list 160 30 deny mac any any vlan 1510',
-            'vlan 1531',
-        ]
-        
-        for cmd in new_acls:
-            print(f"  Выполняю: {cmd}")
-            connection.send_command(cmd)
+        if precheck:
+            print("\n Проверка текущих ACL...")
+            if is_device_compliant(connection.send_command("show mac access-lists"), interfaces_with_acl):
+                print(f"\n{'='*60}")
+                print(f"УСТРОЙСТВО {device_ip} УЖЕ НАСТРОЕНО - ПРОПУСКАЕМ")
+                print(f"{'='*60}")
+                if journal:
+                    journal.record(device_ip, DONE, skipped=True)
+                return SKIPPED
+            print("  ACL отличаются от целевых, выполняем настройку")
         
-        if interfaces_with_acl:
-            print("\n Восстановление ACL на интерфейсах...")
+        if batch:
+            commands = build_change_set(interfaces_with_acl)
+            print(f"\n Пакетная отправка {len(commands)} команд (удаление, создание ACL, интерфейсы)...")
+            # Пакет отправляется в обход обёртки: вход в режим конфигурации внутри push_config_batch
+            # иначе попал бы в замеры дважды - отдельным этапом config_mode и внутри config_set
+            with timings.measure('config_set'):
+                output = push_config_batch(net_connect, commands)
+            check_batch_output(output, commands, connection.base_prompt)
+            connection.exit_config_mode()
+        else:
+            print("\n Удаление старых ACL...")
+            connection.config_mode()
+        
+            for cmd in REMOVE_COMMANDS:
+                print(f"  Выполняю: {cmd}")
+                output = connection.send_command(cmd)
+        
+            print("\n Создание новых ACL...")
+            for cmd in NEW_ACLS:
+                print(f"  Выполняю: {cmd}")
+                connection.send_command(cmd)
+        
+            if interfaces_with_acl:
+                print("\n Восстановление ACL на интерфейсах...")
             
-            for interface, acls in interfaces_with_acl.items():
-                print(f"\n  Настройка интерфейса {interface}:")
+                for interface, acls in interfaces_with_acl.items():
+                    print(f"\n  Настройка интерфейса {interface}:")
                 
-                connection.send_command_timing(f"interface {interface}")
+                    connection.send_command_timing(f"interface {interface}")
                 
-                for acl in acls:
-                    print(f"    Применяю: {acl}")
-                    output = connection.send_command_timing(acl)
+                    for acl in acls:
+                        print(f"    Применяю: {acl}")
+                        output = connection.send_command_timing(acl)
                 
-                connection.send_command_timing("exit")
+                    connection.send_command_timing("exit")
                 
-        else:
-            print("\n Нет интерфейсов для применения ACL")
+            else:
+                print("\n Нет интерфейсов для применения ACL")
         
-        connection.send_command_timing("end")
-        connection.exit_config_mode()
+            connection.send_command_timing("end")
+            connection.exit_config_mode()
         
         print("\n Сохранение и проверка конфигурации...")
-        
         print("  Сохраняю конфигурацию...")
         output = connection.send_command("write")
                
@@ -130,13 +231,13 @@ def configure_device(device_ip, username, password, enable_password):
         print("  " + "-" * 48)
         print("  " + "\n  ".join(final_output1.split('\n')))
         print("  " + "-" * 48)             
-
-        connection.disconnect()
         
         print(f"\n{'='*60}")
         print(f"УСТРОЙСТВО {device_ip} УСПЕШНО НАСТРОЕНО!")
         print(f"Время завершения: {datetime.now().strftime('%H:%M:%S')}")
         print(f"{'='*60}")
+        if journal:
+            journal.record(device_ip, DONE)
         
         return True
         
@@ -144,74 +245,311 @@ def configure_device(device_ip, username, password, enable_password):
         print(f"\n{'!'*60}")
         print(f"ОШИБКА на устройстве {device_ip}: {str(e)}")
         print(f"{'!'*60}")
+        if journal:
+            journal.record(device_ip, FAILED, error=e)
+        return False
+    finally:
+        # Сессия закрывается и при ошибке: иначе она держит место в лимите площадки после release()
+        if connection is not None:
+            try:
+                connection.disconnect()
+            except Exception as e:
+                print(f"Ошибка при закрытии подключения к {device_ip}: {e}")
+        if ticket:
+            ticket.release()
+
+async def configure_device_async(device_ip, username, password, enable_password, batch=False, precheck=True, journal=None,
+                                 timings=None, admission=None, site=None, port=22):
+    """То же, что configure_device, но через AsyncSwitchSession: сотни устройств в одном потоке."""
+
+    print(f"\n{'='*60}")
+    print(f"НАСТРОЙКА УСТРОЙСТВА: {device_ip}")
+    print(f"Время начала: {datetime.now().strftime('%H:%M:%S')}")
+    print(f"{'='*60}")
+    if journal:
+        journal.record(device_ip, IN_PROGRESS)
+    timings = timings or DeviceTimings(device_ip)
+    ticket = await admission.acquire_async(device_ip, site) if admission else None
+    
+    try:
+        session = AsyncSwitchSession(device_ip, username, password, enable_password, device_type='cisco_ios',
+                                     port=port, timeout=30)
+        connection = InstrumentedConnection(session, timings)
+        with ticket.login() if ticket else nullcontext():
+            await connection.connect()
+        try:
+            await connection.enable()
+            
+            output = await connection.send_command("sh running-config interface | include mac|ge|xe")
+            print(output)
+            
+            print("\n Анализ ACL на интерфейсах...")
+            interfaces_with_acl = parse_interfaces_with_acl(output)
+            if interfaces_with_acl:
+                print(f"Найдено интерфейсов с ACL: {len(interfaces_with_acl)}")
+                for interface, acls in interfaces_with_acl.items():
+                    print(f"  {interface}: {', '.join(acls)}")
+            else:
+                print("Интерфейсов с ACL не найдено")
+            
+            if precheck:
+                print("\n Проверка текущих ACL...")
+                if is_device_compliant(await connection.send_command("show mac access-lists"), interfaces_with_acl):
+                    print(f"\n{'='*60}")
+                    print(f"УСТРОЙСТВО {device_ip} УЖЕ НАСТРОЕНО - ПРОПУСКАЕМ")
+                    print(f"{'='*60}")
+                    if journal:
+                        journal.record(device_ip, DONE, skipped=True)
+                    return SKIPPED
+                print("  ACL отличаются от целевых, выполняем настройку")
+            
+            if batch:
+                commands = build_change_set(interfaces_with_acl)
+                print(f"\n Пакетная отправка {len(commands)} команд (удаление, создание ACL, интерфейсы)...")
+                output = await connection.send_config_set(commands)
+                check_batch_output(output, commands, connection.base_prompt)
+                await connection.exit_config_mode()
+            else:
+                print("\n Удаление старых ACL...")
+                await connection.config_mode()
+                for cmd in REMOVE_COMMANDS:
+                    print(f"  Выполняю: {cmd}")
+                    await connection.send_command(cmd)
+            
+                print("\n Создание новых ACL...")
+                for cmd in NEW_ACLS:
+                    print(f"  Выполняю: {cmd}")
+                    await connection.send_command(cmd)
+            
+                if interfaces_with_acl:
+                    print("\n Восстановление ACL на интерфейсах...")
+                    for interface, acls in interfaces_with_acl.items():
+                        print(f"\n  Настройка интерфейса {interface}:")
+                        await connection.send_command(f"interface {interface}")
+                        for acl in acls:
+                            print(f"    Применяю: {acl}")
+                            await connection.send_command(acl)
+                        await connection.send_command("exit")
+                else:
+                    print("\n Нет интерфейсов для применения ACL")
+            
+                await connection.exit_config_mode()
+            
+            print("\n Сохранение и проверка конфигурации...")
+            print("  Сохраняю конфигурацию...")
+            await connection.save()
+            
+            print("\n  Проверяю итоговую конфигурацию...")
+            final_output = await connection.send_command("show running-config interface | include mac|ge|xe")
+            final_output1 = await connection.send_command("show mac access-lists")
+            
+            print("\n  Итоговая конфигурация интерфейсов:")
+            print("  " + "-" * 48)
+            print("  " + "\n  ".join(final_output.split('\n')))
+            print("  " + "-" * 48)
+            print("  " + "\n  ".join(final_output1.split('\n')))
+            print("  " + "-" * 48)
+        finally:
+            connection.disconnect()
+        
+        print(f"\n{'='*60}")
+        print(f"УСТРОЙСТВО {device_ip} УСПЕШНО НАСТРОЕНО!")
+        print(f"Время завершения: {datetime.now().strftime('%H:%M:%S')}")
+        print(f"{'='*60}")
+        if journal:
+            journal.record(device_ip, DONE)
+        return True
+    
+    except asyncio.CancelledError:
+        # wait_for(device_timeout) снимает корутину через CancelledError, а не Exception:
+        # без этой ветки устройство осталось бы в журнале IN_PROGRESS без причины
+        print(f"\n{'!'*60}")
+        print(f"ОШИБКА на устройстве {device_ip}: превышено время обработки")
+        print(f"{'!'*60}")
+        if journal:
+            journal.record(device_ip, FAILED, error='timeout')
+        raise
+    except Exception as e:
+        print(f"\n{'!'*60}")
+        print(f"ОШИБКА на устройстве {device_ip}: {str(e)}")
+        print(f"{'!'*60}")
+        if journal:
+            journal.record(device_ip, FAILED, error=e)
         return False
+    finally:
+        if ticket:
+            ticket.release()
 
 def main():
 
+    parser = argparse.ArgumentParser(description="Настройка ACL на коммутаторах SNR-52xx")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Сколько устройств настраивать одновременно (по умолчанию 1 - последовательно)")
+    parser.add_argument('--engine', choices=['netmiko', 'async'], default='netmiko',
+                        help="netmiko - поток на устройство, async - все сессии в одном потоке на asyncio")
+    parser.add_argument('--batch', action='store_true',
+                        help="Отправлять все изменения одним пакетом вместо команды за командой")
+    parser.add_argument('--force', action='store_true',
+                        help="Настраивать все коммутаторы, даже если ACL на них уже совпадают с целевыми")
+    parser.add_argument('--device-timeout', type=float, default=None,
+                        help="Предельное время обработки одного устройства в режиме async, сек.")
+    parser.add_argument('--journal', default='snr_acl_journal.jsonl',
+                        help="Файл журнала выполнения (по умолчанию snr_acl_journal.jsonl)")
+    parser.add_argument('--resume', action='store_true',
+                        help="Продолжить прерванный запуск: только незавершённые и упавшие устройства из журнала")
+    parser.add_argument('--inventory',
+                        help="Файл со списком устройств (IP в строке или CSV со столбцами ip,model,firmware и необязательными port,site); '-' - stdin. "
+                             "Без него используется DEVICE_IPS")
+    parser.add_argument('--shard', help="Обработать только часть i из N списка, например 1/4")
+    parser.add_argument('--login-rate', type=float, default=10,
+                        help="Не больше стольких новых SSH-входов в секунду (по умолчанию 10), "
+                             "при медленных или неудачных входах темп снижается автоматически")
+    parser.add_argument('--login-burst', type=int, default=10, help="Допустимый всплеск входов (по умолчанию 10)")
+    parser.add_argument('--site-sessions', type=int, default=8,
+                        help="Не больше стольких одновременных сессий на площадку: столбец site в списке "
+                             "устройств или подсеть /24 (по умолчанию 8)")
+    parser.add_argument('--metrics-json', help="Файл для замеров по устройствам (JSON-строка на устройство)")
+    parser.add_argument('--metrics-prom',
+                        help="Textfile для node_exporter с гистограммой длительности этапов, например "
+                             "/var/lib/node_exporter/textfile/snr_acl.prom")
+    parser.add_argument('--username', help="Имя пользователя (обязательно, если список устройств читается из stdin)")
+    parser.add_argument('--yes', action='store_true', help="Не спрашивать подтверждение перед началом")
+    args = parser.parse_args()
+    workers = max(1, args.workers)
+    mode = "ПОСЛЕДОВАТЕЛЬНОЙ" if workers == 1 else "ПАРАЛЛЕЛЬНОЙ"
+
     print("=" * 70)
-    print("СКРИПТ ДЛЯ ПОСЛЕДОВАТЕЛЬНОЙ НАСТРОЙКИ ACL НА КОММУТАТОРАХ")
+    print(f"СКРИПТ ДЛЯ {mode} НАСТРОЙКИ ACL НА КОММУТАТОРАХ")
     print("=" * 70)
     
-    if not DEVICE_IPS:
+    if args.inventory == '-' and not (args.username and args.yes):
+        print("\n⚠ ОШИБКА: при чтении списка из stdin укажите --username и --yes")
+        return
+    
+    if args.inventory:
+        # Список читается по мере работы, поэтому общее количество заранее неизвестно
+        devices = iter_inventory(args.inventory)
+    elif DEVICE_IPS:
+        devices = devices_from_list(DEVICE_IPS)
+    else:
         print("\n⚠ ОШИБКА: Список DEVICE_IPS пуст!")
-        print("Добавьте IP-адреса в список DEVICE_IPS в начале скрипта.")
+        print("Добавьте IP-адреса в список DEVICE_IPS в начале скрипта или укажите --inventory.")
         return
     
-    print(f"\nВ списке найдено {len(DEVICE_IPS)} устройств для настройки:")
-    for i, ip in enumerate(DEVICE_IPS, 1):
-        print(f"  {i:2d}. {ip}")
+    if args.shard:
+        try:
+            shard_index, shard_count = parse_shard(args.shard)
+        except ValueError as e:
+            print(f"\n⚠ ОШИБКА: {e}")
+            return
+        devices = select_shard(devices, shard_index, shard_count)
+        print(f"\nОбрабатывается часть {shard_index} из {shard_count}")
+    if args.resume:
+        devices = unfinished(devices, args.journal)
+        print(f"\nПродолжение по журналу {args.journal}: пропускаются уже настроенные устройства")
+    
+    total = None
+    if not args.inventory:
+        devices = list(devices)
+        total = len(devices)
+        if not devices:
+            print("\nНет устройств для настройки.")
+            return
+        print(f"\nВ списке найдено {total} устройств для настройки:")
+        for i, device in enumerate(devices, 1):
+            print(f"  {i:2d}. {device['ip']}")
+    else:
+        print(f"\nУстройства будут прочитаны из {'stdin' if args.inventory == '-' else args.inventory}")
     
     print("\n" + "-" * 70)
     print("ВВЕДИТЕ УЧЕТНЫЕ ДАННЫЕ ДЛЯ ПОДКЛЮЧЕНИЯ")
     print("-" * 70)
     
-    username = input("Имя пользователя: ")
+    username = args.username or input("Имя пользователя: ")
     password = getpass.getpass("Пароль: ")
     enable_password = getpass.getpass("Пароль для enable режима (Enter если совпадает): ") or password
     
     print("\n" + "-" * 70)
-    print(f"БУДЕТ НАСТРОЕНО УСТРОЙСТВ: {len(DEVICE_IPS)}")
+    print(f"БУДЕТ НАСТРОЕНО УСТРОЙСТВ: {total if total is not None else 'все из списка'}")
+    if workers > 1:
+        print(f"Одновременно настраиваемых устройств: {workers}")
     print("-" * 70)
     
-    confirm = input(f"Начать последовательную настройку всех {len(DEVICE_IPS)} устройств? (y/n): ").lower()
-    if confirm != 'y':
-        print("Операция отменена.")
-        return
+    if not args.yes:
+        count_text = f"всех {total} " if total is not None else ""
+        confirm = input(f"Начать настройку {count_text}устройств? (y/n): ").lower()
+        if confirm != 'y':
+            print("Операция отменена.")
+            return
       
     print(f"\n{'#' * 70}")
-    print(f"НАЧАЛО ПОСЛЕДОВАТЕЛЬНОЙ НАСТРОЙКИ")
-    print(f"Всего устройств в очереди: {len(DEVICE_IPS)}")
+    print(f"НАЧАЛО {mode} НАСТРОЙКИ")
+    if total is not None:
+        print(f"Всего устройств в очереди: {total}")
     print(f"Общее время начала: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     print(f"{'#' * 70}")
     
-    results = []
-    successful_count = 0
+    def progress(i):
+        if total is None:
+            return f"УСТРОЙСТВО {i}"
+        return f"УСТРОЙСТВО {i} ИЗ {total}"
     
-    for i, device_ip in enumerate(DEVICE_IPS, 1):
+    def configure_next(i, device):
         print(f"\n\n{'='*70}")
-        print(f"УСТРОЙСТВО {i} ИЗ {len(DEVICE_IPS)}: {device_ip}")
-        print(f"Прогресс: {i}/{len(DEVICE_IPS)} ({i/len(DEVICE_IPS)*100:.1f}%)")
+        print(f"{progress(i)}: {device['ip']}")
+        if total is not None:
+            print(f"Прогресс: {i}/{total} ({i/total*100:.1f}%)")
         print(f"{'='*70}")
         
-        success = configure_device(device_ip, username, password, enable_password)
-        results.append({'ip': device_ip, 'success': success})
+        timings = metrics.device(device['ip'], model=device['model'], firmware=device['firmware'])
+        success = configure_device(device['ip'], username, password, enable_password, args.batch, not args.force, journal,
+                                   timings, admission, device.get('site'), int(device.get('port') or 22))
+        metrics.finish(timings, success)
         
-        if success:
-            successful_count += 1
-        
-        if i < len(DEVICE_IPS):
+        # Пауза нужна только при последовательной настройке
+        if workers == 1 and (total is None or i < total):
             pause_time = 2
             print(f"\n{'~'*40}")
             print(f"Пауза {pause_time} сек. перед следующим устройством...")
             print(f"{'~'*40}")
             time.sleep(pause_time)
+        return success
+    
+    async def configure_next_async(i, device):
+        print(f"\n\n{'='*70}")
+        print(f"{progress(i)}: {device['ip']}")
+        print(f"{'='*70}")
+        timings = metrics.device(device['ip'], model=device['model'], firmware=device['firmware'])
+        try:
+            success = await configure_device_async(device['ip'], username, password, enable_password, args.batch,
+                                                   not args.force, journal, timings, admission, device.get('site'),
+                                                   int(device.get('port') or 22))
+        except asyncio.CancelledError:
+            metrics.finish(timings, False)
+            raise
+        metrics.finish(timings, success)
+        return success
+    
+    admission = AdmissionController(args.login_rate, args.login_burst, args.site_sessions)
+    with RunJournal(args.journal) as journal, MetricsRecorder('snr_acl', args.metrics_json, args.metrics_prom) as metrics:
+        queue = journal.track(devices)
+        if args.engine == 'async':
+            fleet_results = asyncio.run(run_fleet_async(queue, configure_next_async, workers,
+                                                        device_timeout=args.device_timeout))
+        else:
+            fleet_results = run_fleet(queue, configure_next, workers)
+    results = [{'ip': device['ip'], 'success': bool(success), 'skipped': success == SKIPPED}
+               for device, success in fleet_results]
+    successful_count = sum(1 for result in results if result['success'])
+    skipped_count = sum(1 for result in results if result['skipped'])
     
     print(f"\n\n{'#' * 70}")
     print("ИТОГОВЫЙ ОТЧЕТ")
     print(f"{'#' * 70}")
     
     print(f"\nВсего обработано устройств: {len(results)}")
-    print(f"Успешно настроено: {successful_count}")
+    print(f"Успешно настроено: {successful_count - skipped_count}")
+    print(f"Уже были настроены (пропущены): {skipped_count}")
     print(f"С ошибками: {len(results) - successful_count}")
     
     if len(results) - successful_count > 0:
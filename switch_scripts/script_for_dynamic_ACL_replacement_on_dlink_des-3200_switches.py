@@ -1,187 +1,271 @@
 import netmiko
+import argparse
+import getpass
 from collections import defaultdict
-import time
-import re  # Импорт regexp для улучшенного парсинга портов
+from contextlib import nullcontext
+from datetime import datetime
+from admission import AdmissionController
+from capabilities import CapabilityStore, parse_dlink_identity
+from completion import command_failed, send_and_wait
+from config_snapshot import ConfigCache
+from fleet import run_fleet
+from inventory import devices_from_list, iter_inventory, parse_shard, select_shard
+from journal import DONE, FAILED, IN_PROGRESS, RunJournal, unfinished
+from metrics import DeviceTimings, InstrumentedConnection, MetricsRecorder
+from portset import PortSet
 
 # Список IP-адресов устройств для последовательного подключения
 devices_ips = [
-                "X.X.X.X",        
+                "X.X.X.X",
                 ]  # Добавьте сюда другие IP-адреса по мере необходимости
 
-# Проходим по всем устройствам из списка
-for device_ip in devices_ips:
+# Варианты access_profile в зависимости от ревизии и прошивки
+PROFILE_REV_B = "create access_profile  ethernet  vlan 0xFFF source_mac FF-FF-FF-FF-FF-00 destination_mac FF-FF-FF-FF-FF-00 ethernet_type  profile_id 20"
+PROFILE_REV_C = "create access_profile profile_id 20 ethernet vlan 0xFFF source_mac FF-FF-FF-FF-FF-00 destination_mac FF-FF-FF-FF-FF-00 ethernet_type"
+PROFILE_NO_VLAN_MASK = "create access_profile  ethernet  vlan source_mac FF-FF-FF-FF-FF-00 destination_mac FF-FF-FF-FF-FF-00 ethernet_type  profile_id 20"
+
+# Предельное время выполнения одной команды access_profile, сек. Обычно коммутатор отвечает быстрее.
+COMMAND_TIMEOUT = 20
+
+
+def parse_traffic_segmentation(output):
+    # Парсим вывод: предполагаем tab-separated таблицу с заголовком в первой строке
+    lines = output.strip().split('\n')
+    port_numbers = PortSet()
+    if len(lines) > 1:  # Есть данные после заголовка
+        for line in lines[9:]:  # Пропускаем заголовок
+            columns = line.split()  # Разделяем по пробелам
+            if columns and columns[0].isdigit():  # Первый столбец - номер порта
+                port_numbers.add(columns[0])
+        print(f"Номера портов из traffic_segmentation: {port_numbers}")
+    else:
+        print("Нет данных для парсинга в 'show traffic_segmentation'.")
+    return port_numbers
+
+
+def parse_mgmt_vlans(output_vlan):
+    # Парсим вывод: ищем четырехзначные VLAN ID, начинающиеся на 4
+    lines_vlan = output_vlan.strip().split('\n')
+    vlan_ids = []
+    for line in lines_vlan[1:]:  # Пропускаем заголовок, если есть
+        columns = line.split()  # Разделяем по пробелам
+        if len(columns) > 2:
+            # VLAN ID - третий столбец строки "VID : 4001 VLAN Name : ..."
+            possible_vlan = columns[2]
+            if len(possible_vlan) == 4 and possible_vlan.startswith('4') and possible_vlan.isdigit():
+                vlan_ids.append(possible_vlan)
+    return vlan_ids
+
+
+def parse_tagged_ports(output_conf):
+    # Порты/диапазоны после "add tagged" ("25-28", "1,3-5") разбираются сразу в битовое множество
+    tag_ports = PortSet()
+    lines_conf = output_conf.strip().split('\n')
+    for line in lines_conf:
+        if 'add tagged' in line.lower():
+            parts = line.lower().split('add tagged')
+            if len(parts) > 1:
+                tag_ports.update(PortSet.parse(parts[1]))
+    return tag_ports
+
+
+def pick_uplink(port_counts):
+    """UPLINK - наиболее встречаемый порт; при равенстве частот выбирается наименьший порт."""
+    uplink_port = None
+    max_count = 0
+    for port in sorted(port_counts.keys(), key=int):  # Сортировка по портам как числа (чтобы при равенстве взять меньший)
+        if port_counts[port] > max_count:
+            max_count = port_counts[port]
+            uplink_port = port
+    return {'uplink_port': uplink_port or 'Не определён', 'max_count': max_count, 'ports': PortSet(port_counts)}
+
+
+def find_uplinks(output_fdb, vlan_ids):
+    """UPLINK для каждого VLAN из vlan_ids по одному полному выводу 'show fdb'.
+
+    Вывод приходит целиком (send_command) и разбирается за один проход; вместо списков MAC
+    по каждому VLAN копятся только счётчики порт -> число MAC для нужных VLAN
+    (CPU и прочие не-цифровые значения в столбце Port игнорируются).
+    Возвращает {vlan_id: {'uplink_port': str, 'max_count': int, 'ports': PortSet}}.
+    """
+    port_counts = {vlan_id: defaultdict(int) for vlan_id in vlan_ids}
+    # Таблица (VID VLAN Name MAC Port Type); Name без пробелов, как в примере, поэтому Port - четвёртый столбец
+    lines_fdb = output_fdb.strip().split('\n')
+    for line in lines_fdb[1:]:  # Пропускаем заголовок
+        columns_fdb = line.split(None, 4)
+        if len(columns_fdb) >= 4 and columns_fdb[0] in port_counts and columns_fdb[3].isdigit():
+            port_counts[columns_fdb[0]][columns_fdb[3]] += 1
+    return {vlan_id: pick_uplink(counts) for vlan_id, counts in port_counts.items()}
+
+
+def select_access_profile(output_access):
+    # Проверяем вывод: если в какой-либо строке содержится "vlan 0xFFF", то выбрать "access_profile_vlan 0xFFF"
+    # Иначе выбрать "access_profile_vlan"
+    selected_access_profile = PROFILE_REV_B  # По умолчанию
+    if "create access_profile  ethernet  vlan 0xFFF source_mac" in output_access:
+        selected_access_profile = PROFILE_REV_B
+    elif "create access_profile profile_id" in output_access:
+        selected_access_profile = PROFILE_REV_C
+    elif "create access_profile  ethernet  vlan source_mac" in output_access:
+        selected_access_profile = PROFILE_NO_VLAN_MASK
+    elif "No filter matched result!" in output_access:
+        selected_access_profile = PROFILE_REV_B
+    elif "No filter matched." in output_access:
+        selected_access_profile = PROFILE_REV_C
+    return selected_access_profile
+
+
+def send_acl_rule(connection, result, command):
+    # Ждём приглашение коммутатора вместо фиксированной паузы
+    output = send_and_wait(connection, command, COMMAND_TIMEOUT)
+    print(f"\nКоманда '{command}' выполнена. Вывод:")
+    print(output)
+    if command_failed(output):
+        print("  Коммутатор отклонил команду")
+        result['failed_commands'].append(command)
+    return output
+
+
+def process_device(device_ip, username, password, port=22, journal=None, timings=None, admission=None, site=None,
+                   config_cache=None, capabilities=None, firmware=None):
+    """Полная обработка одного коммутатора: порты, VLAN, uplink, замена access_profile, save.
+
+    С capabilities вариант access_profile сохраняется после успешной настройки и при следующих запусках заменяет
+    пробу коммутатора. firmware - прошивка из списка устройств; без неё ревизия и прошивка берутся из 'show switch',
+    и только если проба действительно нужна. Возвращает словарь с результатом: success, error и всё, что найдено на устройстве.
+    """
     print(f"\n{'='*60}")
     print(f"Начинаем работу с устройством {device_ip}")
     print(f"{'='*60}")
-    
-# Укажите параметры подключения
+    if journal:
+        journal.record(device_ip, IN_PROGRESS)
+    timings = timings or DeviceTimings(device_ip)
+    config_cache = config_cache or ConfigCache()
+    result = {
+        'ip': device_ip,
+        'success': False,
+        'error': None,
+        'access_ports': PortSet(),
+        'tag_ports': PortSet(),
+        'vlan_mgmt': [],
+        'uplink_ports': {},
+        'access_profile': None,
+        'failed_commands': [],
+        'hardware': None,
+        'firmware': firmware,
+    }
+    # Ждём своей очереди на вход: ограничение темпа подключений и сессий на площадку
+    ticket = admission.acquire(device_ip, site) if admission else None
+
+    # Параметры подключения
     device = {
         'device_type': 'dlink_ds',  # Используем поддержку D-Link DES series в netmiko; если не подходит, попробуйте 'generic'
-        'ip': device_ip,        # Замените на IP-адрес вашего устройства
-        'username': 'XXXXXX',        # Замените на ваше имя пользователя
-        'password': 'YYYYYY',     # Замените на ваш пароль
-        #'secret': 'enable_secret'  # Замените на enable-пароль, если требуется enable
+        'ip': device_ip,
+        'port': port,
+        'username': username,
+        'password': password,
     }
 
+    connection = None
     try:
         # Подключаемся к устройству
-        connection = netmiko.ConnectHandler(**device)
+        with timings.measure('connect'), ticket.login() if ticket else nullcontext():
+            connection = netmiko.ConnectHandler(**device)
+        connection = InstrumentedConnection(connection, timings)
         print("Подключение установлено.")
 
         # Отправляем команду show traffic_segmentation
         output = connection.send_command('show traffic_segmentation')
         print("Команда 'show traffic_segmentation' выполнена. Вывод:")
         print(output)
-
-        # Парсим вывод: предполагаем tab-separated таблицу с заголовком в первой строке
-        lines = output.strip().split('\n')
-        if len(lines) > 1:  # Есть данные после заголовка
-            port_numbers = []
-            for line in lines[9:]:  # Пропускаем заголовок
-                columns = line.split()  # Разделяем по пробелам
-                if columns:  # Если есть столбцы
-                    port_numbers.append(columns[0])  # Первый столбец - номер порта
-            print(f"Номера портов из traffic_segmentation: {','.join(port_numbers)}")
-        else:
-            print("Нет данных для парсинга в 'show traffic_segmentation'.")
+        port_numbers = parse_traffic_segmentation(output)
 
         # Отправляем команду show vlan
         output_vlan = connection.send_command('show vlan')
         print("\nКоманда 'show vlan' выполнена. Вывод:")
         print(output_vlan)
 
-        # Парсим вывод: ищем четырехзначные VLAN ID, начинающиеся на 4
-        lines_vlan = output_vlan.strip().split('\n')
-        vlan_ids = []
-        for line in lines_vlan[1:]:  # Пропускаем заголовок, если есть
-            columns = line.split()  # Разделяем по пробелам
-            if len(columns) > 0:
-                # Предполагаем, что VLAN ID в первом столбце; если нет, настройте индекс
-                possible_vlan = columns[2]
-                if len(possible_vlan) == 4 and possible_vlan.startswith('4') and possible_vlan.isdigit():
-                    vlan_ids.append(possible_vlan)
-        
         # Записываем найденные VLAN ID в переменную vlan_mgmt
-        vlan_mgmt = vlan_ids
+        vlan_mgmt = parse_mgmt_vlans(output_vlan)
+        result['vlan_mgmt'] = vlan_mgmt
         print("Найденные четырехзначные VLAN ID, начинающиеся на 4:")
         print(vlan_mgmt)
 
-        # Если vlan_mgmt не пуст, отправляем команду show conf cur inc для каждого VLAN
-        tag_ports = []  # Переменная для хранения портов после "tagged"
+        # Конфигурация читается с коммутатора один раз, запросы include выполняются по снимку
+        snapshot = config_cache.get(connection, device_ip)
+
+        # Если vlan_mgmt не пуст, ищем в конфигурации "config vlan ... add tag" для каждого VLAN
+        tag_ports = PortSet()  # Порты после "tagged"
         if vlan_mgmt:
             for vlan_id in vlan_mgmt:
-                command = f'show config current include "config vlan {vlan_id} add tag"'
-                output_conf = connection.send_command(command)
-                print(f"\nКоманда '{command}' выполнена для VLAN {vlan_id}. Вывод:")
+                pattern = f'config vlan {vlan_id} add tag'
+                output_conf = snapshot.show_include(connection, pattern)
+                print(f"\nПоиск '{pattern}' в конфигурации для VLAN {vlan_id}. Вывод:")
                 print(output_conf)
-                
-                # Изменённый парсинг: используем регулярные выражения для извлечения портов/диапазонов после "add tagged"
-                lines_conf = output_conf.strip().split('\n')
-                for line in lines_conf:
-                    if 'add tagged' in line.lower():
-                        parts = line.lower().split('add tagged')
-                        if len(parts) > 1:
-                            ports_str = parts[1].strip()
-                            # Используем regexp для поиска одиночных портов (\d+) и диапазонов (\d+-\d+)
-                            found_ports = re.findall(r'\b(\d+(?:-\d+)?)\b', ports_str)
-                            for port_range in found_ports:
-                                if '-' in port_range:
-                                    # Обработка диапазона, например "25-28" -> 25,26,27,28
-                                    try:
-                                        start, end = map(int, port_range.split('-'))
-                                        port_list = [str(i) for i in range(start, end + 1)]
-                                        tag_ports.extend(port_list)
-                                    except ValueError:
-                                        pass  # Пропустить, если диапазон некорректен
-                                else:
-                                    # Одиночный порт
-                                    tag_ports.append(port_range)
-            print(f"\nСобранные tag_ports (downlink-порты): {','.join(tag_ports)}")
+                tag_ports.update(parse_tagged_ports(output_conf))
+            print(f"\nСобранные tag_ports (downlink-порты): {tag_ports}")
         else:
             print("\nНет подходящих VLAN ID для выполнения команды.")
+        result['tag_ports'] = tag_ports
 
-        # Создаем переменную access_ports: порты из traffic_segmentation за вычетом tag_ports (без повторений)
-        if port_numbers and tag_ports:
-            access_ports = [port for port in port_numbers if port not in tag_ports]
-            print(f"\naccess_ports (порты из traffic_segmentation, исключая tag_ports): {','.join(access_ports)}")
+        # Создаем переменную access_ports: порты из traffic_segmentation за вычетом tag_ports
+        access_ports = port_numbers - tag_ports
+        if tag_ports:
+            print(f"\naccess_ports (порты из traffic_segmentation, исключая tag_ports): {access_ports}")
         else:
-            access_ports = port_numbers if port_numbers else []
-            print(f"\naccess_ports (нет tag_ports для исключения): {','.join(access_ports)}")
+            print(f"\naccess_ports (нет tag_ports для исключения): {access_ports}")
+        result['access_ports'] = access_ports
 
-        # Дополнительно: для каждого VLAN в vlan_mgmt выполняем "show fdb vlan {vlan_id}" и определяем UPLINK как наиболее встречаемый номер порта в столбце Port (игнорируя CPU и прочие не-дигитовые значения; при равенстве частот выбираем наименьший порт)
-        uplink_ports = {}  # Словарь для хранения: ключ - vlan_id, значение - {'uplink_port': str, 'max_count': int, 'all_ports': list}
+        # Дополнительно: для каждого VLAN в vlan_mgmt выполняем "show fdb vlan {vlan_id}" и определяем UPLINK
+        uplink_ports = {}  # Словарь для хранения: ключ - vlan_id, значение - {'uplink_port': str, 'max_count': int, 'ports': PortSet}
         if vlan_mgmt:
+            # Одна выборка всей таблицы вместо "show fdb vlan N" на каждый VLAN
+            output_fdb = connection.send_command('show fdb')
+            print("\nКоманда 'show fdb' выполнена.")
+            uplink_ports = find_uplinks(output_fdb, vlan_mgmt)
             for vlan_id in vlan_mgmt:
-                command_fdb = f'show fdb vlan {vlan_id}'
-                output_fdb = connection.send_command(command_fdb)
-                print(f"\nКоманда '{command_fdb}' выполнена для VLAN {vlan_id}. Вывод:")
-                print(output_fdb)
-                
-                # Парсим вывод: таблица (VID VLAN Name MAC Port Type); используем split() для строк данных (предполагаем, что Name без пробелов, как в примере)
-                lines_fdb = output_fdb.strip().split('\n')
-                port_counts = defaultdict(int)  # Счётчик частот портов
-                all_ports = []
-                if len(lines_fdb) > 1:  # Есть данные после заголовка
-                    for line in lines_fdb[1:]:
-                        columns_fdb = line.split()
-                        if len(columns_fdb) >= 4:  # Ожидаем минимум 4 столбца (VID, Name, MAC, Port, Тип)
-                            try:
-                                port = columns_fdb[3]  # Столбец Port
-                                if port.isdigit():  # Игнорируем CPU и другие не-дигитовые
-                                    port_counts[port] += 1
-                                    all_ports.append(port)
-                            except IndexError:
-                                pass  # Пропустить строку, если формат не совпадает
-                
-                # Определяем UPLINK: порт с максимальным количеством вхождений
-                uplink_port = None
-                max_count = 0
-                for port in sorted(port_counts.keys(), key=int):  # Сортировка по портам как числа (чтобы при равенстве взять меньший)
-                    if port_counts[port] > max_count:
-                        max_count = port_counts[port]
-                        uplink_port = port
-                
-                # Сохраняем результат
-                if uplink_port:
-                    uplink_ports[vlan_id] = {
-                        'uplink_port': uplink_port,
-                        'max_count': max_count,
-                        'all_ports': all_ports
-                    }
-                    print(f"Для VLAN {vlan_id} определён UPLINK-порт: {uplink_port} (частота: {max_count})")
+                if uplink_ports[vlan_id]['max_count']:
+                    print(f"Для VLAN {vlan_id} определён UPLINK-порт: {uplink_ports[vlan_id]['uplink_port']} "
+                          f"(частота: {uplink_ports[vlan_id]['max_count']})")
                 else:
-                    uplink_ports[vlan_id] = {
-                        'uplink_port': 'Не определён',
-                        'max_count': 0,
-                        'all_ports': all_ports
-                    }
                     print(f"Для VLAN {vlan_id} UPLINK-порт не определён (нет цифровых портов в FDB).")
-            
+
             print(f"\nИтоговые UPLINK-порты: {uplink_ports}")
         else:
             print("\nНет VLAN ID для анализа FDB.")
+        result['uplink_ports'] = uplink_ports
 
-        # Новый шаг: вводим команду "show config current include "create access_profile""
-        command_access = 'show config current include "create access_profile"'
-        output_access = connection.send_command(command_access)
-        print(f"\nКоманда '{command_access}' выполнена. Вывод:")
+        # Новый шаг: ищем "create access_profile" в конфигурации. Если профилей нет, спрашиваем коммутатор:
+        # текст "No filter matched..." отличает ревизию B от C. Вариант, уже известный для этой прошивки, не переспрашиваем
+        output_access = snapshot.show_include(connection, 'create access_profile')
+        known_profile = None
+        if not output_access and capabilities is not None:
+            if not result['firmware']:
+                # Прошивки нет в списке устройств: 'show switch' короче пробы по всей конфигурации
+                result['hardware'], result['firmware'] = parse_dlink_identity(connection.send_command('show switch'))
+                print(f"Аппаратная ревизия: {result['hardware'] or 'не определена'}, "
+                      f"прошивка: {result['firmware'] or 'не определена'}")
+            # Сохранённому варианту доверяем только при известной прошивке: после обновления он определится заново
+            known = None
+            if result['firmware']:
+                known = capabilities.get(device_ip, hardware=result['hardware'], firmware=result['firmware'])
+            known_profile = known.get('access_profile') if known else None
+        if not output_access and not known_profile:
+            output_access = snapshot.show_include(connection, 'create access_profile', live_fallback=True)
+        print("\nПоиск 'create access_profile' в конфигурации. Вывод:")
         print(output_access)
 
-        # Проверяем вывод: если в какой-либо строке содержится "vlan 0xFFF", то выбрать "access_profile_vlan 0xFFF"
-        # Иначе выбрать "access_profile_vlan"
-        selected_access_profile = "create access_profile  ethernet  vlan 0xFFF source_mac FF-FF-FF-FF-FF-00 destination_mac FF-FF-FF-FF-FF-00 ethernet_type  profile_id 20"  # По умолчанию
-        if "create access_profile  ethernet  vlan 0xFFF source_mac" in output_access:
-            selected_access_profile = f'create access_profile  ethernet  vlan 0xFFF source_mac FF-FF-FF-FF-FF-00 destination_mac FF-FF-FF-FF-FF-00 ethernet_type  profile_id 20'
-        elif "create access_profile profile_id" in output_access:
-            selected_access_profile = "create access_profile profile_id 20 ethernet vlan 0xFFF source_mac FF-FF-FF-FF-FF-00 destination_mac FF-FF-FF-FF-FF-00 ethernet_type"
-        elif "create access_profile  ethernet  vlan source_mac" in output_access:
-            selected_access_profile = "create access_profile  ethernet  vlan source_mac FF-FF-FF-FF-FF-00 destination_mac FF-FF-FF-FF-FF-00 ethernet_type  profile_id 20"                  
-        elif "No filter matched result!" in output_access:
-            selected_access_profile = "create access_profile  ethernet  vlan 0xFFF source_mac FF-FF-FF-FF-FF-00 destination_mac FF-FF-FF-FF-FF-00 ethernet_type  profile_id 20"
-        elif "No filter matched." in output_access:
-            selected_access_profile = "create access_profile profile_id 20 ethernet vlan 0xFFF source_mac FF-FF-FF-FF-FF-00 destination_mac FF-FF-FF-FF-FF-00 ethernet_type"                              
+        if output_access or not known_profile:
+            selected_access_profile = select_access_profile(output_access)
+        else:
+            selected_access_profile = known_profile
+            print("Вариант access_profile взят из сохранённых данных об устройстве")
+        result['access_profile'] = selected_access_profile
         print(f"\nВыбранный access_profile: {selected_access_profile}")
 
+        # Дальше конфигурация меняется: если запуск прервётся, устаревший снимок не должен остаться в кэше
+        config_cache.invalidate(device_ip)
+
         command_addvlan1530 = 'create vlan xxxx tag 1530'
         output_addvlan1530 = connection.send_command(command_addvlan1530)
         print(f"\nКоманда '{command_addvlan1530}' выполнена. Вывод:")
@@ -195,9 +279,9 @@ for device_ip in devices_ips:
         print(f"\nКоманда '{command_acl}' выполнена. Вывод:")
 
         try:
-            result = connection.send_command(selected_access_profile)
+            output_profile = connection.send_command(selected_access_profile)
             print(f"Команда '{selected_access_profile}' отправлена. Результат:")
-            print(result)
+            print(output_profile)
         except Exception as e:
             print(f"Ошибка при отправке команды: {e}")
 
@@ -206,58 +290,150 @@ for device_ip in devices_ips:
             print(f"\nКоманда '{command_access}' выполнена. Вывод:")
             print(output_access)
 
-        if "create access_profile  ethernet  vlan 0xFFF source_mac FF-FF-FF-FF-FF-00 destination_mac FF-FF-FF-FF-FF-00 ethernet_type  profile_id 20" in output_access:
-            print("\nОбнаружен profile_id 20. Загружаем дополнительные команды...")
-
-            command_access1 = f'config access_profile profile_id 20  add access_id 1  ethernet  vlan xxxx source_mac 00-12-00-00-00-00 mask FF-FF-FF-FF-FF-00 destination_mac 00-00-00-00-00-00 mask 00-00-00-00-00-00  port  {','.join(access_ports)} deny'
-            output_access1 = connection.send_command_timing(command_access1)
-            time.sleep(2)
-            print(f"\nКоманда '{command_access1}' выполнена. Вывод:")
-            print(output_access1)
-        
-            command_access2 = f'config access_profile profile_id 20  add access_id 2  ethernet  vlan yyyy source_mac 00-12-00-00-00-00 mask FF-FF-FF-FF-FF-00 destination_mac 00-00-00-00-00-00 mask 00-00-00-00-00-00  port  {','.join(access_ports)} deny'
-            output_access2 = connection.send_command_timing(command_access2)
-            time.sleep(2)
-            print(f"\nКоманда '{command_access2}' выполнена. Вывод:")
-            print(output_access2)
-        
-            command_access3 = f'config access_profile profile_id 20  add access_id 3  ethernet  vlan xxxx source_mac 00-00-00-00-00-00 mask 00-00-00-00-00-00 destination_mac FF-FF-FF-FF-FF-FF ethernet_type 0x8863    port {','.join(access_ports)} permit'
-            output_access3 = connection.send_command_timing(command_access3)
-            time.sleep(2)
-            print(f"\nКоманда '{command_access3}' выполнена. Вывод:")
-            print(output_access3)
-        
-            .............................
+        ports = access_ports.format()  # Диапазонами: '1-24' вместо '1,2,...,24'
+        # Правила выбираются по созданному профилю: вывод include пуст, если профилей не было или вариант
+        # взят из сохранённых данных. Профиль уже создан выше, повторный create коммутатор отклонил бы
+        if selected_access_profile != PROFILE_REV_C:
+            print("\nСоздан profile_id 20 ревизии B. Загружаем дополнительные команды...")
+
+            send_acl_rule(connection, result, f'config access_profile profile_id 20  add access_id 1  ethernet  vlan xxxx source_mac 00-12-00-00-00-00 mask FF-FF-FF-FF-FF-00 destination_mac 00-00-00-00-00-00 mask 00-00-00-00-00-00  port  {ports} deny')
+            send_acl_rule(connection, result, f'config access_profile profile_id 20  add access_id 2  ethernet  vlan yyyy source_mac 00-12-00-00-00-00 mask FF-FF-FF-FF-FF-00 destination_mac 00-00-00-00-00-00 mask 00-00-00-00-00-00  port  {ports} deny')
+            send_acl_rule(connection, result, f'config access_profile profile_id 20  add access_id 3  ethernet  vlan xxxx source_mac 00-00-00-00-00-00 mask 00-00-00-00-00-00 destination_mac FF-FF-FF-FF-FF-FF ethernet_type 0x8863    port {ports} permit')
+            # Остальные правила profile_id 20 добавляются по тому же образцу
 
         else:
-           
             #rev.C
-            command_accessrevC201 = f'create access_profile profile_id 20 ethernet vlan 0xFFF source_mac FF-FF-FF-FF-FF-00 destination_mac FF-FF-FF-FF-FF-00 ethernet_type'
-            output_accessrevC201 = connection.send_command_timing(command_accessrevC201)
-            time.sleep(2)
-            print(f"\nКоманда '{command_accessrevC201}' выполнена. Вывод:")
-            print(command_accessrevC201)
-
-            command_accessrevC202 = f'config access_profile profile_id 20  add access_id 1  ethernet vlan_id 1530 source_mac 00-12-00-00-00-00 mask FF-FF-FF-FF-FF-00 destination_mac 00-00-00-00-00-00 mask 00-00-00-00-00-00 port {','.join(access_ports)} deny'
-            output_accessrevC202 = connection.send_command_timing(command_accessrevC202)
-            time.sleep(2)
-            print(f"\nКоманда '{command_accessrevC202}' выполнена. Вывод:")
-            print(output_accessrevC202)
-
-            command_accessrevC203 = f'config access_profile profile_id 20  add access_id 2  ethernet vlan_id 1531 source_mac 00-12-00-00-00-00 mask FF-FF-FF-FF-FF-00 destination_mac 00-00-00-00-00-00 mask 00-00-00-00-00-00 port {','.join(access_ports)} deny'
-            output_accessrevC203 = connection.send_command_timing(command_accessrevC203)
-            time.sleep(2)
-            print(f"\nКоманда '{command_accessrevC203}' выполнена. Вывод:")
-            print(output_accessrevC203)
+            send_acl_rule(connection, result, f'config access_profile profile_id 20  add access_id 1  ethernet vlan_id 1530 source_mac 00-12-00-00-00-00 mask FF-FF-FF-FF-FF-00 destination_mac 00-00-00-00-00-00 mask 00-00-00-00-00-00 port {ports} deny')
+            send_acl_rule(connection, result, f'config access_profile profile_id 20  add access_id 2  ethernet vlan_id 1531 source_mac 00-12-00-00-00-00 mask FF-FF-FF-FF-FF-00 destination_mac 00-00-00-00-00-00 mask 00-00-00-00-00-00 port {ports} deny')
+
+        # Отклонённое правило - недонастроенный коммутатор: не сохраняем и считаем устройство упавшим
+        if result['failed_commands']:
+            raise ValueError(f"коммутатор отклонил команд access_profile: {len(result['failed_commands'])}, конфигурация не сохранена")
 
         command_save = 'save'
         output_save = connection.send_command(command_save)
         print(f"\nКоманда '{command_save}' выполнена. Вывод:")
-
+        # Снимок сохранённой конфигурации для следующих запусков в пределах --config-ttl
+        config_cache.refresh(connection, device_ip)
+        result['success'] = True
+        if capabilities is not None and result['firmware']:
+            capabilities.update(device_ip, hardware=result['hardware'], firmware=result['firmware'],
+                                dialect='dlink_ds', access_profile=selected_access_profile)
+        if journal:
+            journal.record(device_ip, DONE)
 
     except Exception as e:
-            print(f"Ошибка при отправке команды: {e}")
-
+        print(f"Ошибка при отправке команды: {e}")
+        result['error'] = str(e)
+        if journal:
+            journal.record(device_ip, FAILED, error=e)
+    finally:
         # Закрываем подключение
-    connection.disconnect()
-    print("Подключение закрыто.")
+        if connection is not None:
+            try:
+                connection.disconnect()
+                print("Подключение закрыто.")
+            except Exception as e:
+                print(f"Ошибка при закрытии подключения: {e}")
+        if ticket:
+            ticket.release()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Замена ACL на коммутаторах D-Link DES-32xx")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Сколько устройств обрабатывать одновременно (по умолчанию 1 - последовательно)")
+    parser.add_argument('--journal', default='dlink_acl_journal.jsonl',
+                        help="Файл журнала выполнения (по умолчанию dlink_acl_journal.jsonl)")
+    parser.add_argument('--resume', action='store_true',
+                        help="Продолжить прерванный запуск: только незавершённые и упавшие устройства из журнала")
+    parser.add_argument('--inventory',
+                        help="Файл со списком устройств (IP в строке или CSV со столбцами ip,model,firmware и необязательными port,site); '-' - stdin. "
+                             "Без него используется devices_ips")
+    parser.add_argument('--shard', help="Обработать только часть i из N списка, например 1/4")
+    parser.add_argument('--login-rate', type=float, default=10,
+                        help="Не больше стольких новых SSH-входов в секунду (по умолчанию 10), "
+                             "при медленных или неудачных входах темп снижается автоматически")
+    parser.add_argument('--login-burst', type=int, default=10, help="Допустимый всплеск входов (по умолчанию 10)")
+    parser.add_argument('--site-sessions', type=int, default=8,
+                        help="Не больше стольких одновременных сессий на площадку: столбец site или подсеть /24")
+    parser.add_argument('--metrics-json', help="Файл для замеров по устройствам (JSON-строка на устройство)")
+    parser.add_argument('--metrics-prom', help="Textfile для node_exporter с гистограммой длительности этапов")
+    parser.add_argument('--config-cache',
+                        help="Каталог для снимков 'show config current' по устройствам (по умолчанию не сохраняются)")
+    parser.add_argument('--config-ttl', type=float, default=900,
+                        help="Сколько секунд снимок из --config-cache считается актуальным (по умолчанию 900)")
+    parser.add_argument('--capabilities', default='device_capabilities.json',
+                        help="Файл с определёнными ранее вариантами access_profile по устройствам, ревизиям и прошивкам")
+    parser.add_argument('--username', help="Имя пользователя (обязательно, если список устройств читается из stdin)")
+    args = parser.parse_args()
+    workers = max(1, args.workers)
+
+    if args.inventory == '-' and not args.username:
+        print("⚠ ОШИБКА: при чтении списка из stdin укажите --username")
+        return
+
+    # Устройства читаются из файла по мере обработки, а не загружаются заранее
+    devices = iter_inventory(args.inventory) if args.inventory else devices_from_list(devices_ips)
+    if args.shard:
+        try:
+            shard_index, shard_count = parse_shard(args.shard)
+        except ValueError as e:
+            print(f"⚠ ОШИБКА: {e}")
+            return
+        devices = select_shard(devices, shard_index, shard_count)
+        print(f"Обрабатывается часть {shard_index} из {shard_count}")
+    if args.resume:
+        devices = unfinished(devices, args.journal)
+        print(f"Продолжение по журналу {args.journal}: пропускаются уже обработанные устройства")
+
+    username = args.username or input("Имя пользователя: ")
+    password = getpass.getpass("Пароль: ")
+
+    print(f"\n{'#' * 60}")
+    print(f"Начало обработки: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    if workers > 1:
+        print(f"Одновременно обрабатываемых устройств: {workers}")
+    print(f"{'#' * 60}")
+
+    admission = AdmissionController(args.login_rate, args.login_burst, args.site_sessions)
+    config_cache = ConfigCache(args.config_cache, args.config_ttl)
+
+    def process_next(i, device_record):
+        ip = device_record['ip']
+        timings = metrics.device(ip, model=device_record['model'], firmware=device_record['firmware'])
+        result = process_device(ip, username, password, int(device_record.get('port') or 22),
+                                journal, timings, admission, device_record.get('site'), config_cache, capabilities,
+                                device_record['firmware'])
+        metrics.finish(timings, result['success'])
+        return result
+
+    with RunJournal(args.journal) as journal, MetricsRecorder('dlink_acl', args.metrics_json, args.metrics_prom) as metrics, \
+            CapabilityStore(args.capabilities) as capabilities:
+        fleet_results = run_fleet(journal.track(devices), process_next, workers)
+    results = [result or {'ip': device['ip'], 'success': False, 'error': 'необработанная ошибка'}
+               for device, result in fleet_results]
+    failed = [result for result in results if not result['success']]
+
+    print(f"\n\n{'#' * 60}")
+    print("ИТОГОВЫЙ ОТЧЕТ")
+    print(f"{'#' * 60}")
+    print(f"\nВсего обработано устройств: {len(results)}")
+    print(f"Успешно: {len(results) - len(failed)}")
+    print(f"С ошибками: {len(failed)}")
+    if failed:
+        print(f"\n{'!' * 60}")
+        print("УСТРОЙСТВА С ОШИБКАМИ:")
+        print(f"{'!' * 60}")
+        for result in failed:
+            print(f" {result['ip']}: {result['error']}")
+    rejected = [result for result in results if result.get('failed_commands')]
+    if rejected:
+        print(f"\nКоммутаторы, отклонившие команды access_profile: {len(rejected)}")
+        for result in rejected:
+            print(f" {result['ip']}: {len(result['failed_commands'])} команд")
+
+
+if __name__ == "__main__":
+    main()
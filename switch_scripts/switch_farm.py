@@ -0,0 +1,687 @@
+import argparse
+import asyncio
+import csv
+import ipaddress
+import random
+import re
+import sys
+from abc import ABC, abstractmethod
+
+import asyncssh
+
+from script_for_automatic_ACL_configuration_on_snr_5210 import NEW_ACLS
+
+# Ферма эмулированных коммутаторов для нагрузочных и регрессионных прогонов без реального оборудования.
+# Каждое устройство - отдельный SSH-сервер на своём адресе 127.x.y.z (в Linux вся сеть 127.0.0.0/8
+# локальная), поэтому сотни устройств поднимаются в одном процессе на одном порту.
+# Состояние (ACL, VLAN, access_profile) хранится в памяти и меняется командами конфигурации.
+
+# Модель -> (класс CLI, тип устройства для netmiko, варианты прошивки)
+PROFILES = {}
+
+# ACL, которые стояли на SNR до замены
+LEGACY_ACLS = [
+    'access-list 100 10 deny mac 0012.0000.0000 0000.0000.00FF any',
+    'access-list 150 10 permit mac any any 0x8863',
+]
+
+MAC_PREFIXES = ('00-1A-2B', '00-0E-C6', 'F4-8E-38', '00-12-34')
+
+
+def profile(name, device_type, firmwares):
+    def register(cls):
+        PROFILES[name] = (cls, device_type, firmwares)
+        cls.profile = name
+        return cls
+    return register
+
+
+def random_mac(rng, style='dash'):
+    raw = f"{rng.choice(MAC_PREFIXES).replace('-', '')}{rng.getrandbits(24):06X}"
+    if style == 'dot':
+        return f"{raw[0:4]}.{raw[4:8]}.{raw[8:12]}".lower()
+    return '-'.join(raw[i:i + 2] for i in range(0, 12, 2))
+
+
+def apply_filters(output, filters):
+    """Фильтры вывода "| include A|B" и "| exclude X" - регулярные выражения, как на Cisco."""
+    lines = output.split('\n')
+    for kind, pattern in filters:
+        regex = re.compile(pattern)
+        lines = [line for line in lines if bool(regex.search(line)) == (kind == 'include')]
+    return '\n'.join(lines)
+
+
+class EmulatedSwitch(ABC):
+    """Общая часть: приглашение, режимы сессии, сокращения команд, разбор '|'.
+
+    Модель коммутатора задаёт prompt() и handle(); без них класс не создаётся.
+    """
+
+    profile = None
+    # Ключевые слова, которые можно сокращать до однозначного префикса: sh run int -> show running-config interface
+    KEYWORDS = ()
+    has_enable = True
+
+    def __init__(self, ip, firmware, seed):
+        self.ip = ip
+        self.firmware = firmware
+        self.rng = random.Random(seed)
+        self.saved = True
+
+    def new_session(self):
+        return {'mode': 'user' if self.has_enable else 'enable', 'context': None, 'expect_secret': False}
+
+    @abstractmethod
+    def prompt(self, session):
+        """Приглашение CLI для текущего режима сессии."""
+
+    def canonical(self, command):
+        words = []
+        for word in command.split():
+            if word not in self.KEYWORDS:
+                matches = [keyword for keyword in self.KEYWORDS if keyword.startswith(word)]
+                if len(matches) == 1:
+                    word = matches[0]
+            words.append(word)
+        return ' '.join(words)
+
+    @abstractmethod
+    def handle(self, session, line):
+        """Выполняет строку и возвращает вывод (без приглашения)."""
+
+    def split_pipes(self, line):
+        command, *pipes = line.split('|')
+        filters = []
+        for pipe in pipes:
+            kind, _, pattern = pipe.strip().partition(' ')
+            kind = 'exclude' if kind.startswith('ex') else 'include'
+            # "| include mac|ge|xe": альтернативы после первого '|' относятся к тому же фильтру
+            if filters and not pipe.strip().startswith(('in', 'ex')):
+                filters[-1] = (filters[-1][0], filters[-1][1] + '|' + pipe.strip())
+                continue
+            filters.append((kind, pattern.strip()))
+        return command.strip(), filters
+
+
+class CiscoLikeSwitch(EmulatedSwitch):
+    """CLI в стиле Cisco: user/enable/config/interface, "% Invalid input" на неизвестные команды."""
+
+    KEYWORDS = ('show', 'running-config', 'interface', 'configure', 'terminal', 'access-list', 'access-lists',
+                'address-table', 'brief', 'version', 'write', 'memory', 'enable', 'exit', 'end', 'length',
+                'width', 'status', 'port', 'port-channel', 'include', 'exclude', 'description')
+    hostname_prefix = 'SW'
+    port_names = ()
+
+    def __init__(self, ip, firmware, seed):
+        super().__init__(ip, firmware, seed)
+        self.hostname = f"{self.hostname_prefix}-{ip.replace('.', '-')}"
+        self.ports = {}
+        for name in self.port_names:
+            uplink = name.startswith(('xe', 'Te'))
+            self.ports[name] = {
+                'description': '' if uplink else f"kv{self.rng.randint(1, 300)}",
+                'vlan': 1 if uplink else self.rng.choice((3105, 3210, 3377, 3499, 1)),
+                'mode': 'trunk' if uplink else 'access',
+                'up': uplink or self.rng.random() < 0.6,
+                'macs': [random_mac(self.rng, 'dot') for _ in range(self.rng.choice((0, 0, 1, 2)))],
+                'acls': [],
+                'shutdown': False,
+            }
+
+    def prompt(self, session):
+        mode = session['mode']
+        if mode == 'user':
+            return f"{self.hostname}>"
+        if mode == 'config':
+            return f"{self.hostname}(config)#"
+        if mode == 'interface':
+            return f"{self.hostname}(config-if)#"
+        return f"{self.hostname}#"
+
+    def handle(self, session, line):
+        command, filters = self.split_pipes(line)
+        command = self.canonical(command)
+        if not command:
+            return ''
+        mode = session['mode']
+        if command.startswith('terminal '):
+            return ''
+        if command == 'enable':
+            if mode == 'user':
+                session['expect_secret'] = True
+                return 'Password: '
+            return ''
+        if command == 'end':
+            if mode in ('config', 'interface'):
+                session['mode'] = 'enable'
+            return ''
+        if command == 'exit':
+            session['mode'] = {'interface': 'config', 'config': 'enable'}.get(mode, mode)
+            return ''
+        if command.startswith('show '):
+            if mode == 'user' and not command.startswith('show version'):
+                return self.invalid(command)
+            output = self.show(command[5:])
+            return self.invalid(command) if output is None else apply_filters(output, filters)
+        if command in ('write', 'write memory', 'copy running-config startup-config'):
+            if mode == 'user':
+                return self.invalid(command)
+            self.saved = True
+            return self.write_message()
+        if command == 'configure terminal' or command == 'configure':
+            if mode == 'user':
+                return self.invalid(command)
+            session['mode'] = 'config'
+            return ''
+        if mode in ('config', 'interface'):
+            output = self.configure(session, command)
+            if output is not None:
+                self.saved = False
+                return output
+        return self.invalid(command)
+
+    def invalid(self, command):
+        return f"% Invalid input detected at '^' marker.\n{' ' * len(self.hostname)}^"
+
+    def write_message(self):
+        return "Building configuration...\n[OK]"
+
+    def interface_context(self, session, command):
+        match = re.match(r'interface\s+(?:ethernet\s*)?(\S+)$', command, re.IGNORECASE)
+        if match and match.group(1) in self.ports:
+            session['mode'] = 'interface'
+            session['context'] = match.group(1)
+            return ''
+        return None
+
+    def configure(self, session, command):
+        output = self.interface_context(session, command)
+        if output is not None:
+            return output
+        if session['mode'] == 'interface':
+            port = self.ports[session['context']]
+            if command.startswith('description '):
+                port['description'] = command.split(' ', 1)[1]
+                return ''
+            if command in ('shutdown', 'no shutdown'):
+                port['shutdown'] = command == 'shutdown'
+                return ''
+            match = re.match(r'switchport access vlan (\d+)$', command)
+            if match:
+                port['vlan'] = int(match.group(1))
+                return ''
+        if re.match(r'vlan \d+(-\d+)?$', command):
+            return ''
+        return None
+
+    def show(self, command):
+        if command == 'version':
+            return self.version()
+        if command.startswith('running-config interface'):
+            names = command.split()[2:]
+            return self.running_interfaces(names[0] if names else None)
+        if command == 'running-config':
+            return self.running_interfaces(None)
+        if command in ('interface brief', 'interface status'):
+            return self.interface_brief()
+        match = re.match(r'mac(?:-| )address-table interface (\S+)$', command)
+        if match:
+            return self.mac_table(match.group(1))
+        return None
+
+    def version(self):
+        return f"Cisco IOS Software, C2960 Software (C2960-LANBASEK9-M), Version {self.firmware}\n{self.hostname} uptime is 12 weeks"
+
+    def running_interfaces(self, name):
+        lines = []
+        for port_name, port in self.ports.items():
+            if name and port_name != name:
+                continue
+            lines.append('!')
+            lines.append(f"interface {port_name}")
+            if port['description']:
+                lines.append(f" description {port['description']}")
+            if port['mode'] == 'trunk':
+                lines.append(" switchport mode trunk")
+            else:
+                lines.append(f" switchport access vlan {port['vlan']}")
+            for acl in port['acls']:
+                lines.append(f" {acl}")
+            if port['shutdown']:
+                lines.append(" shutdown")
+        return '\n'.join(lines + ['!'])
+
+    def interface_brief(self):
+        lines = [f"{'Port':<10} {'Name':<12} {'Status':<11} {'Vlan':<6} {'Duplex':<7} {'Speed':<7} Type"]
+        for port_name, port in self.ports.items():
+            status = 'disabled' if port['shutdown'] else ('up' if port['up'] else 'down')
+            vlan = 'trunk' if port['mode'] == 'trunk' else str(port['vlan'])
+            lines.append(f"{port_name:<10} {port['description'][:12]:<12} {status:<11} {vlan:<6} "
+                         f"{'a-full':<7} {'a-1000':<7} {port['mode']}")
+        return '\n'.join(lines)
+
+    def mac_table(self, name):
+        port = self.ports.get(name)
+        if port is None:
+            return None
+        lines = ['Vlan    Mac Address       Type        Ports', '----    -----------       --------    -----']
+        for mac in port['macs']:
+            lines.append(f"{port['vlan']:<8}{mac:<18}DYNAMIC     {name}")
+        lines.append(f"Total Mac Addresses for this criterion: {len(port['macs'])}")
+        return '\n'.join(lines)
+
+
+@profile('cisco', 'cisco_ios', ('15.0(2)SE11', '12.2(55)SE12'))
+class CiscoSwitch(CiscoLikeSwitch):
+    hostname_prefix = 'C2960'
+    port_names = tuple(f"Fa0/{i}" for i in range(1, 25)) + ('Gi0/1', 'Gi0/2')
+
+
+@profile('snr', 'cisco_ios', ('7.0.3.5(R0241.0136)', '7.2.1.2(R0001.0160)'))
+class SnrSwitch(CiscoLikeSwitch):
+    """SNR-S5210G: ACL 100/150/160 и их привязки к портам - то, что меняет скрипт настройки ACL."""
+
+    hostname_prefix = 'SNR'
+    port_names = tuple(f"ge{i}" for i in range(1, 25)) + tuple(f"xe{i}" for i in range(1, 5))
+    # Доля коммутаторов, на которых ACL уже совпадают с целевыми
+    compliant_share = 0.3
+
+    def __init__(self, ip, firmware, seed):
+        super().__init__(ip, firmware, seed)
+        self.acls = {}
+        compliant = self.rng.random() < self.compliant_share
+        for command in NEW_ACLS if compliant else LEGACY_ACLS:
+            self.add_acl_rule(command)
+        for port_name, port in self.ports.items():
+            if port['mode'] == 'access' and self.rng.random() < 0.5:
+                port['acls'] = ['mac access-group 100 in']
+
+    def add_acl_rule(self, command):
+        match = re.match(r'access-list (\d+) (\d+) (.+)$', command)
+        if match:
+            self.acls.setdefault(match.group(1), {})[int(match.group(2))] = match.group(3)
+            return True
+        return False
+
+    def version(self):
+        return (f"SNR-S5210G-24TX Device, Compiled on Mar 10 2021\n"
+                f"  SoftWare Version {self.firmware}\n  Device serial number SW{self.ip.replace('.', '')}")
+
+    def configure(self, session, command):
+        if session['mode'] == 'config' and command.startswith('access-list '):
+            return '' if self.add_acl_rule(command) else self.invalid(command)
+        match = re.match(r'no access-list (\d+)$', command)
+        if session['mode'] == 'config' and match:
+            self.acls.pop(match.group(1), None)
+            return ''
+        match = re.match(r'(no )?mac access-group (\d+) in$', command)
+        if session['mode'] == 'interface' and match:
+            acls = self.ports[session['context']]['acls']
+            acl = f"mac access-group {match.group(2)} in"
+            if match.group(1):
+                if acl in acls:
+                    acls.remove(acl)
+            elif acl not in acls:
+                acls.append(acl)
+            return ''
+        return super().configure(session, command)
+
+    def show(self, command):
+        if command == 'mac access-lists':
+            lines = []
+            for number in sorted(self.acls):
+                lines.append(f"mac access-list {number}")
+                for seq in sorted(self.acls[number]):
+                    lines.append(f"  {seq} {self.acls[number][seq]}")
+            return '\n'.join(lines)
+        return super().show(command)
+
+
+@profile('zyxel', 'cisco_ios', ('V4.50(AAHE.2)', 'V4.80(ABDR.1)'))
+class ZyxelSwitch(CiscoLikeSwitch):
+    """ZyXEL MES: порты - номера, настройка через vlan/forbidden и interface port-channel."""
+
+    hostname_prefix = 'MES3500'
+    port_names = tuple(str(i) for i in range(1, 29))
+
+    def version(self):
+        return f"ZyNOS F/W Version  : {self.firmware} | 07/15/2021\n Model: ZyXEL MES3500-24"
+
+    def configure(self, session, command):
+        match = re.match(r'interface port-channel (\S+)$', command)
+        if match and match.group(1) in self.ports:
+            session['mode'] = 'interface'
+            session['context'] = match.group(1)
+            return ''
+        if session['mode'] == 'interface' and session['context'] is None:
+            # Режим vlan: состав портов эмулятор не хранит
+            return '' if re.match(r'(fixed|forbidden|untagged) \S+$', command) else None
+        if session['mode'] == 'interface':
+            port = self.ports[session['context']]
+            if command == 'inactive':
+                port['shutdown'] = True
+                return ''
+            match = re.match(r'(pvid|name) (\S+)$', command)
+            if match:
+                if match.group(1) == 'pvid':
+                    port['vlan'] = int(match.group(2))
+                else:
+                    port['description'] = match.group(2)
+                return ''
+        if session['mode'] == 'config' and re.match(r'vlan \d+$', command):
+            session['mode'] = 'interface'
+            session['context'] = None
+            return ''
+        return super().configure(session, command)
+
+    def show(self, command):
+        match = re.match(r'interface config (\S+)$', command)
+        if match and match.group(1) in self.ports:
+            port = self.ports[match.group(1)]
+            return f"  Port No          :{match.group(1)}\n  Active          :{'No' if port['shutdown'] else 'Yes'}\n" \
+                   f"  Name            :{port['description']}\n  PVID            :{port['vlan']}"
+        match = re.match(r'interfaces (\S+)$', command)
+        if match and match.group(1) in self.ports:
+            port = self.ports[match.group(1)]
+            link = '1000M/F' if port['up'] else 'Down'
+            return f"  Port Info      Port NO.        :{match.group(1)}\n                 Link            :{link}"
+        match = re.match(r'mac address-table port (\S+)$', command)
+        if match and match.group(1) in self.ports:
+            port = self.ports[match.group(1)]
+            lines = ['Port      VLAN ID        MAC Address         Type']
+            lines += [f"{match.group(1):<10}{port['vlan']:<15}{mac:<20}Dynamic" for mac in port['macs']]
+            return '\n'.join(lines)
+        match = re.match(r'running-config interface port-channel (\S+)$', command)
+        if match and match.group(1) in self.ports:
+            name = match.group(1)
+            port = self.ports[name]
+            return f"interface port-channel {name}\n  name {port['description']}\n  pvid {port['vlan']}\n" \
+                   f"vlan {port['vlan']}\n  fixed {name}"
+        return super().show(command)
+
+    def canonical(self, command):
+        # "show int conf 5" - у ZyXEL это "show interface config"
+        return super().canonical(command).replace('interface configure ', 'interface config ')
+
+
+@profile('dlink', 'dlink_ds', ('1.85.B008', '4.04.B004'))
+class DlinkSwitch(EmulatedSwitch):
+    """D-Link DES-3200-28: без enable и режима конфигурации, каждая команда отвечает "Command: ..."."""
+
+    has_enable = False
+    ports_count = 28
+    uplinks = (25, 26, 27, 28)
+
+    def __init__(self, ip, firmware, seed):
+        super().__init__(ip, firmware, seed)
+        self.hostname = 'DES-3200-28'
+        self.mgmt_vlan = self.rng.choice((4001, 4010, 4094))
+        self.vlans = {1: 'default', self.mgmt_vlan: str(self.mgmt_vlan)}
+        self.tagged = {self.mgmt_vlan: '25-28'}
+        self.uplink = self.rng.choice(self.uplinks)
+        # Ревизия C (прошивка 4.x) пишет профили в другом порядке и иначе отвечает на пустой фильтр
+        self.rev_c = firmware.startswith('4.')
+        self.access_profiles = [self.profile_line()] if self.rng.random() < 0.7 else []
+        self.fdb = []
+        for _ in range(self.rng.randint(5, 40)):
+            port = self.uplink if self.rng.random() < 0.6 else self.rng.randint(1, 24)
+            self.fdb.append((self.mgmt_vlan, random_mac(self.rng), port))
+        self.cpu_mac = random_mac(self.rng)
+
+    def profile_line(self):
+        if self.rev_c:
+            return ("create access_profile profile_id 20 ethernet vlan 0xFFF source_mac FF-FF-FF-FF-FF-00 "
+                    "destination_mac FF-FF-FF-FF-FF-00 ethernet_type")
+        return ("create access_profile  ethernet  vlan 0xFFF source_mac FF-FF-FF-FF-FF-00 "
+                "destination_mac FF-FF-FF-FF-FF-00 ethernet_type  profile_id 20")
+
+    def prompt(self, session):
+        return f"{self.hostname}:admin#"
+
+    def config_lines(self):
+        lines = []
+        for vid, name in self.vlans.items():
+            if vid != 1:
+                lines.append(f"create vlan {name} tag {vid}")
+        lines.append("config vlan default add untagged 1-24")
+        for vid, ports in self.tagged.items():
+            lines.append(f"config vlan {self.vlans[vid]} add tagged {ports}")
+        return lines + self.access_profiles
+
+    def handle(self, session, line):
+        command = ' '.join(line.split())
+        if not command:
+            return ''
+        output = self.execute(command)
+        if output is None:
+            return f"Command: {command}\nNext possible completions:\n  config  create  delete  show  save"
+        return f"Command: {command}\n\n{output}"
+
+    def execute(self, command):
+        if command in ('disable clipaging', 'enable clipaging', 'logout'):
+            return 'Success.'
+        if command == 'show traffic_segmentation':
+            lines = ['Traffic Segmentation Table', '', 'Current Status : Enabled', 'Flooding Mode  : Disabled', '',
+                     ' Port   Forward Portlist', ' ----   ------------------------------------------']
+            uplinks = ','.join(str(port) for port in self.uplinks)
+            for port in range(1, self.ports_count + 1):
+                lines.append(f" {port:<6} {f'1-{self.ports_count}' if port in self.uplinks else uplinks}")
+            return '\n'.join(lines)
+        if command == 'show vlan':
+            blocks = []
+            for vid, name in self.vlans.items():
+                tagged = self.tagged.get(vid, '')
+                untagged = '1-24' if vid == 1 else ''
+                blocks.append(f"VID             : {vid:<10} VLAN Name     : {name}\n"
+                              f"VLAN Type       : Static     Advertisement : Disabled\n"
+                              f"Member Ports    : {tagged or untagged}\n"
+                              f"Static Ports    : {tagged or untagged}\n"
+                              f"Current Tagged Ports   : {tagged}\n"
+                              f"Current Untagged Ports : {untagged}")
+            return '\n\n'.join(blocks) + f"\n\nTotal Entries : {len(self.vlans)}"
+        match = re.match(r'show fdb(?: vlan (\S+))?$', command)
+        if match:
+            vid = match.group(1)
+            lines = ['VID  VLAN Name                        MAC Address       Port Type',
+                     '---- -------------------------------- ----------------- ---- ---------------']
+            entries = [entry for entry in self.fdb if vid is None or str(entry[0]) == vid]
+            for entry_vid, mac, port in entries:
+                lines.append(f"{entry_vid:<4} {self.vlans.get(entry_vid, ''):<32} {mac} {port:<4} Dynamic")
+            lines.append(f"{entry_vid if entries else 1:<4} {'':<32} {self.cpu_mac} CPU  Self")
+            return '\n'.join(lines) + f"\n\nTotal Entries: {len(entries) + 1}"
+        match = re.match(r'show config current(?: include "(.*)")?$', command)
+        if match:
+            lines = [line for line in self.config_lines() if not match.group(1) or match.group(1) in line]
+            if not lines:
+                return 'No filter matched.' if self.rev_c else 'No filter matched result!'
+            return '\n'.join(lines)
+        match = re.match(r'create vlan (\S+) tag (\d+)$', command)
+        if match:
+            self.vlans[int(match.group(2))] = match.group(1)
+            self.saved = False
+            return 'Success.'
+        if command == 'delete access_profile all':
+            self.access_profiles = []
+            self.saved = False
+            return 'Success.'
+        if command.startswith('create access_profile') or command.startswith('config access_profile'):
+            if command.startswith('config') and not self.access_profiles:
+                return 'The profile does not exist!\nFail!'
+            # Как настоящий коммутатор: повторный create с тем же profile_id отклоняется
+            profile_id = re.search(r'profile_id (\d+)', command)
+            if command.startswith('create') and profile_id and any(
+                    re.search(rf'^create .*profile_id {profile_id.group(1)}\b', line) for line in self.access_profiles):
+                return 'The profile ID already exists!\nFail!'
+            self.access_profiles.append(command)
+            self.saved = False
+            return 'Success.'
+        if command == 'save':
+            self.saved = True
+            return 'Saving all configurations to NV-RAM.......... Done.'
+        if command in ('show switch', 'show version'):
+            return (f"Device Type        : DES-3200-28 Fast Ethernet Switch\nIP Address         : {self.ip}\n"
+                    f"Hardware Version   : {'C1' if self.rev_c else 'B1'}\n"
+                    f"Firmware Version   : Build {self.firmware}")
+        return None
+
+
+class FarmServer(asyncssh.SSHServer):
+    def __init__(self, options):
+        self.options = options
+
+    def begin_auth(self, username):
+        return True
+
+    def password_auth_supported(self):
+        return True
+
+    async def validate_password(self, username, password):
+        await asyncio.sleep(jittered(self.options.login_latency, self.options.jitter))
+        expected = self.options.username, self.options.password
+        return (expected[0] is None or username == expected[0]) and (expected[1] is None or password == expected[1])
+
+
+def jittered(seconds, jitter):
+    return seconds * random.uniform(1 - jitter, 1 + jitter) if seconds else 0
+
+
+def command_latency(options, command):
+    """Задержка ответа: самое длинное совпадение из --command-latency, иначе --latency."""
+    best = None
+    for prefix, seconds in options.command_latency:
+        if command.startswith(prefix) and (best is None or len(prefix) > len(best[0])):
+            best = prefix, seconds
+    return jittered(best[1] if best else options.latency, options.jitter)
+
+
+async def run_session(device, options, process):
+    """Одна SSH-сессия: эхо ввода, задержка, вывод команды и новое приглашение."""
+    session = device.new_session()
+    out = process.stdout
+    out.write(f"\r\n{device.prompt(session)}")
+    try:
+        while True:
+            line = await process.stdin.readline()
+            if not line:
+                break
+            line = line.rstrip('\r\n')
+            if session['expect_secret']:
+                # Пароль enable не отображается
+                session['expect_secret'] = False
+                out.write('\r\n')
+                if options.password is None or line == options.password:
+                    session['mode'] = 'enable'
+                    out.write(device.prompt(session))
+                else:
+                    out.write(f"% Access denied\r\n{device.prompt(session)}")
+                continue
+            out.write(line + '\r\n')
+            try:
+                output = device.handle(session, line)
+            except Exception as e:
+                # Ошибка эмулятора не должна обрывать сессию: клиент увидит её как отказ команды
+                output = f"% Internal error: {e}"
+            if line.strip() in ('logout', 'quit'):
+                break
+            await asyncio.sleep(command_latency(options, line.strip()))
+            if session['expect_secret']:
+                out.write(output)
+                continue
+            if output:
+                out.write(output.replace('\n', '\r\n') + '\r\n')
+            out.write(device.prompt(session))
+    except (asyncssh.BreakReceived, asyncssh.TerminalSizeChanged, asyncssh.ConnectionLost, BrokenPipeError):
+        pass
+    process.exit(0)
+
+
+def build_devices(options):
+    """[(адрес, модель, прошивка, устройство)] для --devices штук по --mix."""
+    mix = []
+    for part in options.mix.split(','):
+        name, _, share = part.partition('=')
+        if name not in PROFILES:
+            raise ValueError(f"Неизвестная модель '{name}', доступны: {', '.join(PROFILES)}")
+        mix.append((name, float(share or 1)))
+    rng = random.Random(options.seed)
+    base = ipaddress.ip_address(options.base_address)
+    devices = []
+    for i in range(options.devices):
+        ip = str(base + i)
+        name = rng.choices([name for name, _ in mix], weights=[share for _, share in mix])[0]
+        cls, device_type, firmwares = PROFILES[name]
+        firmware = rng.choice(firmwares)
+        devices.append((ip, name, device_type, firmware, cls(ip, firmware, f"{options.seed}-{ip}")))
+    return devices
+
+
+def write_inventory(path, devices, port):
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['ip', 'port', 'model', 'device_type', 'firmware', 'site'])
+        for ip, name, device_type, firmware, _ in devices:
+            site = str(ipaddress.ip_network(f"{ip}/28", strict=False))
+            writer.writerow([ip, port, name, device_type, firmware, site])
+
+
+def parse_latency(value):
+    prefix, _, seconds = value.rpartition('=')
+    if not prefix:
+        raise argparse.ArgumentTypeError(f"Ожидается 'команда=секунды', получено: {value}")
+    return prefix, float(seconds)
+
+
+async def serve(options):
+    devices = build_devices(options)
+    key = asyncssh.generate_private_key('ssh-rsa')
+    servers = []
+    for ip, _, _, _, device in devices:
+        servers.append(await asyncssh.create_server(
+            lambda: FarmServer(options), ip, options.port, server_host_keys=[key], line_editor=False,
+            process_factory=lambda process, device=device: run_session(device, options, process)))
+    if options.inventory_out:
+        write_inventory(options.inventory_out, devices, options.port)
+    counts = {}
+    for _, name, _, _, _ in devices:
+        counts[name] = counts.get(name, 0) + 1
+    print(f"Запущено устройств: {len(devices)} ({', '.join(f'{name}: {count}' for name, count in counts.items())}), "
+          f"адреса {devices[0][0]} - {devices[-1][0]}, порт {options.port}")
+    if options.inventory_out:
+        print(f"Список устройств записан в {options.inventory_out}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        for server in servers:
+            server.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ферма эмулированных коммутаторов SNR/D-Link/ZyXEL/Cisco по SSH")
+    parser.add_argument('--devices', type=int, default=100, help="Сколько устройств поднять (по умолчанию 100)")
+    parser.add_argument('--mix', default='snr=1,dlink=1',
+                        help=f"Доли моделей, например snr=3,dlink=5,zyxel=1,cisco=1; модели: {', '.join(PROFILES)}")
+    parser.add_argument('--base-address', default='127.1.0.1',
+                        help="Адрес первого устройства, следующие - по порядку (по умолчанию 127.1.0.1)")
+    parser.add_argument('--port', type=int, default=2222, help="SSH-порт всех устройств (по умолчанию 2222)")
+    parser.add_argument('--username', help="Принимать только этого пользователя (по умолчанию любого)")
+    parser.add_argument('--password', help="Принимать только этот пароль, он же пароль enable (по умолчанию любой)")
+    parser.add_argument('--latency', type=float, default=0.05, help="Задержка ответа на команду, сек. (по умолчанию 0.05)")
+    parser.add_argument('--command-latency', type=parse_latency, action='append', default=[],
+                        help="Задержка для команд с этим началом, например 'show fdb=0.8' или 'save=3'; можно несколько")
+    parser.add_argument('--login-latency', type=float, default=0.2, help="Задержка проверки пароля, сек. (по умолчанию 0.2)")
+    parser.add_argument('--jitter', type=float, default=0.2, help="Разброс задержек, доля (по умолчанию 0.2)")
+    parser.add_argument('--seed', default='farm', help="Зерно генерации состояния устройств")
+    parser.add_argument('--inventory-out', help="Записать CSV со списком устройств (ip,port,model,...) для --inventory")
+    options = parser.parse_args()
+    try:
+        asyncio.run(serve(options))
+    except KeyboardInterrupt:
+        pass
+    except (OSError, ValueError) as e:
+        print(f"Ошибка: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()